@@ -1,8 +1,12 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, JSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
+import json
+import base64
+import asyncio
 import logging
 from app.services.stt import transcribe_audio
 from app.services.tts import generate_audio
@@ -14,7 +18,46 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-app = FastAPI(title="Voice Travel Assistant API")
+RAG_WARMUP = os.getenv("RAG_WARMUP", "true").lower() == "true"
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+
+async def warm_up_dependencies():
+    """
+    Pre-warms the RAG engine (Chroma + ONNX model + a dummy embedding), the pooled LLM
+    HTTP connections and the content cache database, concurrently.
+    """
+    from app.services.rag_engine import warm_up_rag_engine
+    from app.services.llm_client import llm_client
+    from app.services.content_cache import content_cache
+
+    tasks = [asyncio.to_thread(content_cache.warm_up), llm_client.warm_up()]
+    if RAG_WARMUP:
+        tasks.append(warm_up_rag_engine())
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Warm-up error: {str(result)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so startup isn't blocked; /readyz reports when it's done,
+    # and requests that arrive earlier build what they need on demand.
+    warmup = asyncio.create_task(warm_up_dependencies())
+    yield
+    if not warmup.done():
+        warmup.cancel()
+    from app.services.llm_client import llm_client
+    from app.services.knowledge_ingest import knowledge_ingestor
+    from app.services.pdf_generator import pdf_renderer
+    from app.services.batch_export import batch_exporter
+    from app.services.speculative import speculative_planner
+    speculative_planner.close()
+    await llm_client.aclose()
+    pdf_renderer.close()
+    batch_exporter.close()
+    # Give queued knowledge-base writes a chance to land before exit
+    await asyncio.to_thread(knowledge_ingestor.close, 5.0)
+
+app = FastAPI(title="Voice Travel Assistant API", lifespan=lifespan)
 
 # Configure CORS for frontend access
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:8000,https://voice-ai-travel-assistant.vercel.app").split(",")
@@ -25,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Itinerary-Id", "X-Itinerary-Version", "X-Session-Id"],
 )
 
 class TextInput(BaseModel):
@@ -38,6 +82,34 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/livez")
+def liveness_check():
+    """
+    Cheap liveness probe: the process is up and serving. Touches no dependencies.
+    """
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readiness_check():
+    """
+    Readiness probe with per-dependency warm-up state; 503 until the RAG engine
+    (when warmed on startup) and the content cache are ready.
+    """
+    from app.services.rag_engine import rag_engine_status
+    from app.services.llm_client import llm_client
+    from app.services.content_cache import content_cache
+    checks = {
+        "rag": rag_engine_status(),
+        "llm_pool": llm_client.pool_status(),
+        "content_cache": content_cache.status()
+    }
+    # The LLM pool is informational: a provider outage shouldn't take pods out of rotation
+    ready = (checks["rag"]["status"] == "ready" or not RAG_WARMUP) and checks["content_cache"]["status"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
 @app.post("/api/transcribe")
 async def transcribe_endpoint(file: UploadFile = File(...)):
     """
@@ -78,96 +150,597 @@ from typing import List, Dict, Optional, Any
 
 class IntentInput(BaseModel):
     text: str
+    session_id: Optional[str] = None
     existing_constraints: Optional[Dict[str, Any]] = None
     history: List[Dict[str, Any]] = []
 
+async def _analyze_turn(text: str, session_id: Optional[str] = None, existing_constraints: Optional[Dict[str, Any]] = None,
+                        history: Optional[List[Dict[str, Any]]] = None):
+    """
+    One conversation turn: extracts constraints from the utterance against the session's
+    state, records the exchange, and returns (session id, constraints).
+    """
+    from app.services.planner import extract_constraints
+    from app.services.session_store import SessionNotFoundError, session_store
+    from app.services.speculative import speculative_planner
+
+    session = session_store.get(session_id) if session_id else None
+    if session is None:
+        if session_id and existing_constraints is None and not history:
+            # Expired, or lost with the disk on a redeploy, and nothing to rebuild it from:
+            # tell the client instead of silently starting over
+            raise SessionNotFoundError(session_id)
+        # New conversation, or a client resending its constraints / history for a lost session
+        session = session_store.get(session_store.create(existing_constraints, history))
+    existing = existing_constraints if existing_constraints is not None else session.constraints
+
+    constraints = await extract_constraints(text, existing, session.recent, session.summary)
+
+    session_store.append_turn(session.id, "user", text)
+    reply = constraints.suggested_response or constraints.clarification_question
+    if reply:
+        session_store.append_turn(session.id, "assistant", reply)
+    session_store.set_constraints(session.id, constraints.model_dump())
+    session_store.schedule_summary(session.id)
+    # Start planning while the user is still confirming; plan-trip picks it up
+    if constraints.is_complete:
+        speculative_planner.start(session.id, constraints.model_dump())
+    else:
+        speculative_planner.invalidate(session.id)
+    return session.id, constraints
+
 @app.post("/api/analyze-intent")
 async def analyze_intent_endpoint(input: IntentInput):
     """
     Endpoint to analyze text and extract trip constraints using Gemini.
+    Conversation state lives server-side: pass the X-Session-Id from the previous reply
+    as `session_id` instead of resending the history. Send `existing_constraints` too so a
+    session the server no longer has is rebuilt; without them an unknown session is a 410.
     """
+    from app.services.session_store import SessionNotFoundError
+
     try:
-        from app.services.planner import extract_constraints
-        constraints = await extract_constraints(input.text, input.existing_constraints, input.history)
-        return constraints
+        session_id, constraints = await _analyze_turn(input.text, input.session_id, input.existing_constraints, input.history)
+        return JSONResponse(content=constraints.model_dump(), headers={"X-Session-Id": session_id})
+    except SessionNotFoundError:
+        raise HTTPException(status_code=410, detail="Session expired; start a new conversation")
     except Exception as e:
         logger.error(f"Intent analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _voice_turn_events(audio: bytes, mimetype: str, session_id: Optional[str] = None):
+    """
+    Runs STT -> constraint extraction -> TTS for one spoken turn, yielding events as each
+    stage finishes: transcript, constraints (with the session id), the reply audio in
+    chunks as it is synthesized, then done. A failed stage yields an error event instead;
+    a TTS failure still ends with done, since the client can speak the reply itself.
+    """
+    from app.services.tts import astream_audio
+
+    transcript = await transcribe_audio(audio, mimetype=mimetype)
+    if transcript.startswith("Error"):
+        yield {"type": "error", "stage": "transcribe", "detail": transcript}
+        return
+    yield {"type": "transcript", "text": transcript}
+
+    from app.services.session_store import SessionNotFoundError
+
+    try:
+        session_id, constraints = await _analyze_turn(transcript, session_id)
+    except SessionNotFoundError:
+        yield {"type": "error", "stage": "session", "detail": "Session expired; start a new conversation"}
+        return
+    except Exception as e:
+        logger.error(f"Voice turn intent error: {str(e)}")
+        yield {"type": "error", "stage": "analyze", "detail": str(e)}
+        return
+    reply = constraints.suggested_response or constraints.clarification_question
+    yield {"type": "constraints", "session_id": session_id, "constraints": constraints.model_dump(), "reply": reply}
+
+    if reply:
+        try:
+            async for chunk in astream_audio(reply):
+                yield {"type": "audio", "media_type": "audio/mpeg", "data": chunk}
+        except Exception as e:
+            logger.error(f"Voice turn TTS error: {str(e)}")
+            yield {"type": "error", "stage": "tts", "detail": str(e)}
+    yield {"type": "done", "session_id": session_id}
+
+@app.post("/api/voice-turn")
+async def voice_turn_endpoint(file: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    """
+    Endpoint for a whole voice turn in one round trip: audio in, NDJSON events out
+    (transcript, constraints, base64 reply-audio chunks, done) as each becomes available.
+    """
+    if not file.content_type.startswith("audio/"):
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload an audio file.")
+    from fastapi.responses import StreamingResponse
+    audio = await file.read()
+
+    async def lines():
+        async for event in _voice_turn_events(audio, file.content_type, session_id):
+            if event["type"] == "audio":
+                event = dict(event, data=base64.b64encode(event["data"]).decode("ascii"))
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/voice-turn")
+async def voice_turn_socket(websocket: WebSocket):
+    """
+    WebSocket variant of /api/voice-turn for a whole conversation: send each recording as
+    a binary message (optionally preceded by a JSON text message with `mimetype` and
+    `session_id`); events come back as JSON text messages and the reply audio as binary
+    messages. The session carries over between turns on the same socket.
+    """
+    await websocket.accept()
+    session_id = websocket.query_params.get("session_id")
+    mimetype = websocket.query_params.get("mimetype", "audio/webm")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                try:
+                    options = json.loads(message["text"])
+                    if not isinstance(options, dict):
+                        raise ValueError(options)
+                except ValueError:
+                    await websocket.send_json({"type": "error", "stage": "request", "detail": "Expected a JSON object"})
+                    continue
+                session_id = options.get("session_id", session_id)
+                mimetype = options.get("mimetype", mimetype)
+                continue
+            async for event in _voice_turn_events(message.get("bytes") or b"", mimetype, session_id):
+                if event["type"] == "audio":
+                    await websocket.send_bytes(event["data"])
+                    continue
+                if event["type"] == "error" and event["stage"] == "session":
+                    # The next utterance starts a fresh conversation
+                    session_id = None
+                session_id = event.get("session_id", session_id)
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+
 @app.post("/api/plan-trip")
 async def plan_trip_endpoint(constraints: dict):
     """
-    Endpoint to generate a trip itinerary based on constraints.
+    Endpoint to generate a trip itinerary based on constraints. The itinerary is saved
+    server-side; its id and ETag come back in the X-Itinerary-Id / ETag headers.
     """
     try:
-        from app.mcp.itinerary import build_itinerary, BuildItineraryRequest
+        from app.mcp.itinerary import build_itinerary, request_from_constraints
+        from app.services.itinerary_store import itinerary_store
+        from app.services.speculative import speculative_planner
         
         if not constraints.get("destination_city"):
              raise HTTPException(status_code=400, detail="Missing destination city")
              
-        # Map constraints to request model
-        req = BuildItineraryRequest(
-            city=str(constraints.get("destination_city")),
-            days=int(constraints.get("duration_days", 3)),
-            pace=str(constraints.get("pace", "moderate")),
-            interests=constraints.get("interests", []),
-            must_visit=constraints.get("must_visit", []),
-            budget=str(constraints.get("budget_level", "Moderate")),
-            start_date=constraints.get("start_date")
-        )
-        
-        itinerary = await build_itinerary(req)
-        return itinerary
+        # Usually already built (or building) speculatively during the conversation
+        itinerary = await speculative_planner.take(constraints)
+        if itinerary is None:
+            itinerary = await build_itinerary(request_from_constraints(constraints))
+        try:
+            stored = itinerary_store.create(itinerary.model_dump(), constraints)
+        except Exception as e:
+            # Saving is a convenience; the plan itself is still good
+            logger.error(f"Itinerary store error: {str(e)}")
+            return itinerary
+        return JSONResponse(content=stored.itinerary, headers=_itinerary_headers(stored))
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Trip planning error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/api/plan-trip/stream")
+async def plan_trip_stream_endpoint(constraints: dict):
+    """
+    Server-Sent Events variant of /api/plan-trip. Emits progress events as the plan is
+    built (geocoded, weather, pois, draft with the uncurated itinerary, curating), then
+    `itinerary` with the saved plan (id, version, etag, itinerary), or `error`.
+    Disconnecting cancels the build.
+    """
+    from fastapi.responses import StreamingResponse
+    from app.mcp.itinerary import build_itinerary, request_from_constraints
+    from app.services.itinerary_store import itinerary_store
+    from app.services.speculative import speculative_planner
+
+    if not constraints.get("destination_city"):
+        raise HTTPException(status_code=400, detail="Missing destination city")
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def progress(event: str, data: Dict[str, Any]):
+            await queue.put((event, data))
+
+        async def plan():
+            itinerary = await speculative_planner.take(constraints)
+            if itinerary is None:
+                itinerary = await build_itinerary(request_from_constraints(constraints), progress)
+            return itinerary
+
+        task = asyncio.create_task(plan())
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing the connection during long curation calls
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield _sse(*item)
+
+            try:
+                itinerary = task.result()
+            except Exception as e:
+                logger.error(f"Trip planning stream error: {str(e)}")
+                yield _sse("error", {"detail": str(e)})
+                return
+            try:
+                stored = itinerary_store.create(itinerary.model_dump(), constraints)
+                yield _sse("itinerary", stored.to_dict())
+            except Exception as e:
+                logger.error(f"Itinerary store error: {str(e)}")
+                yield _sse("itinerary", {"itinerary": itinerary.model_dump()})
+        finally:
+            # Client went away: stop building (a joined speculative build keeps running)
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _itinerary_headers(stored, kind: str = None) -> Dict[str, str]:
+    # Derived artifacts get their own validator, still tied to the itinerary version
+    etag = stored.etag if kind is None else f'{stored.etag[:-1]}-{kind}"'
+    return {"ETag": etag, "X-Itinerary-Id": stored.id, "X-Itinerary-Version": str(stored.version)}
+
+def _load_itinerary(itinerary_id: str, version: Optional[int] = None):
+    from app.services.itinerary_store import itinerary_store
+    stored = itinerary_store.get(itinerary_id, version)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return stored
+
+def _validated_itinerary(body: dict) -> dict:
+    from app.mcp.models import Itinerary
+    from pydantic import ValidationError
+    try:
+        return Itinerary.model_validate(body).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+@app.post("/api/itineraries", status_code=201)
+def create_itinerary_endpoint(itinerary: dict):
+    """
+    Endpoint to save an itinerary; returns its id, version and ETag.
+    """
+    from app.services.itinerary_store import itinerary_store
+    stored = itinerary_store.create(_validated_itinerary(itinerary))
+    headers = dict(_itinerary_headers(stored), Location=f"/api/itineraries/{stored.id}")
+    return JSONResponse(status_code=201, content=stored.to_dict(), headers=headers)
+
+@app.get("/api/itineraries/{itinerary_id}")
+def get_itinerary_endpoint(itinerary_id: str, request: Request, version: Optional[int] = None):
+    """
+    Endpoint to fetch a saved itinerary (latest or a given version). Honours If-None-Match.
+    """
+    from app.services.itinerary_store import etag_matches
+    stored = _load_itinerary(itinerary_id, version)
+    headers = _itinerary_headers(stored)
+    if etag_matches(request.headers.get("if-none-match"), stored.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=stored.to_dict(), headers=headers)
+
+@app.put("/api/itineraries/{itinerary_id}")
+def update_itinerary_endpoint(itinerary_id: str, itinerary: dict, request: Request):
+    """
+    Endpoint to save a new version of an itinerary. With If-Match, returns 412 if
+    someone else saved a newer version first.
+    """
+    from app.services.itinerary_store import itinerary_store, ItineraryNotFoundError, ItineraryVersionConflictError
+    try:
+        stored = itinerary_store.update(itinerary_id, _validated_itinerary(itinerary), if_match=request.headers.get("if-match"))
+    except ItineraryNotFoundError:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    except ItineraryVersionConflictError as e:
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": e.current_etag})
+    return JSONResponse(content=stored.to_dict(), headers=_itinerary_headers(stored))
+
+@app.delete("/api/itineraries/{itinerary_id}", status_code=204)
+def delete_itinerary_endpoint(itinerary_id: str):
+    """
+    Endpoint to delete an itinerary and all its versions.
+    """
+    from app.services.itinerary_store import itinerary_store
+    if not itinerary_store.delete(itinerary_id):
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return Response(status_code=204)
+
+@app.get("/api/itineraries/{itinerary_id}/versions")
+def itinerary_versions_endpoint(itinerary_id: str):
+    """
+    Endpoint to list the stored versions of an itinerary.
+    """
+    from app.services.itinerary_store import itinerary_store
+    versions = itinerary_store.versions(itinerary_id)
+    if not versions:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return {"id": itinerary_id, "versions": versions}
+
+@app.get("/api/itineraries/{itinerary_id}/diff")
+def itinerary_diff_endpoint(itinerary_id: str, from_version: Optional[int] = None, to_version: Optional[int] = None):
+    """
+    Endpoint to diff two versions of an itinerary (default: previous vs. latest).
+    """
+    from app.services.itinerary_store import itinerary_store, ItineraryNotFoundError
+    try:
+        return itinerary_store.diff(itinerary_id, from_version, to_version)
+    except ItineraryNotFoundError:
+        raise HTTPException(status_code=404, detail="Itinerary version not found")
+
+@app.get("/api/itineraries/{itinerary_id}/markdown")
+def itinerary_markdown_endpoint(itinerary_id: str, request: Request, version: Optional[int] = None):
+    """
+    Endpoint to download a saved itinerary as Markdown.
+    """
+    from app.services.itinerary_store import etag_matches
+    from app.services.markdown_generator import stream_markdown
+    from fastapi.responses import StreamingResponse
+
+    stored = _load_itinerary(itinerary_id, version)
+    headers = _itinerary_headers(stored, "md")
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = 'attachment; filename="trip_itinerary.md"'
+    return StreamingResponse(stream_markdown(stored.itinerary), media_type="text/markdown; charset=utf-8", headers=headers)
+
+@app.get("/api/itineraries/{itinerary_id}/pdf")
+async def itinerary_pdf_endpoint(itinerary_id: str, request: Request, version: Optional[int] = None):
+    """
+    Endpoint to download a saved itinerary as a PDF guide.
+    """
+    from app.services.itinerary_store import etag_matches
+    from app.services.pdf_generator import pdf_renderer
+
+    stored = _load_itinerary(itinerary_id, version)
+    headers = _itinerary_headers(stored, "pdf")
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    try:
+        _, pdf_bytes = await pdf_renderer.render(stored.itinerary)
+    except Exception as e:
+        logger.error(f"PDF generation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    headers["Content-Disposition"] = 'attachment; filename="trip_itinerary.pdf"'
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+class ReplanInput(BaseModel):
+    instruction: str
+    day_number: int
+    time_block: Optional[str] = None
+    itinerary_id: Optional[str] = None
+    itinerary: Optional[Dict[str, Any]] = None
+    constraints: Optional[Dict[str, Any]] = None
+
+@app.post("/api/replan")
+async def replan_endpoint(input: ReplanInput, request: Request):
+    """
+    Endpoint to edit one block (or one day) of an existing itinerary without rebuilding
+    the trip. Takes a saved itinerary id (a new version is saved, If-Match honoured) or
+    the full itinerary plus its constraints.
+    """
+    from app.mcp.itinerary import replan_itinerary
+    from app.mcp.models import Itinerary, ReplanRequest
+    from app.services.itinerary_store import itinerary_store, ItineraryNotFoundError, ItineraryVersionConflictError
+
+    stored = None
+    constraints = input.constraints or {}
+    if input.itinerary_id:
+        stored = _load_itinerary(input.itinerary_id)
+        itinerary_data = stored.itinerary
+        constraints = input.constraints or stored.constraints or {}
+    elif input.itinerary is not None:
+        itinerary_data = input.itinerary
+    else:
+        raise HTTPException(status_code=400, detail="Provide itinerary_id or itinerary")
+    if not constraints.get("destination_city"):
+        raise HTTPException(status_code=400, detail="Missing destination city")
+
+    try:
+        replan_request = ReplanRequest(
+            city=str(constraints["destination_city"]),
+            itinerary=Itinerary.model_validate(itinerary_data),
+            day_number=input.day_number,
+            time_block=input.time_block,
+            instruction=input.instruction,
+            interests=constraints.get("interests") or [],
+            pace=str(constraints.get("pace") or "moderate"),
+            budget=str(constraints.get("budget_level") or "Moderate")
+        )
+        itinerary = await replan_itinerary(replan_request)
+    except ValueError as e:
+        # Includes pydantic validation errors and unknown day/block
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Replan error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if stored is None:
+        return itinerary
+    try:
+        saved = itinerary_store.update(stored.id, itinerary.model_dump(), if_match=request.headers.get("if-match"))
+    except ItineraryNotFoundError:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    except ItineraryVersionConflictError as e:
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": e.current_etag})
+    return JSONResponse(content=saved.itinerary, headers=_itinerary_headers(saved))
+
+class RAGQueryInput(BaseModel):
+    text: str
+    city: Optional[str] = None
+    n_results: int = 2
+
+class ExplainInput(BaseModel):
+    text: str
+    context: Optional[Dict[str, Any]] = None
+
 @app.post("/api/query-rag")
-async def query_rag_endpoint(input: TextInput):
+async def query_rag_endpoint(input: RAGQueryInput):
     """
-    Endpoint to query the RAG system for travel tips.
+    Endpoint to query the RAG system for travel tips, optionally scoped to a city.
     """
+    from app.services.rag_engine import rag_engine, RAGOverloadedError
     try:
-        from app.services.rag_engine import rag_engine
-        results = rag_engine.query(input.text)
-        return {"results": results}
+        scored = await rag_engine.aquery_with_scores(input.text, n_results=input.n_results, city=input.city)
+        return {"results": [document for document, _ in scored], "distances": [distance for _, distance in scored]}
+    except RAGOverloadedError as e:
+        logger.warning(f"RAG query rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="Knowledge base is busy, please retry", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"RAG query error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/explain")
-async def explain_endpoint(input: TextInput):
+async def explain_endpoint(input: ExplainInput):
     """
     Endpoint to answer questions or explain itinerary choices.
     """
     try:
         from app.services.explanation import generate_explanation
-        answer = await generate_explanation(input.text)
+        answer = await generate_explanation(input.text, input.context)
         return {"answer": answer}
     except Exception as e:
         logger.error(f"Explanation endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/generate-markdown")
-async def generate_markdown_endpoint(itinerary: dict, background_tasks: BackgroundTasks):
+async def generate_markdown_endpoint(itinerary: dict):
     """
-    Endpoint to generate a Markdown file for the given itinerary.
+    Endpoint to stream the given itinerary as a Markdown file download.
     """
     try:
-        from app.services.markdown_generator import save_markdown_file
-        from fastapi.responses import FileResponse
-        
-        file_path = save_markdown_file(itinerary)
-        
-        # Schedule file deletion after response is sent
-        background_tasks.add_task(os.remove, file_path)
-        
-        return FileResponse(
-            file_path, 
-            media_type='text/markdown', 
-            filename="trip_itinerary.md",
+        from app.services.markdown_generator import stream_markdown
+        from fastapi.responses import StreamingResponse
+        import itertools
+
+        chunks = stream_markdown(itinerary)
+        # Build the header eagerly so a malformed itinerary still gets a proper 500
+        first = next(chunks)
+        return StreamingResponse(
+            itertools.chain([first], chunks),
+            media_type="text/markdown; charset=utf-8",
             headers={"Content-Disposition": 'attachment; filename="trip_itinerary.md"'}
         )
     except Exception as e:
         logger.error(f"Markdown generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/generate-pdf")
+async def generate_pdf_endpoint(itinerary: dict):
+    """
+    Endpoint to render the given itinerary as a PDF guide. Repeat renders of the same plan
+    are served from the renderer's cache; conditional downloads go through
+    GET /api/itineraries/{id}/pdf.
+    """
+    try:
+        from app.services.pdf_generator import pdf_renderer
+
+        _, pdf_bytes = await pdf_renderer.render(itinerary)
+        return Response(
+            content=pdf_bytes,
+            media_type="application/pdf",
+            headers={"Content-Disposition": 'attachment; filename="trip_itinerary.pdf"'}
+        )
+    except Exception as e:
+        logger.error(f"PDF generation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/batch-export")
+async def batch_export_endpoint(request: Request, formats: str = "md,pdf"):
+    """
+    Endpoint to export many itineraries at once: JSONL in (one itinerary per line),
+    a ZIP of Markdown and/or PDF files streamed back as they are rendered.
+    """
+    from app.services.batch_export import batch_exporter, iter_file_chunks, parse_formats
+    from fastapi.responses import StreamingResponse
+    from starlette.background import BackgroundTask
+    import tempfile
+
+    try:
+        export_formats = parse_formats(formats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        body = tempfile.SpooledTemporaryFile(max_size=int(os.getenv("BATCH_EXPORT_SPOOL_BYTES", 8 * 1024 * 1024)))
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        return StreamingResponse(
+            batch_exporter.stream_zip(iter_file_chunks(body), export_formats),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="itineraries.zip"'},
+            background=BackgroundTask(body.close)
+        )
+    except Exception as e:
+        logger.error(f"Batch export error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/metrics/prompt-cache")
+def prompt_cache_metrics():
+    """
+    Endpoint to report Anthropic prompt-cache hit rates per LLM call site.
+    """
+    from app.services.claude_api import get_prompt_cache_stats
+    return {"prompt_cache": get_prompt_cache_stats()}
+
+@app.get("/api/metrics/llm")
+def llm_metrics():
+    """
+    Endpoint to report per-task LLM call counts, retries, tokens and latency.
+    """
+    from app.services.llm_client import llm_client
+    return llm_client.get_stats()
+
+@app.get("/api/metrics/rag")
+def rag_metrics():
+    """
+    Endpoint to report RAG cache hit rates, embedding batch sizes and ingest progress.
+    """
+    from app.services.rag_engine import rag_engine
+    from app.services.knowledge_ingest import knowledge_ingestor
+    return {
+        "cache": rag_engine.cache_stats(),
+        "batching": rag_engine.batcher.stats,
+        "ingest": knowledge_ingestor.get_stats()
+    }
+
+@app.get("/api/metrics/speculative")
+def speculative_metrics():
+    """
+    Endpoint to report speculative planning starts, cancellations and hit rates.
+    """
+    from app.services.speculative import speculative_planner
+    return speculative_planner.get_stats()
+
+@app.get("/api/metrics/intent")
+def intent_metrics():
+    """
+    Endpoint to report how many turns the local intent fast path answered without the LLM.
+    """
+    from app.services.intent_classifier import intent_classifier
+    return intent_classifier.get_stats()
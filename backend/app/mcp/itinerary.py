@@ -1,13 +1,61 @@
+import os
+import time
 import logging
-from typing import List
-from app.mcp.models import BuildItineraryRequest, Itinerary, DayItinerary, ItineraryBlock, POI, GeoPoint
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.mcp.models import BuildItineraryRequest, Itinerary, DayItinerary, ItineraryBlock, POI, GeoPoint, ReplanRequest
 from app.mcp.travel_data import search_pois
+from app.services.bm25 import tokenize
+from app.services.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
-async def build_itinerary(request: BuildItineraryRequest) -> Itinerary:
+# POI candidates per (city, interests, category), so edits don't refetch what the plan already fetched
+CANDIDATE_TTL_SECONDS = float(os.getenv("POI_CANDIDATE_TTL_SECONDS", 3600))
+_candidate_cache = LRUCache(int(os.getenv("POI_CANDIDATE_CACHE_SIZE", 256)))
+
+async def get_candidates(city: str, interests: List[str] = None, category: str = "attractions") -> List[POI]:
+    """
+    search_pois behind a short-lived in-process cache.
+    """
+    key = (city.strip().lower(), tuple(sorted(i.lower() for i in interests or [])), category)
+    cached = _candidate_cache.get(key)
+    if cached is not None and time.time() - cached[0] < CANDIDATE_TTL_SECONDS:
+        return list(cached[1])
+    pois = await search_pois(city=city, interests=interests, category=category)
+    if pois:
+        _candidate_cache.set(key, (time.time(), list(pois)))
+    return pois
+
+def request_from_constraints(constraints: dict) -> BuildItineraryRequest:
+    """
+    Maps extracted trip constraints onto a BuildItineraryRequest.
+    """
+    return BuildItineraryRequest(
+        city=str(constraints.get("destination_city")),
+        days=int(constraints.get("duration_days") or 3),
+        pace=str(constraints.get("pace") or "moderate"),
+        interests=constraints.get("interests") or [],
+        must_visit=constraints.get("must_visit") or [],
+        budget=str(constraints.get("budget_level") or "Moderate"),
+        start_date=constraints.get("start_date")
+    )
+
+# Optional async callback for build progress: progress(event, data)
+ProgressCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+async def _report(progress: Optional[ProgressCallback], event: str, **data) -> None:
+    if progress is None:
+        return
+    try:
+        await progress(event, data)
+    except Exception as e:
+        logger.warning(f"Progress callback failed for {event}: {e}")
+
+async def build_itinerary(request: BuildItineraryRequest, progress: ProgressCallback = None) -> Itinerary:
     """
     Constructs a day-wise itinerary based on constraints.
+    With `progress`, reports each step as it completes: geocoded, weather, pois,
+    draft (with the uncurated itinerary) and curating.
     """
     if not request.city:
         logger.error("No city provided for itinerary")
@@ -27,16 +75,22 @@ async def build_itinerary(request: BuildItineraryRequest) -> Itinerary:
         # Pre-fetch weather and context for Claude
         from app.services.free_travel_api import free_travel_service
         try:
+            # Cached per city, so the weather and POI lookups below reuse it
+            coords = await free_travel_service.geocode_city(request.city)
+            await _report(progress, "geocoded", city=request.city, lat=coords[0] if coords else None,
+                          lon=coords[1] if coords else None)
+
             weather_data = await free_travel_service.get_weather_forecast(request.city, days=request.days)
             if weather_data and "days" in weather_data:
                 weather_info = ", ".join([f"{d['date']}: {d['weather']} ({d['temp_max']}°C)" for d in weather_data["days"][:3]])
+            await _report(progress, "weather", forecast=weather_info)
             
             city_summary = await free_travel_service.get_wikipedia_summary(request.city)
         except Exception as we:
             logger.warning(f"Could not fetch weather/summary: {we}")
 
         # Search for general attractions
-        pois = await search_pois(city=request.city, interests=request.interests, category="attractions")
+        pois = await get_candidates(request.city, request.interests, "attractions")
         
         # If user has specific must-visit places, ensure they are included or added
         if request.must_visit:
@@ -95,7 +149,7 @@ async def build_itinerary(request: BuildItineraryRequest) -> Itinerary:
 
     # 3. Distribute POIs across days
     try:
-        restaurants = await search_pois(city=request.city, interests=request.interests, category="restaurants")
+        restaurants = await get_candidates(request.city, request.interests, "restaurants")
         # If no restaurants, generate some!
         if not restaurants:
              from app.services.claude_api import generate_pois_with_claude
@@ -103,8 +157,9 @@ async def build_itinerary(request: BuildItineraryRequest) -> Itinerary:
              r_data = await generate_pois_with_claude(request.city, interests=["local food"], category="restaurants")
              if r_data:
                  restaurants = transform_raw_to_pois(r_data, "generated-food")
-    except:
+    except Exception:
         restaurants = []
+    await _report(progress, "pois", attractions=len(pois), restaurants=len(restaurants))
         
     days: List[DayItinerary] = []
     
@@ -147,21 +202,135 @@ async def build_itinerary(request: BuildItineraryRequest) -> Itinerary:
                 ))
         days.append(DayItinerary(day_number=d, blocks=blocks))
 
+    draft = Itinerary(
+        trip_title=f"{request.days}-Day Adventure in {request.city}",
+        summary_rationale="Initial draft based on your interests.",
+        weather_forecast=weather_info,
+        days=days,
+        total_cost_estimate=request.budget
+    )
+    await _report(progress, "draft", itinerary=draft.model_dump())
+
     # 4. Optional: Use Claude to curate the final result
     try:
         from app.services.claude_api import curate_itinerary_with_claude
+        await _report(progress, "curating", days=len(days))
         curated_itinerary = await curate_itinerary_with_claude(request, days, weather_info, city_summary)
         if curated_itinerary:
             logger.info("Successfully curated itinerary with Claude")
+            # Curated local tips enrich the RAG knowledge base (written in the background)
+            from app.services.knowledge_ingest import knowledge_ingestor
+            knowledge_ingestor.submit_itinerary_tips(request.city, curated_itinerary)
             return curated_itinerary
     except Exception as e:
         logger.error(f"Claude curation failed, using draft: {e}")
 
     logger.info(f"Successfully built draft itinerary with {len(days)} days")
-    return Itinerary(
-        trip_title=f"{request.days}-Day Adventure in {request.city}",
-        summary_rationale="Initial draft based on your interests.",
-        weather_forecast=weather_info,
-        days=days,
-        total_cost_estimate=request.budget
-    )
+    return draft
+
+# Words that describe the edit itself rather than what the user wants instead
+EDIT_WORDS = {
+    "swap", "replace", "change", "instead", "something", "else", "different", "another", "other",
+    "day", "morning", "afternoon", "evening", "please", "want", "like", "put", "make", "go",
+    "visit", "place", "spot", "activity", "one", "first", "second", "third", "1", "2", "3", "4", "5"
+}
+FOOD_WORDS = {"food", "restaurant", "restaurants", "dinner", "lunch", "eat", "cafe", "bar", "cuisine"}
+
+def _terms(text: str) -> set:
+    # Crude plural folding so "museums" matches "museum"
+    return {t[:-1] if len(t) > 3 and t.endswith("s") else t for t in tokenize(text)}
+
+def _match_count(poi: POI, terms: set) -> int:
+    return len(terms & _terms(f"{poi.name} {poi.category} {poi.description or ''}"))
+
+def _rank_candidates(pois: List[POI], terms: set, exclude: set) -> List[POI]:
+    """Unused candidates, best keyword match first (source order breaks ties)."""
+    scored = []
+    for index, poi in enumerate(pois):
+        if poi.name.lower() in exclude:
+            continue
+        scored.append((-_match_count(poi, terms), index, poi))
+    scored.sort(key=lambda item: item[:2])
+    return [poi for _, _, poi in scored]
+
+async def replan_itinerary(request: ReplanRequest) -> Itinerary:
+    """
+    Applies a targeted edit ("swap the Day 2 afternoon for a museum") to one block, or a
+    whole day, of an existing itinerary. Reuses cached candidates and re-curates only the
+    affected day; the other days are returned untouched.
+    """
+    itinerary = request.itinerary.model_copy(deep=True)
+    day_index = next((i for i, d in enumerate(itinerary.days) if d.day_number == request.day_number), None)
+    if day_index is None:
+        raise ValueError(f"Day {request.day_number} is not in the itinerary")
+    day = itinerary.days[day_index]
+    slots = [
+        b.time_block for b in day.blocks
+        if request.time_block is None or b.time_block.lower() == request.time_block.lower()
+    ]
+    if not slots:
+        raise ValueError(f"Day {request.day_number} has no {request.time_block} block")
+
+    terms = _terms(request.instruction) - _terms(" ".join(EDIT_WORDS))
+    used = {b.poi.name.lower() for d in itinerary.days for b in d.blocks}
+    pools: Dict[str, List[POI]] = {}
+
+    async def pool_for(category: str) -> List[POI]:
+        if category not in pools:
+            pools[category] = await get_candidates(request.city, request.interests, category)
+            ranked = _rank_candidates(pools[category], terms, used)
+            # Nothing on hand matches what was asked for: one targeted generation call
+            if terms and (not ranked or not _match_count(ranked[0], terms)):
+                try:
+                    from app.services.claude_api import generate_pois_with_claude
+                    from app.mcp.travel_data import transform_raw_to_pois
+                    generated = await generate_pois_with_claude(request.city, interests=[request.instruction], category=category)
+                    pools[category] = transform_raw_to_pois(generated, "replan") + pools[category]
+                except Exception as e:
+                    logger.error(f"Failed to generate replan candidates: {e}")
+        return pools[category]
+
+    blocks, alternatives = [], []
+    for block in day.blocks:
+        if block.time_block not in slots:
+            blocks.append(block)
+            continue
+        if terms & _terms(" ".join(FOOD_WORDS)):
+            category = "restaurants"
+        elif terms:
+            category = "attractions"
+        else:
+            # "Something else for dinner": keep the slot's usual kind of place
+            category = "restaurants" if block.time_block == "Evening" else "attractions"
+        ranked = _rank_candidates(await pool_for(category), terms, used)
+        if not ranked:
+            logger.warning(f"No replacement candidates for day {day.day_number} {block.time_block}")
+            blocks.append(block)
+            continue
+        used.add(ranked[0].name.lower())
+        alternatives.extend(ranked[1:3])
+        blocks.append(ItineraryBlock(
+            time_block=block.time_block,
+            poi=ranked[0],
+            start_time=block.start_time,
+            end_time=block.end_time,
+            travel_time_from_previous=block.travel_time_from_previous,
+            activity_cost=ranked[0].details.get("cost"),
+            local_tip=ranked[0].details.get("tips")
+        ))
+    draft_day = DayItinerary(day_number=day.day_number, blocks=blocks)
+
+    try:
+        from app.services.claude_api import curate_day_with_claude
+        plan = BuildItineraryRequest(
+            city=request.city, days=len(itinerary.days), pace=request.pace,
+            interests=request.interests, budget=request.budget
+        )
+        curated_day = await curate_day_with_claude(plan, draft_day, slots, request.instruction, alternatives)
+    except Exception as e:
+        logger.error(f"Day curation failed, using draft: {e}")
+        curated_day = None
+
+    itinerary.days[day_index] = curated_day or draft_day
+    logger.info(f"Re-planned day {day.day_number} ({', '.join(slots)}) of {request.city} itinerary")
+    return itinerary
@@ -56,3 +56,13 @@ class BuildItineraryRequest(BaseModel):
     must_visit: List[str] = []
     budget: Optional[str] = "Moderate"
     start_date: Optional[str] = None
+
+class ReplanRequest(BaseModel):
+    city: str
+    itinerary: Itinerary
+    day_number: int
+    time_block: Optional[str] = None  # None re-plans the whole day
+    instruction: str
+    interests: List[str] = []
+    pace: str = "moderate"
+    budget: Optional[str] = "Moderate"
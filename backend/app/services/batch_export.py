@@ -0,0 +1,216 @@
+"""
+Bulk export of itineraries to a ZIP of Markdown and/or PDF files.
+
+Input is JSONL, one itinerary per line, read incrementally. Each line is parsed and
+rendered in a worker process, at most `2 * workers` at a time, and every finished entry
+is appended to the archive and flushed to the caller straight away, so memory stays
+bounded by the window rather than the batch. Entries appear in completion order; a
+`manifest.json` at the end maps input line numbers to file names and records failures.
+The HTTP endpoint spools the upload first (to disk past BATCH_EXPORT_SPOOL_BYTES) since
+clients generally don't read a response while still sending the body.
+
+    POST /api/batch-export?formats=md,pdf     (body: JSONL)
+    python -m app.services.batch_export plans.jsonl -o plans.zip --formats md,pdf
+"""
+
+import os
+import re
+import sys
+import json
+import asyncio
+import logging
+import zipfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("md", "pdf")
+
+
+class _ZipSink:
+    """Write-only, non-seekable buffer for ZipFile; `drain()` hands back what was written so far."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")[:60] or "itinerary"
+
+
+def render_entry(index: int, line: bytes, formats: Sequence[str]) -> Dict[str, Any]:
+    """Parses and renders one JSONL line. Runs in a worker process; never raises."""
+    from app.services.markdown_generator import generate_markdown
+    from app.services.pdf_generator import render_pdf_bytes
+
+    entry: Dict[str, Any] = {"line": index + 1, "files": []}
+    try:
+        itinerary = json.loads(line)
+        if not isinstance(itinerary, dict):
+            raise ValueError("line is not a JSON object")
+        entry["title"] = itinerary.get("trip_title", "")
+        base = f"{index + 1:05d}-{_slug(entry['title'])}"
+        if "md" in formats:
+            entry["files"].append((f"{base}.md", generate_markdown(itinerary).encode("utf-8")))
+        if "pdf" in formats:
+            entry["files"].append((f"{base}.pdf", render_pdf_bytes(itinerary)))
+    except Exception as e:
+        entry["error"] = str(e)
+    return entry
+
+
+async def iter_jsonl_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Splits a byte stream into non-blank lines without buffering more than one line."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+class BatchExporter:
+    """Renders JSONL itineraries across a process pool into a streamed ZIP archive."""
+
+    def __init__(self, workers: int = None):
+        # 0 workers renders in threads instead, for hosts where spawning processes isn't allowed
+        self.workers = workers if workers is not None else int(os.getenv("BATCH_EXPORT_WORKERS", os.cpu_count() or 2))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers > 0 and self._pool is None:
+            # spawn rather than fork: the server process already runs threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    @staticmethod
+    def _write_entry(archive: zipfile.ZipFile, entry: Dict[str, Any], manifest: List[dict]) -> None:
+        for name, data in entry["files"]:
+            # PDFs are already compressed; deflating them again only costs CPU
+            compression = zipfile.ZIP_STORED if name.endswith(".pdf") else zipfile.ZIP_DEFLATED
+            archive.writestr(name, data, compress_type=compression)
+        record = {"line": entry["line"], "title": entry.get("title"), "files": [name for name, _ in entry["files"]]}
+        if entry.get("error"):
+            record["error"] = entry["error"]
+            logger.warning(f"Batch export: line {entry['line']} failed: {entry['error']}")
+        manifest.append(record)
+
+    async def stream_zip(self, chunks: AsyncIterator[bytes], formats: Sequence[str] = EXPORT_FORMATS) -> AsyncIterator[bytes]:
+        """Yields ZIP archive bytes as entries finish rendering."""
+        loop = asyncio.get_running_loop()
+        executor = self._executor()
+        window = max(1, self.workers) * 2
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+        manifest: List[dict] = []
+        pending = set()
+        index = 0
+        try:
+            lines = iter_jsonl_lines(chunks)
+            while True:
+                # Only read more input once there is room in the window
+                if len(pending) < window:
+                    line = await anext(lines, None)
+                    if line is not None:
+                        pending.add(loop.run_in_executor(executor, render_entry, index, line, tuple(formats)))
+                        index += 1
+                        continue
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    self._write_entry(archive, future.result(), manifest)
+                data = sink.drain()
+                if data:
+                    yield data
+
+            manifest.sort(key=lambda record: record["line"])
+            archive.writestr("manifest.json", json.dumps({
+                "count": len(manifest),
+                "failed": sum(1 for record in manifest if "error" in record),
+                "entries": manifest
+            }, indent=2))
+            archive.close()
+            yield sink.drain()
+            logger.info(f"Batch export: {len(manifest)} itineraries")
+        finally:
+            # Client went away (or input failed): don't keep rendering for nobody
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def parse_formats(value: str) -> List[str]:
+    formats = [f.strip().lower() for f in (value or "").split(",") if f.strip()]
+    if not formats or any(f not in EXPORT_FORMATS for f in formats):
+        raise ValueError(f"formats must be a comma-separated subset of {', '.join(EXPORT_FORMATS)}")
+    return formats
+
+
+batch_exporter = BatchExporter()
+
+
+async def iter_file_chunks(f, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    """Reads a binary file object in chunks without blocking the event loop."""
+    while True:
+        chunk = await asyncio.to_thread(f.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _export_file(input_path: str, output_path: str, formats: Sequence[str], workers: int = None) -> None:
+    exporter = BatchExporter(workers) if workers is not None else batch_exporter
+    source = sys.stdin.buffer if input_path == "-" else open(input_path, "rb")
+    try:
+        with open(output_path, "wb") as out:
+            async for data in exporter.stream_zip(iter_file_chunks(source), formats):
+                out.write(data)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        exporter.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file with one itinerary per line, or - for stdin")
+    parser.add_argument("-o", "--output", default="itineraries.zip")
+    parser.add_argument("--formats", default="md,pdf", help="comma-separated: md, pdf")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: BATCH_EXPORT_WORKERS or CPU count)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_export_file(args.input, args.output, parse_formats(args.formats), args.workers))
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
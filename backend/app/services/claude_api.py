@@ -1,28 +1,18 @@
 import os
 import logging
 import json
-import httpx
 from typing import Optional, List, Dict, Any
 from app.models import TripConstraints
+from app.mcp.models import Itinerary, DayItinerary, ItineraryBlock, POI, GeoPoint
+from app.services.llm_client import llm_client, tool_from_model
+from app.services.prompt_budget import build_budgeted_draft, compact_draft, estimate_tokens, truncate_to_tokens
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-async def extract_constraints_with_claude(transcript: str, existing_constraints: dict = None, history: list = []) -> TripConstraints:
-    """
-    Uses Anthropic Claude 3.5 Sonnet API for robust intent extraction.
-    """
-    try:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("Anthropic API key not configured")
-        
-        # System instruction describes the task and current state
-        system_instruction = f"""You are an AI travel assistant. Extract trip constraints from the user's input, considering the conversation history.
-
-Today's Date: {datetime.now().strftime('%Y-%m-%d (%A)')}
-
-Current Known Constraints: {json.dumps(existing_constraints, default=str) if existing_constraints else "{}"}
+# Static instruction blocks. These form the static prefix of each system prompt (cached where it
+# is long enough), so they must not contain anything request-specific (dates, cities, constraints, drafts).
+CONSTRAINTS_SYSTEM_PROMPT = """You are an AI travel assistant. Extract trip constraints from the user's input, considering the conversation history.
 
 Extract: Destination City, Start/End Date, Duration (days), Budget Level, Travelers Count, Pace, Interests, Must Visit, Avoid.
 
@@ -34,9 +24,10 @@ Also generate a 'suggested_response':
 - If the user asks a question (e.g., "places to eat"), ANSWER it briefly in 'suggested_response'.
 - If the user provides info, confirm it politely in 'suggested_response'.
 - If info is missing, ask for it in 'clarification_question' (and keep 'suggested_response' null or polite acknowledgement).
+- If nothing is missing, end 'suggested_response' by asking whether you should generate the itinerary.
 
 Return ONLY a JSON object (no markdown, no explanation) matching this schema:
-{{
+{
     "destination_city": string | null,
     "start_date": string | null,
     "end_date": string | null,
@@ -51,7 +42,150 @@ Return ONLY a JSON object (no markdown, no explanation) matching this schema:
     "missing_info": [string],
     "clarification_question": string | null,
     "suggested_response": string | null
-}}"""
+}"""
+
+POI_SYSTEM_PROMPT = """You generate lists of real, specific places for travelers.
+
+For each item, provide:
+- name: string
+- category: string (the requested category)
+- description: string (concise)
+- rating: float (1-5)
+- location: {"lat": float, "lon": float}
+- details: {
+    "timings": string,
+    "cost": string,
+    "tips": string
+  }
+
+Return the items as a JSON array under the "pois" key. No markdown, no intro/outro."""
+
+CURATION_SYSTEM_PROMPT = """You are a master travel curator and local expert.
+Your task is to refine a draft trip into a premium, detailed travel guide.
+
+*** CORE OPTIMIZATION LOGIC ***
+You MUST generate the itinerary based on this "Efficiency & Value" protocol:
+1. OPIMIZE EFFORT (Logistics): strictly group activities geographically. Minimize travel time between slots.
+2. MAXIMIZE TIME (Density): The user wants to "max out" high-quality experiences. If a main activity leaves a time gap, insert a quick, high-quality nearby stop.
+3. OPTIMIZE MONEY (Value): ensure every dollar spent returns high engagement.
+4. QUALITY OVER QUANTITY: "Maxing out" means 3-4 *impactful* memories per day.
+
+REQUIREMENTS FOR EACH ACTIVITY:
+1. Precise Timings (e.g., 09:00 AM - 11:30 AM).
+2. Deep Qualitative Description: You MUST structured the description to cover these 4 points using Markdown bolding:
+   - **Significance & Vibe**: The historical/cultural importance, plus the "vibe" (e.g., "Chaotic but thrilling").
+   - **Reviewer Verdict**: Synthesize insights from traveler reviews (e.g., "Travelers love the sunset view but warn about the queues").
+   - **Why Chosen**: Specific rationale for THIS user and THIS time slot (e.g., "Scheduled for morning to beat the crowds").
+   - **Best Use**: Strategic advice (e.g., "Enter via the East Gate," "Order the signature matcha latte").
+3. Activity Cost: Specific estimate.
+4. Local Tip: A secret "pro-tip" to avoid crowds, save money, or find a hidden gem.
+5. Deep Link: A URL to more info.
+
+REQUIREMENTS FOR TRIP OVERVIEW:
+1. Summary Rationale: Explain how you optimized their Time, Money, and Effort.
+2. Accomodation Suggestion: Recommend a specific area or hotel type.
+3. Transportation: How should they get around?
+4. Snacking/Food Tips: Specific local snacks to try.
+
+Record the itinerary with the record_itinerary tool: one block per time slot, each POI's description being the 4-point qualitative description above and its source_url the deep link."""
+
+DAY_CURATION_SYSTEM_PROMPT = """You are a master travel curator and local expert editing ONE day of an existing trip.
+
+You receive the current day, the user's requested change and the replacement candidates.
+- Apply the requested change to the blocks marked "replace", choosing from the candidates where they fit.
+- Keep every block marked "keep" on the same place; you may only adjust its timings and travel time so the day flows.
+- Strictly group activities geographically and keep realistic travel times between slots.
+
+REQUIREMENTS FOR EACH REPLACED ACTIVITY:
+1. Precise Timings (e.g., 09:00 AM - 11:30 AM).
+2. Description covering, in Markdown bold headings: **Significance & Vibe**, **Reviewer Verdict**, **Why Chosen**, **Best Use**.
+3. Activity Cost: Specific estimate.
+4. Local Tip: A secret "pro-tip" to avoid crowds, save money, or find a hidden gem.
+5. Deep Link: A URL to more info.
+
+Return the whole day (all blocks, in order) with the same day_number."""
+
+# Schema-constrained output: the model must answer through these tools, so replies are
+# parsed from the tool input instead of being regex-searched out of free text.
+CONSTRAINTS_TOOL = tool_from_model(
+    "record_trip_constraints",
+    "Record the trip constraints extracted from the conversation.",
+    TripConstraints
+)
+POIS_TOOL = tool_from_model(
+    "record_pois",
+    "Record the generated points of interest.",
+    POI,
+    list_key="pois"
+)
+ITINERARY_TOOL = tool_from_model(
+    "record_itinerary",
+    "Record the curated day-by-day itinerary.",
+    Itinerary
+)
+DAY_TOOL = tool_from_model(
+    "record_day",
+    "Record the edited day of the itinerary.",
+    DayItinerary
+)
+
+
+# Shortest prefix (tool definitions + marked system text) each model family will cache.
+# Shorter marked prefixes are accepted but never written to the cache.
+CACHE_MIN_TOKENS = {"haiku": 2048, "sonnet": 1024, "opus": 1024}
+
+
+def cache_min_tokens(model: str) -> int:
+    return next((tokens for family, tokens in CACHE_MIN_TOKENS.items() if family in model), 1024)
+
+
+def cache_prefix_tokens(static_prompt: str, tool: Dict[str, Any]) -> int:
+    """Approximate size of the prefix a cache marker on `static_prompt` would cover."""
+    return estimate_tokens(json.dumps(tool) + static_prompt)
+
+
+def cached_system_blocks(static_prompt: str, dynamic_prompt: str, cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    System prompt as content blocks, with the static prefix marked for prompt caching.
+    Prefixes below the routed model's CACHE_MIN_TOKENS are never cached, so those calls
+    pass cache=False. Only full curation clears the bar today: constraint extraction (every
+    conversational turn), POI generation and single-day curation run uncached.
+    """
+    static_block = {"type": "text", "text": static_prompt}
+    if cache:
+        static_block["cache_control"] = {"type": "ephemeral"}
+    return [static_block, {"type": "text", "text": dynamic_prompt}]
+
+
+def get_prompt_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-task prompt cache statistics, including the hit rate."""
+    report = {}
+    for task, stats in llm_client.get_stats()["tasks"].items():
+        hit_rate = round(stats["cache_hits"] / stats["calls"], 3) if stats["calls"] else 0.0
+        report[task] = {
+            "calls": stats["calls"],
+            "cache_hits": stats["cache_hits"],
+            "cache_read_input_tokens": stats["cache_read_input_tokens"],
+            "cache_creation_input_tokens": stats["cache_creation_input_tokens"],
+            "input_tokens": stats["input_tokens"],
+            "hit_rate": hit_rate
+        }
+    return report
+
+
+async def extract_constraints_with_claude(transcript: str, existing_constraints: dict = None, history: list = [],
+                                          summary: str = None) -> TripConstraints:
+    """
+    Uses Claude for robust intent extraction (routed to a fast model by the LLM client).
+    `summary` condenses turns older than `history` (server-side sessions).
+    """
+    try:
+        # Dynamic suffix describes the current state; the instructions are the cached prefix
+        dynamic_instruction = f"""Today's Date: {datetime.now().strftime('%Y-%m-%d (%A)')}
+
+Current Known Constraints: {json.dumps(existing_constraints, default=str) if existing_constraints else "{}"}"""
+        if summary:
+            dynamic_instruction += f"\n\nEarlier Conversation (summary): {summary}"
 
         # Prepare messages from history
         messages = []
@@ -71,81 +205,93 @@ Return ONLY a JSON object (no markdown, no explanation) matching this schema:
         if not messages or messages[-1]["content"] != transcript:
             messages.append({"role": "user", "content": transcript})
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json"
-                },
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 1024,
-                    "system": system_instruction, # System prompt goes here for Anthropic
-                    "messages": messages
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Claude API error: {response.status_code} - {response.text}")
-                raise Exception(f"Claude returned {response.status_code}")
-            
-            result = response.json()
-            text = result["content"][0]["text"].strip()
-            
-            # Robust JSON extraction
-            import re
-            json_match = re.search(r"(\{.*\})", text, re.DOTALL)
-            if json_match:
-                text = json_match.group(1)
-            else:
-                # Remove markdown if present as fallback
-                text = text.replace("```json", "").replace("```", "").strip()
+        response = await llm_client.complete(
+            "extract_constraints",
+            messages,
+            # Tool schema + instructions are ~800 tokens, under Haiku's 2048-token cache minimum
+            system=cached_system_blocks(CONSTRAINTS_SYSTEM_PROMPT, dynamic_instruction, cache=False),
+            max_tokens=1024,
+            tool=CONSTRAINTS_TOOL
+        )
+        data = response.data
+        
+        try:
+            # Ensure all required fields are present to avoid validation errors
+            defaults = {
+                "destination_city": None,
+                "start_date": None,
+                "end_date": None,
+                "duration_days": None,
+                "budget_level": "Moderate",
+                "travelers_count": 1,
+                "pace": "Moderate",
+                "interests": [],
+                "must_visit": [],
+                "avoid": [],
+                "is_complete": False,
+                "missing_info": [],
+                "clarification_question": None,
+                "suggested_response": None
+            }
+            for key, val in defaults.items():
+                if key not in data:
+                    data[key] = val
             
-            try:
-                data = json.loads(text)
-                # Ensure all required fields are present to avoid validation errors
-                defaults = {
-                    "destination_city": None,
-                    "start_date": None,
-                    "end_date": None,
-                    "duration_days": None,
-                    "budget_level": "Moderate",
-                    "travelers_count": 1,
-                    "pace": "Moderate",
-                    "interests": [],
-                    "must_visit": [],
-                    "avoid": [],
-                    "is_complete": False,
-                    "missing_info": [],
-                    "clarification_question": None,
-                    "suggested_response": None
-                }
-                for key, val in defaults.items():
-                    if key not in data:
-                        data[key] = val
-                
-                return TripConstraints(**data)
-            except Exception as e:
-                logger.error(f"Failed to parse Claude JSON: {text}")
-                raise e
+            return TripConstraints(**data)
+        except Exception as e:
+            logger.error(f"Failed to validate Claude constraints: {json.dumps(data, default=str)}")
+            raise e
         
     except Exception as e:
         logger.error(f"Claude error: {str(e)}")
         raise e
 
 
+async def generate_response_with_claude(prompt: str, max_tokens: int = 256) -> Optional[str]:
+    """
+    Generates a short free-text answer for a fully-formed prompt.
+    """
+    try:
+        response = await llm_client.complete(
+            "explanation",
+            [{"role": "user", "content": prompt}],
+            max_tokens=max_tokens
+        )
+        return response.text
+    except Exception as e:
+        logger.error(f"Claude response error: {str(e)}")
+        return None
+
+
+SUMMARY_SYSTEM_PROMPT = """You maintain the running memory of a conversation between a traveler and a travel planning assistant.
+Merge the existing summary with the new turns into one updated summary of at most 120 words.
+Keep decisions, stated preferences, rejected options and open questions. Drop greetings and filler.
+Reply with the summary text only."""
+
+
+async def summarize_conversation_with_claude(summary: str, turns: list) -> Optional[str]:
+    """
+    Folds older conversation turns into the rolling session summary.
+    """
+    try:
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        response = await llm_client.complete(
+            "summarize_session",
+            [{"role": "user", "content": f"Existing summary: {summary or '(none)'}\n\nNew turns:\n{transcript}"}],
+            system=SUMMARY_SYSTEM_PROMPT,
+            max_tokens=300
+        )
+        return response.text.strip() or None
+    except Exception as e:
+        logger.error(f"Claude summary error: {str(e)}")
+        return None
+
+
 async def generate_explanation_with_claude(question: str, context: str = "") -> str:
     """
     Generates an explanation using Claude API.
     """
-    try:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key or api_key == "YOUR_ANTHROPIC_API_KEY_HERE":
-            raise ValueError("Anthropic API key not configured")
-        
-        prompt = f"""You are a travel assistant. Answer the user's question based on the Context provided.
+    prompt = f"""You are a travel assistant. Answer the user's question based on the Context provided.
 
 Context (Travel Tips):
 {context}
@@ -154,133 +300,83 @@ User Question: "{question}"
 
 Answer concisely (under 50 words). If the answer isn't in the context, use general knowledge but mention it's general advice."""
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json"
-                },
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 256,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ]
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Claude API error: {response.status_code} - {response.text}")
-                return "I'm having trouble generating an answer right now."
-            
-            result = response.json()
-            return result["content"][0]["text"].strip()
-        
-    except Exception as e:
-        logger.error(f"Claude explanation error: {str(e)}")
-        return "I encountered an error trying to explain that."
+    answer = await generate_response_with_claude(prompt)
+    return answer or "I'm having trouble generating an answer right now."
 
 async def generate_pois_with_claude(city: str, interests: list = None, category: str = "attractions") -> list:
     """
     Uses Claude to generate a list of POIs for a city.
     """
     try:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            return []
-            
-        system_instruction = f"""Generate a JSON array of 10 {category} in {city}.
+        dynamic_instruction = f"""Generate a JSON array of 10 {category} in {city}.
 Include specific places based on these interests: {', '.join(interests) if interests else 'General sightseeing'}.
-
-For each item, provide:
-- name: string
-- category: "{category}"
-- description: string (concise)
-- rating: float (1-5)
-- location: {{"lat": float, "lon": float}}
-- details: {{
-    "timings": string,
-    "cost": string,
-    "tips": string
-  }}
-
-Return ONLY a valid JSON array. No markdown, no intro/outro."""
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json"
-                },
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 2048,
-                    "system": system_instruction,
-                    "messages": [{"role": "user", "content": f"Generate {category} in {city}"}]
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Claude POI error: {response.status_code} - {response.text}")
-                return []
-            
-            result = response.json()
-            text = result["content"][0]["text"].strip()
-            
-            import re
-            json_match = re.search(r"(\[.*\])", text, re.DOTALL)
-            if json_match:
-                text = json_match.group(1)
-            else:
-                text = text.replace("```json", "").replace("```", "").strip()
-            
-            return json.loads(text)
+Use "{category}" as the category of every item."""
+
+        response = await llm_client.complete(
+            "generate_pois",
+            [{"role": "user", "content": f"Generate {category} in {city}"}],
+            # Tool schema + instructions are ~450 tokens, under Sonnet's 1024-token cache minimum
+            system=cached_system_blocks(POI_SYSTEM_PROMPT, dynamic_instruction, cache=False),
+            max_tokens=2048,
+            tool=POIS_TOOL
+        )
+        data = response.data
+        return data.get("pois", []) if isinstance(data, dict) else data
             
     except Exception as e:
         logger.error(f"Claude POI generation failed: {e}")
         return []
 
 
+def _blocks_from_data(day_number: int, blocks_data: list) -> list:
+    """Rebuilds ItineraryBlocks from curated JSON, skipping incomplete blocks."""
+    blocks = []
+    for b_data in blocks_data:
+        p_data = b_data.get("poi", {})
+        # A reply repaired after truncation can end with a half-written block
+        if not b_data.get("time_block") or not p_data.get("name"):
+            continue
+        loc = p_data.get("location") or {"lat": 0.0, "lon": 0.0}
+        
+        poi = POI(
+            id=f"curated-{day_number}-{b_data['time_block']}",
+            name=p_data.get("name", "Unknown"),
+            category=p_data.get("category", "sightseeing"),
+            description=p_data.get("description", ""),
+            rating=p_data.get("rating", 4.0),
+            source_url=p_data.get("source_url"),
+            location=GeoPoint(lat=loc.get("lat", 0.0), lon=loc.get("lon", 0.0)),
+            details=p_data.get("details", {})
+        )
+        
+        blocks.append(ItineraryBlock(
+            time_block=b_data.get("time_block"),
+            poi=poi,
+            start_time=b_data.get("start_time"),
+            end_time=b_data.get("end_time"),
+            travel_time_from_previous=b_data.get("travel_time_from_previous"),
+            activity_cost=b_data.get("activity_cost"),
+            local_tip=b_data.get("local_tip")
+        ))
+    return blocks
+
+
 async def curate_itinerary_with_claude(request, draft_days: list, weather_info: str = "", city_summary: str = "") -> Optional[Any]:
     """
     Uses Claude to curate and refine the draft itinerary into a premium travel guide.
     """
-    from app.mcp.models import Itinerary, DayItinerary, ItineraryBlock, POI, GeoPoint
-    
     try:
-        api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
-            return None
-
-        # Prepare a rich version of the draft for the prompt
-        rich_draft = []
-        for d in draft_days:
-            day_info = {"day": d.day_number, "activities": []}
-            for b in d.blocks:
-                # Include ALL available data from our sources
-                day_info["activities"].append({
-                    "slot": b.time_block,
-                    "name": b.poi.name,
-                    "category": b.poi.category,
-                    "rating": b.poi.rating,
-                    "source_desc": b.poi.description,
-                    "source_details": b.poi.details
-                })
-            rich_draft.append(day_info)
-
-        system_instruction = f"""You are a master travel curator and local expert.
-Task: Refine this {request.days}-day trip to {request.city} into a premium, detailed travel guide.
+        # Compact the draft: drop empty fields, hoist shared city context, cap field lengths
+        draft_json, shared_context, draft_tokens = build_budgeted_draft(draft_days)
+        
+        city_overview = truncate_to_tokens(city_summary, 125) if city_summary else shared_context.get("city_description", "")
+        extra_context = ""
+        if shared_context.get("city_guide"):
+            extra_context += f"\nWikivoyage Guide: {shared_context['city_guide']}"
+        if not weather_info and shared_context.get("weather_summary"):
+            weather_info = shared_context["weather_summary"]
 
-*** CORE OPTIMIZATION LOGIC ***
-You MUST generate the itinerary based on this "Efficiency & Value" protocol:
-1. OPIMIZE EFFORT (Logistics): strictly group activities geographically. Minimize travel time between slots.
-2. MAXIMIZE TIME (Density): The user wants to "max out" high-quality experiences. If a main activity leaves a time gap, insert a quick, high-quality nearby stop.
-3. OPTIMIZE MONEY (Value): ensure every dollar spent returns high engagement.
-4. QUALITY OVER QUANTITY: "Maxing out" means 3-4 *impactful* memories per day.
+        dynamic_instruction = f"""Task: Refine this {request.days}-day trip to {request.city} into a premium, detailed travel guide.
 
 USER CONSTRAINTS:
 Interests: {', '.join(request.interests)}
@@ -290,131 +386,103 @@ Must Visit: {', '.join(request.must_visit) if request.must_visit else 'None spec
 
 CONTEXT:
 Weather: {weather_info}
-City Overview: {city_summary[:500]}...
+City Overview: {city_overview}{extra_context}
 
-Draft Itinerary (Skeleton with raw data): {json.dumps(rich_draft)}
+Draft Itinerary (Skeleton with raw data): {draft_json}"""
 
-REQUIREMENTS FOR EACH ACTIVITY:
-1. Precise Timings (e.g., 09:00 AM - 11:30 AM).
-2. Deep Qualitative Description: You MUST structured the description to cover these 4 points using Markdown bolding:
-   - **Significance & Vibe**: The historical/cultural importance, plus the "vibe" (e.g., "Chaotic but thrilling").
-   - **Reviewer Verdict**: Synthesize insights from traveler reviews (e.g., "Travelers love the sunset view but warn about the queues").
-   - **Why Chosen**: Specific rationale for THIS user and THIS time slot (e.g., "Scheduled for morning to beat the crowds").
-   - **Best Use**: Strategic advice (e.g., "Enter via the East Gate," "Order the signature matcha latte").
-3. Activity Cost: Specific estimate.
-4. Local Tip: A secret "pro-tip" to avoid crowds, save money, or find a hidden gem.
-5. Deep Link: A URL to more info.
-
-REQUIREMENTS FOR TRIP OVERVIEW:
-1. Summary Rationale: Explain how you optimized their Time, Money, and Effort.
-2. Accomodation Suggestion: Recommend a specific area or hotel type.
-3. Transportation: How should they get around?
-4. Snacking/Food Tips: Specific local snacks to try.
+        logger.info(f"Curation prompt: ~{estimate_tokens(CURATION_SYSTEM_PROMPT + dynamic_instruction)} tokens (draft ~{draft_tokens})")
 
-Return ONLY a valid JSON object matching this schema:
-{{
-    "trip_title": string,
-    "summary_rationale": string,
-    "weather_forecast": string,
-    "transportation_tips": string,
-    "accommodation_suggestion": string,
-    "total_cost_estimate": string,
-    "days": [
-        {{
-            "day_number": int,
-            "blocks": [
-                {{
-                    "time_block": "Morning" | "Afternoon" | "Evening",
-                    "start_time": string,
-                    "end_time": string,
-                    "travel_time_from_previous": string | null,
-                    "activity_cost": string,
-                    "local_tip": string,
-                    "poi": {{
-                        "name": string,
-                        "category": string,
-                        "description": string (The 4-point qualitative description),
-                        "rating": float,
-                        "source_url": string,
-                        "location": {{"lat": float, "lon": float}},
-                        "details": {{ "tips": string, "cost": string }}
-                    }}
-                }}
-            ]
-        }}
-    ]
-}}"""
-
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json"
-                },
-                json={
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 4096,
-                    "system": system_instruction,
-                    "messages": [{"role": "user", "content": "Refine my trip itinerary"}]
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Claude curation error: {response.text}")
-                return None
-            
-            result = response.json()
-            text = result["content"][0]["text"].strip()
-            
-            import re
-            json_match = re.search(r"(\{.*\})", text, re.DOTALL)
-            if json_match:
-                text = json_match.group(1)
-            
-            data = json.loads(text)
-            
-            # Reconstruct into models
-            final_days = []
-            for d_data in data.get("days", []):
-                blocks = []
-                for b_data in d_data.get("blocks", []):
-                    p_data = b_data.get("poi", {})
-                    loc = p_data.get("location", {"lat": 0.0, "lon": 0.0})
-                    
-                    poi = POI(
-                        id=f"curated-{d_data['day_number']}-{b_data['time_block']}",
-                        name=p_data.get("name", "Unknown"),
-                        category=p_data.get("category", "sightseeing"),
-                        description=p_data.get("description", ""),
-                        rating=p_data.get("rating", 4.0),
-                        source_url=p_data.get("source_url"),
-                        location=GeoPoint(lat=loc.get("lat", 0.0), lon=loc.get("lon", 0.0)),
-                        details=p_data.get("details", {})
-                    )
-                    
-                    blocks.append(ItineraryBlock(
-                        time_block=b_data.get("time_block"),
-                        poi=poi,
-                        start_time=b_data.get("start_time"),
-                        end_time=b_data.get("end_time"),
-                        travel_time_from_previous=b_data.get("travel_time_from_previous"),
-                        activity_cost=b_data.get("activity_cost"),
-                        local_tip=b_data.get("local_tip")
-                    ))
+        response = await llm_client.complete(
+            "curate_itinerary",
+            [{"role": "user", "content": "Refine my trip itinerary"}],
+            system=cached_system_blocks(CURATION_SYSTEM_PROMPT, dynamic_instruction),
+            max_tokens=4096,
+            timeout=60.0,
+            tool=ITINERARY_TOOL
+        )
+        data = response.data
+        
+        # Reconstruct into models
+        final_days = []
+        for d_data in data.get("days", []):
+            if d_data.get("day_number") is None:
+                continue
+            blocks = _blocks_from_data(d_data["day_number"], d_data.get("blocks", []))
+            if blocks:
                 final_days.append(DayItinerary(day_number=d_data.get("day_number"), blocks=blocks))
-                
-            return Itinerary(
-                trip_title=data.get("trip_title", f"Trip to {request.city}"),
-                summary_rationale=data.get("summary_rationale"),
-                weather_forecast=data.get("weather_forecast"),
-                transportation_tips=data.get("transportation_tips"),
-                accommodation_suggestion=data.get("accommodation_suggestion"),
-                days=final_days,
-                total_cost_estimate=data.get("total_cost_estimate", request.budget)
-            )
+            
+        return Itinerary(
+            trip_title=data.get("trip_title", f"Trip to {request.city}"),
+            summary_rationale=data.get("summary_rationale"),
+            weather_forecast=data.get("weather_forecast"),
+            transportation_tips=data.get("transportation_tips"),
+            accommodation_suggestion=data.get("accommodation_suggestion"),
+            days=final_days,
+            total_cost_estimate=data.get("total_cost_estimate", request.budget)
+        )
             
     except Exception as e:
         logger.error(f"Claude curation failed: {e}")
         return None
+
+
+async def curate_day_with_claude(request, day, replace_slots: list, instruction: str, candidates: list) -> Optional[Any]:
+    """
+    Re-curates a single day after a targeted edit. Blocks whose time_block is in
+    `replace_slots` are swapped (using `candidates`), the rest keep their place.
+    Returns a DayItinerary, or None if the model's answer doesn't fit the day.
+    """
+    try:
+        field_tokens = int(os.getenv("CURATION_FIELD_TOKEN_BUDGET", 60))
+        (current,), _ = compact_draft([day], field_tokens)
+        for activity in current["activities"]:
+            activity["action"] = "replace" if activity.get("slot") in replace_slots else "keep"
+        (options,), _ = compact_draft(
+            [DayItinerary(day_number=0, blocks=[ItineraryBlock(time_block="candidate", poi=poi) for poi in candidates])],
+            field_tokens // 2
+        )
+        for activity in options["activities"]:
+            activity.pop("slot", None)
+
+        dynamic_instruction = f"""Task: Edit day {day.day_number} of a {request.days}-day trip to {request.city}.
+
+USER CONSTRAINTS:
+Interests: {', '.join(request.interests)}
+Pace: {request.pace}
+Budget: {request.budget}
+
+Requested change: {instruction}
+
+Current Day: {json.dumps(current, separators=(",", ":"), ensure_ascii=False)}
+
+Candidates: {json.dumps(options["activities"], separators=(",", ":"), ensure_ascii=False)}"""
+
+        logger.info(f"Day curation prompt: ~{estimate_tokens(DAY_CURATION_SYSTEM_PROMPT + dynamic_instruction)} tokens")
+
+        response = await llm_client.complete(
+            "curate_day",
+            [{"role": "user", "content": f"Edit day {day.day_number} of my trip"}],
+            # Tool schema + instructions are ~800 tokens, under Sonnet's 1024-token cache minimum
+            system=cached_system_blocks(DAY_CURATION_SYSTEM_PROMPT, dynamic_instruction, cache=False),
+            max_tokens=2048,
+            timeout=30.0,
+            tool=DAY_TOOL
+        )
+        blocks = _blocks_from_data(day.day_number, response.data.get("blocks", []))
+        # The edit must not drop or invent slots
+        if [b.time_block for b in blocks] != [b.time_block for b in day.blocks]:
+            logger.warning(f"Day curation changed the slots of day {day.day_number}; ignoring it")
+            return None
+        # Kept blocks stay as they were (with their curated details); only their timings may move
+        for i, (original, curated) in enumerate(zip(day.blocks, blocks)):
+            if original.time_block not in replace_slots:
+                blocks[i] = original.model_copy(update={
+                    "start_time": curated.start_time or original.start_time,
+                    "end_time": curated.end_time or original.end_time,
+                    "travel_time_from_previous": curated.travel_time_from_previous or original.travel_time_from_previous
+                })
+        return DayItinerary(day_number=day.day_number, blocks=blocks)
+
+    except Exception as e:
+        logger.error(f"Claude day curation failed: {e}")
+        return None
@@ -0,0 +1,177 @@
+"""
+Persistent content cache for slow-changing pages (Wikipedia summaries, Wikivoyage guides).
+
+Entries are stored in SQLite together with their ETag / Last-Modified validators.
+Reads follow stale-while-revalidate semantics:
+- fresh entries are served directly
+- stale entries are served immediately while a background task revalidates them
+- expired (or missing) entries are fetched on the request path, using conditional headers when possible
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    value: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Headers for a conditional GET against the origin."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass
+class FetchResult:
+    """What a fetcher returns. `not_modified=True` means the origin answered 304."""
+    value: Any = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+
+
+# A fetcher receives the previous entry (or None) and returns a FetchResult,
+# or None when the origin could not be reached / returned an error.
+Fetcher = Callable[[Optional[CacheEntry]], Awaitable[Optional[FetchResult]]]
+
+
+class ContentCache:
+    """SQLite-backed key/value cache with HTTP validators and stale-while-revalidate."""
+
+    def __init__(self, path: str = None, fresh_ttl: float = None, stale_ttl: float = None):
+        self.path = path or os.getenv("CONTENT_CACHE_PATH", "./content_cache.db")
+        # Served without revalidation for `fresh_ttl`, served stale (and revalidated
+        # in the background) up to `stale_ttl`, refetched synchronously after that.
+        self.fresh_ttl = fresh_ttl if fresh_ttl is not None else float(os.getenv("CONTENT_CACHE_FRESH_SECONDS", 24 * 3600))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv("CONTENT_CACHE_STALE_SECONDS", 30 * 24 * 3600))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._revalidating: Dict[str, asyncio.Task] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS content_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def warm_up(self) -> None:
+        """Opens the database (and creates the table) ahead of the first request."""
+        with self._lock:
+            self._connection()
+
+    def status(self) -> Dict[str, Any]:
+        if self._conn is None:
+            return {"status": "cold", "path": self.path}
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM content_cache").fetchone()[0]
+        return {"status": "ready", "path": self.path, "entries": entries}
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value, etag, last_modified, fetched_at FROM content_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return CacheEntry(key=key, value=json.loads(row[0]), etag=row[1], last_modified=row[2], fetched_at=row[3])
+
+    def set(self, key: str, value: Any, etag: str = None, last_modified: str = None) -> CacheEntry:
+        entry = CacheEntry(key=key, value=value, etag=etag, last_modified=last_modified, fetched_at=time.time())
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO content_cache (key, value, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), etag, last_modified, entry.fetched_at)
+            )
+            conn.commit()
+        return entry
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as freshly validated (origin answered 304 Not Modified)."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE content_cache SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM content_cache WHERE key = ?", (key,))
+            conn.commit()
+
+    async def get_or_fetch(self, key: str, fetcher: Fetcher, default: Any = None) -> Any:
+        """
+        Returns the cached value for `key`, revalidating through `fetcher` as needed.
+        Falls back to whatever is cached (even if expired) when the origin fails.
+        """
+        entry = self.get(key)
+
+        if entry is not None:
+            age = entry.age()
+            if age < self.fresh_ttl:
+                return entry.value
+            if age < self.stale_ttl:
+                self._schedule_revalidation(key, fetcher, entry)
+                return entry.value
+
+        refreshed = await self._revalidate(key, fetcher, entry)
+        if refreshed is not None:
+            return refreshed.value
+        return entry.value if entry is not None else default
+
+    def _schedule_revalidation(self, key: str, fetcher: Fetcher, entry: CacheEntry) -> None:
+        task = self._revalidating.get(key)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self._revalidate(key, fetcher, entry))
+        self._revalidating[key] = task
+        task.add_done_callback(lambda t: self._revalidating.pop(key, None))
+
+    async def _revalidate(self, key: str, fetcher: Fetcher, entry: Optional[CacheEntry]) -> Optional[CacheEntry]:
+        try:
+            result = await fetcher(entry)
+        except Exception as e:
+            logger.warning(f"Content cache revalidation failed for {key}: {e}")
+            return None
+
+        if result is None:
+            return None
+        if result.not_modified and entry is not None:
+            self.touch(key)
+            entry.fetched_at = time.time()
+            return entry
+        return self.set(key, result.value, etag=result.etag, last_modified=result.last_modified)
+
+
+# Global instance
+content_cache = ContentCache()
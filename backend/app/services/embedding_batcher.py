@@ -0,0 +1,84 @@
+import os
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches query embeddings across concurrent requests.
+
+    Texts passed to `embed` within `max_wait_ms` of each other (or until `max_batch_size`
+    is reached) are embedded with a single `embed_fn(texts)` call on `executor`, and each
+    caller gets its own vector back. One ONNX run over N texts is much cheaper than N runs.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[Any]],
+        max_batch_size: int = None,
+        max_wait_ms: float = None,
+        executor=None
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size or int(os.getenv("RAG_BATCH_MAX_SIZE", 32))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("RAG_BATCH_MAX_WAIT_MS", 5))
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Loop the pending futures and timer belong to
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks = set()
+        self.stats: Dict[str, int] = {"batches": 0, "items": 0, "max_batch": 0}
+
+    async def embed(self, text: str) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First call on this loop (e.g. a previous one was closed): anything queued or
+            # scheduled on the old loop can never complete, so start over
+            if self._timer is not None:
+                self._timer.cancel()
+            self._loop, self._timer, self._pending = loop, None, []
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # Identical texts in the same window are embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(self.executor, self.embed_fn, texts)
+        except Exception as e:
+            logger.error(f"Batched embedding of {len(texts)} texts failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(texts))
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
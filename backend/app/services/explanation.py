@@ -1,7 +1,7 @@
 import httpx
 import os
 import logging
-from app.services.rag_engine import rag_engine
+from app.services.rag_engine import rag_engine, RAGOverloadedError
 
 logger = logging.getLogger(__name__)
 
@@ -18,15 +18,27 @@ async def generate_explanation(question: str, context: dict = None) -> str:
         if context and context.get("poi_name"):
             query = f"{context['poi_name']} {question}"
         
-        retrieved_docs = rag_engine.query(query)
-        knowledge_text = "\n".join(retrieved_docs) if retrieved_docs else "No specific travel tips found."
+        # Scope retrieval to the trip's destination so other cities' tips don't leak in
+        city = context.get("destination_city") if context else None
+        try:
+            retrieved_docs = await rag_engine.aquery(query, city=city)
+        except RAGOverloadedError as e:
+            # Shed retrieval under load; the LLM can still answer from general knowledge
+            logger.warning(f"Skipping RAG context: {e}")
+            retrieved_docs = []
 
         # 2. Synthesize Answer using Claude
-        prompt = f"""Based on the Context and Itinerary provided, answer the user's question.
-
+        # Off-topic questions retrieve nothing (relevance threshold), so the context section is
+        # left out entirely instead of padding the prompt with "no tips found".
+        knowledge_section = ""
+        if retrieved_docs:
+            knowledge_text = "\n".join(retrieved_docs)
+            knowledge_section = f"""
 Context (Travel Knowledge):
 {knowledge_text}
-        
+"""
+        prompt = f"""Based on the Context and Itinerary provided, answer the user's question.
+{knowledge_section}
 Itinerary Context: {context if context else 'None'}
         
 User Question: "{question}"
@@ -7,18 +7,78 @@ All completely FREE with no API keys required!
 """
 
 import os
+import re
+import html
 import logging
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from app.mcp.models import POI, GeoPoint
+from app.services.content_cache import content_cache, CacheEntry, FetchResult
+from app.services.knowledge_ingest import knowledge_ingestor
+from app.services.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+WIKIVOYAGE_API_URL = "https://en.wikivoyage.org/w/api.php"
+WIKIVOYAGE_SECTIONS = ["See", "Do", "Eat", "Drink", "Sleep", "Stay safe", "Get around"]
+SECTION_TEXT_MAX_CHARS = 4000
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+# Cities don't move: successful lookups are kept for the life of the process
+_geocode_cache = LRUCache(int(os.getenv("GEOCODE_CACHE_SIZE", 512)))
+
+_H2_RE = re.compile(r"<h2[^>]*>(.*?)</h2>", re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+_EDIT_LINK_RE = re.compile(r'<span class="mw-editsection.*?</span>\s*</span>', re.S)
+
+
+def _strip_html(fragment: str) -> str:
+    text = _TAG_RE.sub(" ", _EDIT_LINK_RE.sub("", fragment))
+    return " ".join(html.unescape(text).split())
+
+
+def extract_section_text(page_html: str, wanted: List[str], max_chars: int = SECTION_TEXT_MAX_CHARS) -> Dict[str, str]:
+    """Plain text of the wanted top-level (h2) sections of a parsed MediaWiki page."""
+    parts = _H2_RE.split(page_html or "")
+    # parts = [preamble, heading1, body1, heading2, body2, ...]
+    sections = {}
+    for heading, body in zip(parts[1::2], parts[2::2]):
+        name = _strip_html(heading)
+        if name in wanted:
+            text = _strip_html(body)
+            sections[name] = text[:max_chars]
+    return sections
+
 
 class FreeTravelDataService:
     """Service using completely FREE travel APIs - no keys required!"""
     
+    async def geocode_city(self, city: str) -> Optional[Tuple[float, float]]:
+        """
+        (lat, lon) of the city via Nominatim, cached per city; None when it can't be found.
+        """
+        key = " ".join(str(city).lower().split())
+        cached = _geocode_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                response = await client.get(
+                    NOMINATIM_URL,
+                    params={"q": city, "format": "json", "limit": 1},
+                    headers={"User-Agent": "TravelPlannerApp/1.0"}
+                )
+            if response.status_code != 200 or not response.json():
+                return None
+            location = response.json()[0]
+            coords = (float(location["lat"]), float(location["lon"]))
+        except Exception as e:
+            logger.error(f"Geocoding error for {city}: {str(e)}")
+            return None
+        _geocode_cache.set(key, coords)
+        return coords
+
     async def search_overpass_pois(self, city: str, category: str = "tourism") -> List[Dict]:
         """
         Search OpenStreetMap via Overpass API for POIs.
@@ -26,23 +86,15 @@ class FreeTravelDataService:
         """
         try:
             # First, geocode the city using Nominatim (OSM's geocoder)
+            coords = await self.geocode_city(city)
+            if coords is None:
+                logger.error(f"Geocoding failed for {city}")
+                return []
+            lat, lon = coords
+
             async with httpx.AsyncClient(timeout=30.0) as client:
-                nominatim_url = "https://nominatim.openstreetmap.org/search"
-                nominatim_params = {
-                    "q": city,
-                    "format": "json",
-                    "limit": 1
-                }
                 headers = {"User-Agent": "TravelPlannerApp/1.0"}
                 
-                geocode_response = await client.get(nominatim_url, params=nominatim_params, headers=headers)
-                if geocode_response.status_code != 200 or not geocode_response.json():
-                    logger.error(f"Geocoding failed for {city}")
-                    return []
-                
-                location = geocode_response.json()[0]
-                lat, lon = float(location["lat"]), float(location["lon"])
-                
                 # Build Overpass query based on category
                 if category in ["attractions", "sightseeing", "tourist_spots"]:
                     tags = ["tourism=attraction", "tourism=museum", "tourism=viewpoint", "historic=monument"]
@@ -129,105 +181,142 @@ class FreeTravelDataService:
         """
         Fetch travel guide from Wikivoyage.
         Returns sections like: See, Do, Eat, Sleep, Safety, etc.
+        Served from the persistent content cache; the search-title lookup is memoized separately.
         """
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # Search for the city page
-                search_url = "https://en.wikivoyage.org/w/api.php"
-                search_params = {
-                    "action": "query",
-                    "list": "search",
-                    "srsearch": city,
-                    "format": "json",
-                    "srlimit": 1
-                }
-                
-                search_response = await client.get(search_url, params=search_params)
-                if search_response.status_code != 200:
-                    return {}
-                
-                search_data = search_response.json()
-                if not search_data.get("query", {}).get("search"):
-                    return {}
-                
-                page_title = search_data["query"]["search"][0]["title"]
-                
-                # Get page content
-                content_params = {
-                    "action": "parse",
-                    "page": page_title,
-                    "format": "json",
-                    "prop": "text|sections"
-                }
-                
-                content_response = await client.get(search_url, params=content_params)
-                if content_response.status_code != 200:
-                    return {}
-                
-                content_data = content_response.json()
-                
-                # Extract sections
-                sections = content_data.get("parse", {}).get("sections", [])
-                guide = {
-                    "title": page_title,
-                    "sections": {}
-                }
-                
-                for section in sections:
-                    section_name = section.get("line", "")
-                    if section_name in ["See", "Do", "Eat", "Drink", "Sleep", "Stay safe", "Get around"]:
-                        guide["sections"][section_name] = section.get("index", "")
-                
-                logger.info(f"Retrieved Wikivoyage guide for {city}")
-                return guide
+            page_title = await content_cache.get_or_fetch(
+                f"wikivoyage:title:{city.lower()}",
+                lambda entry: self._fetch_wikivoyage_title(city, entry)
+            )
+            if not page_title:
+                return {}
+            
+            guide = await content_cache.get_or_fetch(
+                f"wikivoyage:guide:{page_title}",
+                lambda entry: self._fetch_wikivoyage_guide(page_title, entry),
+                default={}
+            )
+            
+            logger.info(f"Retrieved Wikivoyage guide for {city}")
+            knowledge_ingestor.submit_guide(city, guide)
+            return guide
                 
         except Exception as e:
             logger.error(f"Wikivoyage API error: {e}")
             return {}
     
+    async def _fetch_wikivoyage_title(self, city: str, entry: Optional[CacheEntry]) -> Optional[FetchResult]:
+        """Search Wikivoyage for the city page title."""
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            search_params = {
+                "action": "query",
+                "list": "search",
+                "srsearch": city,
+                "format": "json",
+                "srlimit": 1
+            }
+            
+            search_response = await client.get(WIKIVOYAGE_API_URL, params=search_params)
+            if search_response.status_code != 200:
+                return None
+            
+            search_data = search_response.json()
+            results = search_data.get("query", {}).get("search")
+            return FetchResult(value=results[0]["title"] if results else "")
+    
+    async def _fetch_wikivoyage_guide(self, page_title: str, entry: Optional[CacheEntry]) -> Optional[FetchResult]:
+        """Parse the Wikivoyage page into its travel sections (conditional GET when revalidating)."""
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            content_params = {
+                "action": "parse",
+                "page": page_title,
+                "format": "json",
+                "prop": "text|sections"
+            }
+            headers = entry.conditional_headers() if entry else {}
+            
+            content_response = await client.get(WIKIVOYAGE_API_URL, params=content_params, headers=headers)
+            if content_response.status_code == 304:
+                return FetchResult(not_modified=True)
+            if content_response.status_code != 200:
+                return None
+            
+            content_data = content_response.json()
+            
+            # Extract sections
+            sections = content_data.get("parse", {}).get("sections", [])
+            guide = {
+                "title": page_title,
+                "sections": {}
+            }
+            
+            for section in sections:
+                section_name = section.get("line", "")
+                if section_name in WIKIVOYAGE_SECTIONS:
+                    guide["sections"][section_name] = section.get("index", "")
+            
+            # Keep the section text too; it feeds the RAG knowledge base
+            page_html = content_data.get("parse", {}).get("text", {}).get("*", "")
+            guide["section_text"] = extract_section_text(page_html, WIKIVOYAGE_SECTIONS)
+            
+            return FetchResult(
+                value=guide,
+                etag=content_response.headers.get("etag"),
+                last_modified=content_response.headers.get("last-modified")
+            )
+    
     async def get_wikipedia_summary(self, city: str) -> str:
-        """Get Wikipedia summary/extract for a city."""
+        """Get Wikipedia summary/extract for a city (served from the persistent content cache)."""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                url = "https://en.wikipedia.org/api/rest_v1/page/summary/" + city.replace(" ", "_")
-                
-                response = await client.get(url)
-                if response.status_code != 200:
-                    return ""
-                
-                data = response.json()
-                summary = data.get("extract", "")
-                
-                logger.info(f"Retrieved Wikipedia summary for {city}")
-                return summary
+            summary = await content_cache.get_or_fetch(
+                f"wikipedia:summary:{city.lower()}",
+                lambda entry: self._fetch_wikipedia_summary(city, entry),
+                default=""
+            )
+            
+            logger.info(f"Retrieved Wikipedia summary for {city}")
+            knowledge_ingestor.submit(summary, city, "wikipedia")
+            return summary
                 
         except Exception as e:
             logger.error(f"Wikipedia API error: {e}")
             return ""
     
+    async def _fetch_wikipedia_summary(self, city: str, entry: Optional[CacheEntry]) -> Optional[FetchResult]:
+        """Fetch the REST summary, revalidating with ETag/Last-Modified when we have a prior copy."""
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            url = "https://en.wikipedia.org/api/rest_v1/page/summary/" + city.replace(" ", "_")
+            headers = entry.conditional_headers() if entry else {}
+            
+            response = await client.get(url, headers=headers)
+            if response.status_code == 304:
+                return FetchResult(not_modified=True)
+            if response.status_code == 404:
+                # Cache the miss too, so unknown titles don't hit Wikipedia every time
+                return FetchResult(value="")
+            if response.status_code != 200:
+                return None
+            
+            data = response.json()
+            return FetchResult(
+                value=data.get("extract", ""),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified")
+            )
+    
     async def get_weather_forecast(self, city: str, days: int = 7) -> Dict[str, Any]:
         """
         Get weather forecast using Open-Meteo API.
         Returns temperature, precipitation, weather codes for next N days.
         """
         try:
+            # First geocode with Nominatim
+            coords = await self.geocode_city(city)
+            if coords is None:
+                return {}
+            lat, lon = coords
+
             async with httpx.AsyncClient(timeout=30.0) as client:
-                # First geocode with Nominatim
-                nominatim_url = "https://nominatim.openstreetmap.org/search"
-                nominatim_params = {
-                    "q": city,
-                    "format": "json",
-                    "limit": 1
-                }
-                headers = {"User-Agent": "TravelPlannerApp/1.0"}
-                
-                geocode_response = await client.get(nominatim_url, params=nominatim_params, headers=headers)
-                if geocode_response.status_code != 200 or not geocode_response.json():
-                    return {}
-                
-                location = geocode_response.json()[0]
-                lat, lon = float(location["lat"]), float(location["lon"])
-                
                 # Get weather forecast
                 weather_url = "https://api.open-meteo.com/v1/forecast"
                 weather_params = {
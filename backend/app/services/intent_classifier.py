@@ -0,0 +1,174 @@
+"""
+Local fast path for trivial conversation turns.
+
+"yes", "ok generate it", "thanks" or a bare "Rome, 4 days, next friday" don't need a full
+LLM constraint extraction. Rules recognize confirmations, greetings, thanks and slot fills
+(every word is a known city, duration or date, or filler around one); when the RAG engine
+is already warm, its MiniLM embedder also matches other short utterances against a few
+prototype phrases per intent. Matched turns are answered by `extract_constraints_simple`;
+anything else, or anything with a question, negation or edit word in it, goes to the LLM.
+A bare confirmation only counts when the previous assistant turn offered to generate the
+itinerary; otherwise "yes" may be answering some other question.
+"""
+
+import os
+import re
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.services.planner import CITY_RE, DATE_RE, DURATION_RE
+
+logger = logging.getLogger(__name__)
+
+# Words a turn may consist of for each intent; at least one must come from `core`
+INTENT_WORDS = {
+    "thanks": {
+        "core": {"thanks", "thank", "thx", "cheers", "appreciate"},
+        "filler": {"you", "so", "much", "a", "lot", "ok", "okay", "great", "perfect", "awesome", "really", "it", "i"},
+    },
+    "greeting": {
+        "core": {"hi", "hello", "hey", "hiya", "namaste"},
+        "filler": {"good", "morning", "afternoon", "evening", "there", "again", "assistant"},
+    },
+    "confirm": {
+        "core": {"yes", "yeah", "yep", "yup", "sure", "ok", "okay", "alright", "perfect", "great", "awesome",
+                 "correct", "right", "exactly", "fine", "confirm", "confirmed", "generate", "create", "plan", "build", "proceed"},
+        "filler": {"please", "go", "ahead", "do", "it", "let's", "lets", "that's", "thats", "sounds", "looks", "good",
+                   "the", "my", "itinerary", "trip", "now", "then", "that", "is", "and", "all", "set", "make"},
+    },
+}
+# Allowed around recognized city/duration/date spans in a slot fill
+SLOT_FILLER = {
+    "i", "i'd", "i'm", "we", "we'd", "we're", "want", "wanna", "would", "like", "to", "go", "going", "visit", "travel",
+    "in", "for", "a", "an", "the", "of", "and", "trip", "days", "day", "from", "on", "starting", "start", "leaving",
+    "it", "make", "let's", "lets", "please", "how", "about", "maybe", "around", "plan", "planning", "there",
+    "ok", "okay", "yes", "sure", "so", "just", "stay", "staying", "be", "will", "hi", "hello", "hey",
+}
+# Any of these means the turn changes or questions something: leave it to the LLM
+ESCALATE_WORDS = {
+    "no", "nope", "nah", "not", "don't", "dont", "never", "but", "instead", "change", "wait", "cancel", "stop",
+    "actually", "except", "without", "more", "less", "fewer", "add", "remove", "swap", "replace", "rather",
+    "what", "why", "which", "where", "when", "who", "can", "could", "should",
+}
+# Assistant replies that offer to generate the itinerary, i.e. what a bare "yes" can confirm
+READY_PROMPT_RE = re.compile(
+    r"ready to (?:generate|plan)|generate (?:the|your) itinerary|press generate|shall i (?:plan|generate|create)",
+    re.IGNORECASE
+)
+# Prototype phrases for the embedding matcher
+INTENT_PROTOTYPES = {
+    "confirm": ["yes", "yes please", "ok generate it", "sounds good", "go ahead", "let's do it",
+                "that looks perfect", "sure, create my itinerary", "all good, plan the trip"],
+    "greeting": ["hi", "hello there", "hey", "good morning"],
+    "thanks": ["thanks", "thank you so much", "cheers", "great, thanks"],
+}
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    source: str  # "rules" or "embedding"
+    score: float = 1.0
+
+
+def _words(text: str) -> list:
+    return re.findall(r"[a-z0-9']+", text.lower().replace("’", "'"))
+
+
+class IntentClassifier:
+    """Decides whether a turn can be answered without the LLM."""
+
+    def __init__(self, enabled: bool = None, threshold: float = None, max_words: int = None):
+        self.enabled = enabled if enabled is not None else os.getenv("INTENT_FAST_PATH", "true").lower() == "true"
+        # Cosine similarity to the nearest prototype needed for an embedding match
+        self.threshold = threshold or float(os.getenv("INTENT_SIMILARITY_THRESHOLD", 0.85))
+        # Longer utterances always go to the LLM
+        self.max_words = max_words or int(os.getenv("INTENT_MAX_WORDS", 12))
+        self._prototypes = None
+        self.stats = {"rules": 0, "embedding": 0, "escalated": 0, "local_ms": 0.0}
+
+    def match_rules(self, text: str) -> Optional[IntentMatch]:
+        lowered = text.lower()
+        words = _words(lowered)
+        if not words or len(words) > self.max_words or "?" in text or ESCALATE_WORDS.intersection(words):
+            return None
+        for intent, vocab in INTENT_WORDS.items():
+            if vocab["core"].intersection(words) and all(w in vocab["core"] or w in vocab["filler"] for w in words):
+                return IntentMatch(intent, "rules")
+
+        # Slot fill: everything left after removing city / duration / date phrases is filler
+        residual, found = lowered, 0
+        for pattern in (CITY_RE, DURATION_RE, DATE_RE):
+            residual, count = pattern.subn(" ", residual)
+            found += count
+        if found and all(w in SLOT_FILLER for w in _words(residual)):
+            return IntentMatch("slot_fill", "rules")
+        return None
+
+    def _prototype_matrix(self, engine):
+        if self._prototypes is None:
+            import numpy as np
+            labels, phrases = [], []
+            for intent, examples in INTENT_PROTOTYPES.items():
+                labels.extend([intent] * len(examples))
+                phrases.extend(examples)
+            matrix = np.asarray(engine.embedding_fn(phrases), dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._prototypes = (labels, matrix)
+        return self._prototypes
+
+    async def match_embedding(self, text: str) -> Optional[IntentMatch]:
+        """Nearest prototype by MiniLM similarity; only when the RAG engine is already loaded."""
+        from app.services.rag_engine import rag_engine_status, get_rag_engine
+        if rag_engine_status()["status"] != "ready":
+            # Never pay the model load on a conversational turn
+            return None
+        words = _words(text)
+        if not words or len(words) > 6 or "?" in text or ESCALATE_WORDS.intersection(words) or CITY_RE.search(text.lower()):
+            return None
+        try:
+            import numpy as np
+            engine = get_rag_engine()
+            labels, matrix = self._prototype_matrix(engine)
+            vector = np.asarray(await engine.batcher.embed(" ".join(words)), dtype=np.float32)
+            scores = matrix @ (vector / np.linalg.norm(vector))
+            best = int(np.argmax(scores))
+        except Exception as e:
+            logger.error(f"Intent embedding error: {str(e)}")
+            return None
+        if scores[best] < self.threshold:
+            return None
+        return IntentMatch(labels[best], "embedding", float(scores[best]))
+
+    async def classify(self, text: str, existing_constraints: Dict[str, Any] = None,
+                       last_assistant_turn: str = None) -> Optional[IntentMatch]:
+        """
+        The local intent for this turn, or None when it needs the LLM. `last_assistant_turn`
+        is the reply the user is answering.
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        match = self.match_rules(text) or await self.match_embedding(text)
+        # "yes" confirms generation only right after we offered it; anything else (an
+        # open question, nothing to confirm yet) is better handled by the LLM
+        if match is not None and match.intent == "confirm" and not (
+                (existing_constraints or {}).get("destination_city")
+                and last_assistant_turn and READY_PROMPT_RE.search(last_assistant_turn)):
+            match = None
+        if match is None:
+            self.stats["escalated"] += 1
+            return None
+        self.stats[match.source] += 1
+        self.stats["local_ms"] += (time.perf_counter() - started) * 1000
+        logger.info(f"Intent fast path: {match.intent} via {match.source} ({match.score:.2f})")
+        return match
+
+    def get_stats(self) -> Dict[str, Any]:
+        local = self.stats["rules"] + self.stats["embedding"]
+        return dict(self.stats, local=local, avg_local_ms=round(self.stats["local_ms"] / local, 2) if local else None)
+
+
+intent_classifier = IntentClassifier()
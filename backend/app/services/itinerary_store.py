@@ -0,0 +1,268 @@
+"""
+Server-side itinerary store.
+
+Every saved itinerary gets an id and a version number; each save appends a new version
+(older versions stay readable for diffing). The ETag of a version is derived from its
+id, version and content hash, so clients can revalidate reads with If-None-Match,
+guard edits with If-Match, and derived artifacts (Markdown, PDF) can be cached per
+version. SQLite by default (ITINERARY_STORE_PATH). Itineraries not saved for
+ITINERARY_TTL_SECONDS are dropped, as are the least recently saved ones beyond
+ITINERARY_MAX_COUNT.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fields compared when diffing a block; the POI is compared by name
+BLOCK_FIELDS = ("time_block", "start_time", "end_time", "travel_time_from_previous", "activity_cost", "local_tip")
+TRIP_FIELDS = ("trip_title", "summary_rationale", "weather_forecast", "transportation_tips",
+               "accommodation_suggestion", "total_cost_estimate")
+
+
+class ItineraryNotFoundError(Exception):
+    pass
+
+
+class ItineraryVersionConflictError(Exception):
+    """If-Match didn't match the current version."""
+
+    def __init__(self, current_etag: str):
+        super().__init__(f"Itinerary was modified (current ETag {current_etag})")
+        self.current_etag = current_etag
+
+
+@dataclass
+class StoredItinerary:
+    id: str
+    version: int
+    etag: str
+    itinerary: Dict[str, Any]
+    constraints: Optional[Dict[str, Any]] = None
+    created_at: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "version": self.version,
+            "etag": self.etag,
+            "created_at": self.created_at,
+            "itinerary": self.itinerary
+        }
+
+
+def compute_etag(itinerary_id: str, version: int, body: str) -> str:
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+    return f'"{itinerary_id}-v{version}-{digest}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match / If-Match header value lists `etag` (or is `*`)."""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    # Weak comparison: proxies may add W/ to our strong tags
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def diff_itineraries(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Structural diff of two itinerary dicts: changed trip-level fields, and per day the
+    blocks that were added, removed or changed (POI and timing fields), matched by position.
+    """
+    fields = {
+        name: {"from": old.get(name), "to": new.get(name)}
+        for name in TRIP_FIELDS if old.get(name) != new.get(name)
+    }
+
+    old_days = {day.get("day_number"): day for day in old.get("days", [])}
+    new_days = {day.get("day_number"): day for day in new.get("days", [])}
+    days: List[Dict[str, Any]] = []
+    for day_number in sorted(set(old_days) | set(new_days), key=lambda n: (n is None, n)):
+        if day_number not in new_days:
+            days.append({"day_number": day_number, "status": "removed"})
+            continue
+        if day_number not in old_days:
+            days.append({"day_number": day_number, "status": "added"})
+            continue
+        old_blocks = old_days[day_number].get("blocks", [])
+        new_blocks = new_days[day_number].get("blocks", [])
+        blocks = []
+        for index in range(max(len(old_blocks), len(new_blocks))):
+            if index >= len(new_blocks):
+                blocks.append({"index": index, "status": "removed", "poi": old_blocks[index].get("poi", {}).get("name")})
+                continue
+            if index >= len(old_blocks):
+                blocks.append({"index": index, "status": "added", "poi": new_blocks[index].get("poi", {}).get("name")})
+                continue
+            before, after = old_blocks[index], new_blocks[index]
+            changes = {
+                name: {"from": before.get(name), "to": after.get(name)}
+                for name in BLOCK_FIELDS if before.get(name) != after.get(name)
+            }
+            old_poi, new_poi = before.get("poi", {}).get("name"), after.get("poi", {}).get("name")
+            if old_poi != new_poi:
+                changes["poi"] = {"from": old_poi, "to": new_poi}
+            elif before.get("poi") != after.get("poi"):
+                changes["poi_details"] = {"poi": new_poi}
+            if changes:
+                blocks.append({"index": index, "status": "changed", "changes": changes})
+        if blocks:
+            days.append({"day_number": day_number, "status": "changed", "blocks": blocks})
+
+    return {"changed": bool(fields or days), "fields": fields, "days": days}
+
+
+class ItineraryStore:
+    """SQLite-backed, append-only store of itinerary versions."""
+
+    def __init__(self, path: str = None, max_versions: int = None, ttl: float = None, max_itineraries: int = None):
+        self.path = path or os.getenv("ITINERARY_STORE_PATH", "./itineraries.db")
+        # Older versions beyond this many are pruned on save
+        self.max_versions = max_versions or int(os.getenv("ITINERARY_MAX_VERSIONS", 20))
+        # Whole itineraries are pruned when a new one is created: after `ttl` without a save,
+        # and least recently saved first beyond `max_itineraries`
+        self.ttl = ttl if ttl is not None else float(os.getenv("ITINERARY_TTL_SECONDS", 30 * 24 * 3600))
+        self.max_itineraries = max_itineraries or int(os.getenv("ITINERARY_MAX_COUNT", 10000))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS itinerary_versions (
+                    id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    etag TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    constraints TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (id, version)
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS itinerary_versions_created_at ON itinerary_versions (created_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _row_to_stored(self, itinerary_id: str, row) -> StoredItinerary:
+        version, etag, body, constraints, created_at = row
+        return StoredItinerary(
+            id=itinerary_id, version=version, etag=etag, itinerary=json.loads(body),
+            constraints=json.loads(constraints) if constraints else None, created_at=created_at
+        )
+
+    def get(self, itinerary_id: str, version: int = None) -> Optional[StoredItinerary]:
+        """The latest version, or a specific one."""
+        query = "SELECT version, etag, body, constraints, created_at FROM itinerary_versions WHERE id = ?"
+        params: tuple = (itinerary_id,)
+        if version is not None:
+            query += " AND version = ?"
+            params += (version,)
+        query += " ORDER BY version DESC LIMIT 1"
+        with self._lock:
+            row = self._connection().execute(query, params).fetchone()
+        return self._row_to_stored(itinerary_id, row) if row else None
+
+    def versions(self, itinerary_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT version, etag, created_at FROM itinerary_versions WHERE id = ? ORDER BY version",
+                (itinerary_id,)
+            ).fetchall()
+        return [{"version": version, "etag": etag, "created_at": created_at} for version, etag, created_at in rows]
+
+    def create(self, itinerary: Dict[str, Any], constraints: Dict[str, Any] = None) -> StoredItinerary:
+        with self._lock:
+            conn = self._connection()
+            self._prune(conn)
+            conn.commit()
+        return self._save(uuid.uuid4().hex, itinerary, constraints, if_match=None, must_exist=False)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.ttl
+        conn.execute(
+            """DELETE FROM itinerary_versions WHERE id IN (
+                SELECT id FROM itinerary_versions WHERE created_at < ?
+                EXCEPT SELECT id FROM itinerary_versions WHERE created_at >= ?
+            )""",
+            (cutoff, cutoff)
+        )
+        # Room for the itinerary about to be created
+        excess = conn.execute("SELECT COUNT(DISTINCT id) FROM itinerary_versions").fetchone()[0] - self.max_itineraries + 1
+        if excess > 0:
+            conn.execute(
+                """DELETE FROM itinerary_versions WHERE id IN (
+                    SELECT id FROM itinerary_versions GROUP BY id ORDER BY MAX(created_at) LIMIT ?
+                )""",
+                (excess,)
+            )
+
+    def update(self, itinerary_id: str, itinerary: Dict[str, Any], if_match: str = None) -> StoredItinerary:
+        """Saves a new version. With `if_match`, fails unless it matches the current ETag."""
+        return self._save(itinerary_id, itinerary, None, if_match=if_match, must_exist=True)
+
+    def _save(self, itinerary_id: str, itinerary: Dict[str, Any], constraints: Optional[Dict[str, Any]],
+              if_match: Optional[str], must_exist: bool) -> StoredItinerary:
+        body = json.dumps(itinerary, sort_keys=True, ensure_ascii=False, default=str)
+        with self._lock:
+            conn = self._connection()
+            current = conn.execute(
+                "SELECT version, etag, constraints FROM itinerary_versions WHERE id = ? ORDER BY version DESC LIMIT 1",
+                (itinerary_id,)
+            ).fetchone()
+            if must_exist and current is None:
+                raise ItineraryNotFoundError(itinerary_id)
+            if if_match and current is not None and not etag_matches(if_match, current[1]):
+                raise ItineraryVersionConflictError(current[1])
+            if current is not None and constraints is None and current[2]:
+                constraints = json.loads(current[2])
+
+            version = current[0] + 1 if current else 1
+            stored = StoredItinerary(
+                id=itinerary_id, version=version, etag=compute_etag(itinerary_id, version, body),
+                itinerary=json.loads(body), constraints=constraints, created_at=time.time()
+            )
+            conn.execute(
+                "INSERT INTO itinerary_versions (id, version, etag, body, constraints, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (itinerary_id, version, stored.etag, body, json.dumps(constraints) if constraints else None, stored.created_at)
+            )
+            conn.execute(
+                "DELETE FROM itinerary_versions WHERE id = ? AND version <= ?",
+                (itinerary_id, version - self.max_versions)
+            )
+            conn.commit()
+        return stored
+
+    def delete(self, itinerary_id: str) -> bool:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute("DELETE FROM itinerary_versions WHERE id = ?", (itinerary_id,)).rowcount
+            conn.commit()
+        return deleted > 0
+
+    def diff(self, itinerary_id: str, from_version: int = None, to_version: int = None) -> Dict[str, Any]:
+        """Diff between two versions; defaults to the previous version vs. the latest."""
+        latest = self.get(itinerary_id, to_version)
+        if latest is None:
+            raise ItineraryNotFoundError(itinerary_id)
+        base_version = from_version if from_version is not None else latest.version - 1
+        base = self.get(itinerary_id, base_version) if base_version >= 1 else None
+        if base is None:
+            raise ItineraryNotFoundError(f"{itinerary_id} v{base_version}")
+        return dict(diff_itineraries(base.itinerary, latest.itinerary), from_version=base.version, to_version=latest.version)
+
+
+itinerary_store = ItineraryStore()
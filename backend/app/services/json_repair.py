@@ -0,0 +1,185 @@
+"""
+Tolerant, incremental JSON parsing for LLM output.
+
+`StreamingJSONParser` is fed chunks as they arrive (e.g. `input_json_delta` events) and can
+produce a best-effort value at any point: open strings are closed, dangling keys / commas /
+partial literals are dropped, and open containers are closed. That lets us use a reply that
+was cut off by `max_tokens` instead of throwing it away and paying for another round-trip.
+"""
+
+import re
+import json
+from typing import Any, List, Optional
+
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+_LITERALS = {"true", "false", "null"}
+_PARTIAL_UNICODE_RE = re.compile(r"\\u[0-9a-fA-F]{0,3}$")
+
+
+class _Container:
+    __slots__ = ("kind", "expecting")
+
+    def __init__(self, kind: str):
+        self.kind = kind  # "obj" or "arr"
+        self.expecting = "key" if kind == "obj" else "value"
+
+
+class StreamingJSONParser:
+    """Incremental scanner that tracks the last point where the JSON prefix was complete."""
+
+    def __init__(self, start_chars: str = "{["):
+        self.start_chars = start_chars
+        self._chunks: List[str] = []
+        self._text = ""
+        self._pos = 0
+        self._root_start: Optional[int] = None
+        self._root_end: Optional[int] = None
+        self._stack: List[_Container] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._string_start = 0
+        self._escape = False
+        self._token_start: Optional[int] = None
+        self._safe_end: Optional[int] = None
+        self._safe_closers = ""
+
+    @property
+    def text(self) -> str:
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks = []
+        return self._text
+
+    @property
+    def complete(self) -> bool:
+        """True once the root value has been closed."""
+        return self._root_end is not None
+
+    def feed(self, chunk: str) -> None:
+        if not chunk or self.complete:
+            return
+        self._chunks.append(chunk)
+        text = self.text
+        for i in range(self._pos, len(text)):
+            self._scan(text, i)
+            if self.complete:
+                break
+        self._pos = len(text)
+
+    def _closers(self) -> str:
+        return "".join("}" if c.kind == "obj" else "]" for c in reversed(self._stack))
+
+    def _mark_safe(self, end: int) -> None:
+        self._safe_end = end
+        self._safe_closers = self._closers()
+
+    def _value_complete(self, end: int) -> None:
+        if not self._stack:
+            self._root_end = end
+            return
+        self._stack[-1].expecting = "comma"
+        self._mark_safe(end)
+
+    def _scan(self, text: str, i: int) -> None:
+        c = text[i]
+
+        if self._root_start is None:
+            if c in self.start_chars:
+                self._root_start = i
+                self._stack.append(_Container("obj" if c == "{" else "arr"))
+                self._mark_safe(i + 1)
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    self._stack[-1].expecting = "colon"
+                else:
+                    self._value_complete(i + 1)
+            return
+
+        if self._token_start is not None:
+            if c not in ",}] \t\r\n":
+                return
+            token = text[self._token_start:i]
+            self._token_start = None
+            if _NUMBER_RE.fullmatch(token) or token in _LITERALS:
+                self._value_complete(i)
+            # fall through to handle the delimiter itself
+
+        if c in " \t\r\n":
+            return
+        top = self._stack[-1] if self._stack else None
+        if c == '"':
+            self._in_string = True
+            self._string_is_key = top is not None and top.kind == "obj" and top.expecting == "key"
+            self._string_start = i
+        elif c in "{[":
+            self._stack.append(_Container("obj" if c == "{" else "arr"))
+            self._mark_safe(i + 1)
+        elif c in "}]":
+            if self._stack:
+                self._stack.pop()
+            self._value_complete(i + 1)
+        elif c == ",":
+            if top is not None:
+                top.expecting = "key" if top.kind == "obj" else "value"
+        elif c == ":":
+            if top is not None:
+                top.expecting = "value"
+        else:
+            self._token_start = i
+
+    def snapshot(self) -> Optional[Any]:
+        """Best-effort parse of everything fed so far; None if nothing usable yet."""
+        text = self.text
+        if self._root_start is None:
+            return None
+        if self.complete:
+            candidate = text[self._root_start:self._root_end]
+        elif self._in_string and not self._string_is_key:
+            # Keep the partial string value, closed
+            partial = text[self._string_start:]
+            if self._escape:
+                partial = partial[:-1]
+            partial = _PARTIAL_UNICODE_RE.sub("", partial)
+            candidate = text[self._root_start:self._string_start] + partial + '"' + self._closers()
+        elif self._token_start is not None and (_NUMBER_RE.fullmatch(text[self._token_start:]) or text[self._token_start:] in _LITERALS):
+            candidate = text[self._root_start:] + self._closers()
+        else:
+            candidate = text[self._root_start:self._safe_end] + self._safe_closers
+
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            # Fall back to the last recorded safe point
+            try:
+                return json.loads(text[self._root_start:self._safe_end] + self._safe_closers)
+            except json.JSONDecodeError:
+                return None
+
+
+def parse_json_tolerant(text: str, expect: str = None) -> Any:
+    """
+    Parses a model reply that may be wrapped in prose/markdown fences or truncated.
+    `expect` is "object", "array" or None (whichever comes first).
+    Raises ValueError if no JSON value can be recovered.
+    """
+    stripped = (text or "").strip()
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError:
+        pass
+
+    start_chars = {"object": "{", "array": "["}.get(expect, "{[")
+    parser = StreamingJSONParser(start_chars=start_chars)
+    parser.feed(stripped)
+    value = parser.snapshot()
+    if value is None:
+        raise ValueError(f"No JSON {expect or 'value'} found in model output")
+    return value
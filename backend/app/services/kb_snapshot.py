@@ -0,0 +1,199 @@
+"""
+Streaming snapshot / restore for the `travel_knowledge` vector store.
+
+A snapshot is a directory of fixed-size shards plus a manifest:
+
+    manifest.json        backend, dim, record count, per-shard row counts and sha256
+    shard-00000.npz      ids / documents / metadatas (JSON) as UTF-8 byte columns with
+    shard-00001.npz      offsets, and the float32 embedding matrix
+
+Snapshots page through the store, so memory stays at one page regardless of collection
+size. Restores verify and decode shards on a thread pool and write the stored
+embeddings back as-is (nothing is re-embedded); into an empty NumPy store the rows are
+streamed straight into the memory-mapped matrix. Shards are plain `.npz` without
+pickles, readable from anywhere NumPy is.
+
+    python -m app.services.kb_snapshot snapshot snapshots/kb-2024-06-01
+    python -m app.services.kb_snapshot restore snapshots/kb-2024-06-01 --workers 8
+    VECTOR_STORE_BACKEND=numpy python -m app.services.kb_snapshot restore snapshots/kb-2024-06-01
+
+Running API workers keep their in-memory BM25 mirror, so restart them after a restore.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from app.services.vector_store import EmbeddingPage, NumpyVectorStore, VectorStore, create_vector_store
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "kb-snapshot/1"
+MANIFEST_FILE = "manifest.json"
+
+
+def _pack_strings(values: List[str]) -> Dict[str, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {"data": np.frombuffer(b"".join(encoded), dtype=np.uint8), "offsets": offsets}
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_shard(path: str, page: EmbeddingPage) -> None:
+    ids, embeddings, documents, metadatas = page
+    columns = {"embeddings": np.asarray(embeddings, dtype=np.float32)}
+    for name, values in (
+        ("ids", ids),
+        ("documents", documents),
+        ("metadatas", [json.dumps(metadata) for metadata in (metadatas or [None] * len(ids))]),
+    ):
+        packed = _pack_strings(values)
+        columns[f"{name}_data"] = packed["data"]
+        columns[f"{name}_offsets"] = packed["offsets"]
+    with open(path, "wb") as f:
+        np.savez(f, **columns)
+
+
+def read_shard(path: str) -> EmbeddingPage:
+    with np.load(path, allow_pickle=False) as shard:
+        ids = _unpack_strings(shard["ids_data"], shard["ids_offsets"])
+        documents = _unpack_strings(shard["documents_data"], shard["documents_offsets"])
+        metadatas = [json.loads(value) for value in _unpack_strings(shard["metadatas_data"], shard["metadatas_offsets"])]
+        return ids, shard["embeddings"], documents, metadatas
+
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{directory} is not a {SNAPSHOT_FORMAT} snapshot")
+    return manifest
+
+
+def snapshot(store: VectorStore, directory: str, page_size: int = 1000) -> Dict[str, Any]:
+    """Writes every record of `store` to `directory`, one shard per page. Returns the manifest."""
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    shards, count, dim = [], 0, None
+    for page in store.iter_embedding_pages(page_size):
+        if not page[0]:
+            continue
+        name = f"shard-{len(shards):05d}.npz"
+        path = os.path.join(directory, name)
+        write_shard(path, page)
+        shards.append({"file": name, "count": len(page[0]), "sha256": _sha256(path)})
+        count += len(page[0])
+        dim = dim or int(page[1].shape[1])
+        logger.info(f"Snapshot: wrote {name} ({count} records so far)")
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "backend": store.name,
+        "count": count,
+        "dim": dim,
+        "created_at": time.time(),
+        "shards": shards
+    }
+    # The manifest goes last, so an interrupted snapshot is never mistaken for a complete one
+    tmp_path = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+    logger.info(f"Snapshot: {count} records in {len(shards)} shards in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def _bounded_map(pool: ThreadPoolExecutor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """Ordered `pool.map` that keeps at most `window` items in flight (and in memory)."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def restore(store: VectorStore, directory: str, workers: int = None, merge: bool = False) -> Dict[str, Any]:
+    """
+    Loads a snapshot into `store`. Refuses a non-empty store unless `merge` is set, in
+    which case records are upserted by id. Returns {"records", "shards", "seconds"}.
+    """
+    manifest = read_manifest(directory)
+    workers = workers or int(os.getenv("KB_RESTORE_WORKERS", 4))
+    if store.count() and not merge:
+        raise ValueError(f"Target {store.name} store already has {store.count()} records; pass merge=True to upsert into it")
+
+    def load(shard: Dict[str, Any]) -> EmbeddingPage:
+        path = os.path.join(directory, shard["file"])
+        if _sha256(path) != shard["sha256"]:
+            raise ValueError(f"Checksum mismatch for {shard['file']}")
+        page = read_shard(path)
+        if len(page[0]) != shard["count"]:
+            raise ValueError(f"{shard['file']} has {len(page[0])} records, manifest says {shard['count']}")
+        return page
+
+    def load_and_write(shard: Dict[str, Any]) -> int:
+        ids, embeddings, documents, metadatas = load(shard)
+        store.upsert(ids, embeddings, documents, metadatas)
+        return len(ids)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kb-restore") as pool:
+        if isinstance(store, NumpyVectorStore) and not store.count() and manifest["count"]:
+            # One streamed matrix write instead of rewriting the whole matrix per shard
+            records = store.bulk_load(_bounded_map(pool, load, manifest["shards"], workers * 2), manifest["count"], manifest["dim"])
+        else:
+            records = sum(_bounded_map(pool, load_and_write, manifest["shards"], workers * 2))
+    seconds = time.perf_counter() - started
+    logger.info(f"Restore: {records} records from {len(manifest['shards'])} shards in {seconds:.1f}s")
+    return {"records": records, "shards": len(manifest["shards"]), "seconds": seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None,
+                        help="vector store to read from / write to (default: VECTOR_STORE_BACKEND)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = commands.add_parser("snapshot", help="write the knowledge base to a snapshot directory")
+    snapshot_parser.add_argument("directory")
+    snapshot_parser.add_argument("--page-size", type=int, default=1000)
+    restore_parser = commands.add_parser("restore", help="load a snapshot directory into the knowledge base")
+    restore_parser.add_argument("directory")
+    restore_parser.add_argument("--workers", type=int, default=None)
+    restore_parser.add_argument("--merge", action="store_true", help="upsert into a non-empty store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = create_vector_store(args.backend)
+    if args.command == "snapshot":
+        manifest = snapshot(store, args.directory, args.page_size)
+        print(f"Wrote {manifest['count']} records in {len(manifest['shards'])} shards to {args.directory}")
+    else:
+        result = restore(store, args.directory, args.workers, args.merge)
+        print(f"Restored {result['records']} records from {result['shards']} shards in {result['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
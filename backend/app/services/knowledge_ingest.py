@@ -0,0 +1,212 @@
+"""
+Write-behind ingestion into the `travel_knowledge` RAG collection.
+
+Request handlers hand over text they already fetched or generated (Wikivoyage sections,
+Wikipedia summaries, curated local tips) with `submit*`, which only chunks, hashes and
+enqueues. A background thread batches the queue and upserts into the RAG engine, so
+embedding cost never lands on the request path. Chunk ids are content hashes, so the
+same text is stored once no matter how often it is seen.
+"""
+
+import os
+import re
+import queue
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(text: str, max_chars: int = 600, min_chars: int = 40) -> List[str]:
+    """Splits text on paragraph then sentence boundaries into chunks of at most `max_chars`."""
+    chunks: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        current = ""
+        for sentence in _SENTENCE_END_RE.split(paragraph):
+            while len(sentence) > max_chars:
+                # A single overlong sentence is cut on a word boundary
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return [chunk for chunk in chunks if len(chunk) >= min_chars]
+
+
+def content_id(text: str) -> str:
+    normalized = " ".join(text.lower().split())
+    return "kb_" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class KnowledgeIngestor:
+    """Bounded queue + background batch writer feeding RAGEngine.upsert_documents."""
+
+    def __init__(self, engine_getter: Callable[[], Any] = None, batch_size: int = None,
+                 flush_interval: float = None, max_queue: int = None, chunk_chars: int = None):
+        if engine_getter is None:
+            from app.services.rag_engine import get_rag_engine
+            engine_getter = get_rag_engine
+        self.engine_getter = engine_getter
+        self.enabled = os.getenv("KB_INGEST_ENABLED", "true").lower() == "true"
+        self.batch_size = batch_size or int(os.getenv("KB_INGEST_BATCH_SIZE", 64))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("KB_INGEST_FLUSH_SECONDS", 2.0))
+        self.chunk_chars = chunk_chars or int(os.getenv("KB_CHUNK_CHARS", 600))
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue or int(os.getenv("KB_INGEST_MAX_QUEUE", 2000)))
+        # Ids enqueued or written by this process; bounded so a long-lived worker doesn't grow forever
+        self._seen: Dict[str, None] = {}
+        self._seen_limit = 50000
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Set while nothing is queued or being written; `_pending` counts those chunks and is
+        # only changed under `_lock`, so submit and the worker agree on when it is idle
+        self._pending = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self.stats = {"submitted": 0, "duplicates": 0, "dropped": 0, "written": 0, "batches": 0, "errors": 0}
+
+    def submit(self, text: str, city: str, source: str, title: str = None) -> int:
+        """Chunks and enqueues text; returns how many new chunks were queued. Never blocks."""
+        if not self.enabled or not text or not city:
+            return 0
+        queued = 0
+        for chunk in chunk_text(text, self.chunk_chars):
+            doc_id = content_id(chunk)
+            with self._lock:
+                self.stats["submitted"] += 1
+                if doc_id in self._seen:
+                    self.stats["duplicates"] += 1
+                    continue
+                self._remember(doc_id)
+                self._pending += 1
+                self._idle.clear()
+            metadata = {"city": city.strip().lower(), "source": source}
+            if title:
+                metadata["title"] = title
+            try:
+                self._queue.put_nowait((doc_id, chunk, metadata))
+                queued += 1
+            except queue.Full:
+                # Shed rather than slow down the request; the text will be seen again
+                with self._lock:
+                    self.stats["dropped"] += 1
+                    self._seen.pop(doc_id, None)
+                    self._done(1)
+        if queued:
+            self._ensure_worker()
+        return queued
+
+    def submit_guide(self, city: str, guide: Dict[str, Any]) -> int:
+        """Queues the text of each Wikivoyage section ("See", "Eat", ...)."""
+        queued = 0
+        for section, text in (guide.get("section_text") or {}).items():
+            queued += self.submit(f"{section}: {text}", city, "wikivoyage", title=guide.get("title"))
+        return queued
+
+    def submit_itinerary_tips(self, city: str, itinerary) -> int:
+        """Queues the curated local tip of every block, prefixed with its place name."""
+        queued = 0
+        for day in itinerary.days:
+            for block in day.blocks:
+                if block.local_tip and block.poi:
+                    queued += self.submit(f"{block.poi.name}: {block.local_tip}", city, "curated_tip", title=block.poi.name)
+        return queued
+
+    def _remember(self, doc_id: str) -> None:
+        self._seen[doc_id] = None
+        while len(self._seen) > self._seen_limit:
+            self._seen.pop(next(iter(self._seen)))
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="kb-ingest", daemon=True)
+                self._thread.start()
+
+    def _done(self, count: int) -> None:
+        # Caller holds `_lock`
+        self._pending -= count
+        if self._pending == 0:
+            self._idle.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+                with self._lock:
+                    self._done(len(batch))
+
+    def _take_batch(self) -> List[tuple]:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[tuple]) -> None:
+        try:
+            engine = self.engine_getter()
+            # Skip chunks already stored by a previous process
+            existing, _ = engine.store.get_embeddings([doc_id for doc_id, _, _ in batch])
+            existing = set(existing)
+            fresh = [item for item in batch if item[0] not in existing]
+            if fresh:
+                engine.upsert_documents(
+                    documents=[text for _, text, _ in fresh],
+                    ids=[doc_id for doc_id, _, _ in fresh],
+                    metadatas=[metadata for _, _, metadata in fresh]
+                )
+            with self._lock:
+                self.stats["written"] += len(fresh)
+                self.stats["duplicates"] += len(batch) - len(fresh)
+                self.stats["batches"] += 1
+            logger.info(f"Knowledge ingest: wrote {len(fresh)} of {len(batch)} chunks")
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                # Let these be retried the next time they're seen
+                for doc_id, _, _ in batch:
+                    self._seen.pop(doc_id, None)
+            logger.error(f"Knowledge ingest batch failed: {str(e)}")
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until everything queued so far is written. Returns False on timeout."""
+        if self._thread is None:
+            return True
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        self.flush(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, queued=self._queue.qsize())
+
+
+knowledge_ingestor = KnowledgeIngestor()
@@ -0,0 +1,499 @@
+"""
+Unified async LLM client.
+
+One place for provider headers, connection reuse, retries and token/latency accounting.
+Call sites name a *task* ("extract_constraints", "curate_itinerary", ...) and the client
+routes it to a provider/model, so cheap models can serve the high-volume tasks.
+
+Routes can be overridden per task with env vars, e.g.
+    LLM_ROUTE_EXTRACT_CONSTRAINTS=anthropic:claude-3-5-sonnet-20241022
+    LLM_ROUTE_CURATE_ITINERARY=openrouter:anthropic/claude-3.5-sonnet
+
+Structured calls pass a `tool` (name + JSON schema). Anthropic is forced to answer through
+that tool and the tool input is streamed through a tolerant parser, so a reply cut off by
+`max_tokens` is repaired instead of failing; other providers get a JSON-schema response format.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from app.services.json_repair import StreamingJSONParser, parse_json_tolerant
+
+logger = logging.getLogger(__name__)
+
+# Default task -> "provider:model" routing
+DEFAULT_ROUTES = {
+    "extract_constraints": "anthropic:claude-3-5-haiku-20241022",
+    "explanation": "anthropic:claude-3-5-haiku-20241022",
+    "summarize_session": "anthropic:claude-3-5-haiku-20241022",
+    "generate_pois": "anthropic:claude-3-5-sonnet-20241022",
+    "curate_itinerary": "anthropic:claude-3-5-sonnet-20241022",
+    "curate_day": "anthropic:claude-3-5-sonnet-20241022",
+}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+SystemPrompt = Union[str, List[Dict[str, Any]], None]
+Tool = Dict[str, Any]
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails after retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMNotConfiguredError(LLMError):
+    """Raised when the routed provider has no API key."""
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    provider: str
+    model: str
+    usage: Dict[str, int] = field(default_factory=dict)
+    stop_reason: Optional[str] = None
+    latency_ms: float = 0.0
+    attempts: int = 1
+    data: Any = None  # Parsed tool input for structured calls
+
+
+@dataclass
+class LLMCallRecord:
+    task: str
+    provider: str
+    model: str
+    ok: bool
+    attempts: int
+    latency_ms: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+
+
+def system_text(system: SystemPrompt) -> str:
+    """Flattens a system prompt given as content blocks into plain text."""
+    if not system:
+        return ""
+    if isinstance(system, str):
+        return system
+    return "\n\n".join(block.get("text", "") for block in system)
+
+
+def inline_schema_refs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolves pydantic's `$defs`/`$ref` into a self-contained JSON schema."""
+    defs = schema.get("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].split("/")[-1]])
+            return {k: resolve(v) for k, v in node.items() if k != "$defs"}
+        if isinstance(node, list):
+            return [resolve(v) for v in node]
+        return node
+
+    return resolve(schema)
+
+
+def tool_from_model(name: str, description: str, model: type, list_key: str = None) -> Tool:
+    """
+    Builds a tool definition whose input schema is a pydantic model.
+    With `list_key`, the input is an object holding a list of that model under that key.
+    """
+    schema = inline_schema_refs(model.model_json_schema())
+    if list_key:
+        schema = {"type": "object", "properties": {list_key: {"type": "array", "items": schema}}, "required": [list_key]}
+    return {"name": name, "description": description, "input_schema": schema}
+
+
+class LLMProvider:
+    """Base provider: turns a normalized request into an HTTP call and back."""
+    name = "base"
+    default_model = ""
+
+    def is_configured(self) -> bool:
+        return True
+
+    supports_streaming = False
+
+    def build_request(self, model: str, system: SystemPrompt, messages: List[Dict], max_tokens: int,
+                      tool: Tool = None, stream: bool = False) -> Tuple[str, Dict, Dict]:
+        raise NotImplementedError
+
+    def parse_response(self, data: Dict[str, Any]) -> Tuple[str, Dict[str, int], Optional[str], Any]:
+        """Returns (text, usage, stop_reason, tool_input)."""
+        raise NotImplementedError
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+    default_model = "claude-3-5-sonnet-20241022"
+    supports_streaming = True
+
+    def base_url(self) -> str:
+        return os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com").rstrip("/")
+
+    def api_key(self) -> Optional[str]:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key or api_key == "YOUR_ANTHROPIC_API_KEY_HERE":
+            return None
+        return api_key
+
+    def is_configured(self) -> bool:
+        return self.api_key() is not None
+
+    def build_request(self, model, system, messages, max_tokens, tool=None, stream=False):
+        headers = {
+            "x-api-key": self.api_key(),
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+        payload = {"model": model, "max_tokens": max_tokens, "messages": messages}
+        if system:
+            payload["system"] = system
+        if tool:
+            payload["tools"] = [tool]
+            payload["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        if stream:
+            payload["stream"] = True
+        return f"{self.base_url()}/v1/messages", headers, payload
+
+    @staticmethod
+    def parse_usage(usage: Dict[str, Any]) -> Dict[str, int]:
+        return {
+            "input_tokens": usage.get("input_tokens") or 0,
+            "output_tokens": usage.get("output_tokens") or 0,
+            "cache_read_input_tokens": usage.get("cache_read_input_tokens") or 0,
+            "cache_creation_input_tokens": usage.get("cache_creation_input_tokens") or 0,
+        }
+
+    def parse_response(self, data):
+        content = data.get("content", [])
+        text = "".join(block.get("text", "") for block in content if block.get("type", "text") == "text")
+        tool_input = next((block.get("input") for block in content if block.get("type") == "tool_use"), None)
+        return text.strip(), self.parse_usage(data.get("usage", {}) or {}), data.get("stop_reason"), tool_input
+
+
+class OpenRouterProvider(LLMProvider):
+    name = "openrouter"
+    default_model = "google/gemini-2.0-flash-exp:free"  # Free tier model
+
+    def is_configured(self) -> bool:
+        return bool(os.getenv("OPENROUTER_API_KEY"))
+
+    def base_url(self) -> str:
+        return os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+
+    def build_request(self, model, system, messages, max_tokens, tool=None, stream=False):
+        headers = {
+            "Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://localhost:3000",
+        }
+        chat = [{"role": "system", "content": system_text(system)}] if system else []
+        chat.extend({"role": m.get("role"), "content": m.get("content")} for m in messages)
+        payload = {"model": model, "max_tokens": max_tokens, "messages": chat}
+        if tool:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": tool["name"], "schema": tool["input_schema"]}
+            }
+        return f"{self.base_url()}/chat/completions", headers, payload
+
+    def parse_response(self, data):
+        choice = data["choices"][0]
+        usage = data.get("usage", {}) or {}
+        return (choice["message"]["content"] or "").strip(), {
+            "input_tokens": usage.get("prompt_tokens") or 0,
+            "output_tokens": usage.get("completion_tokens") or 0,
+        }, choice.get("finish_reason"), None
+
+
+class MockProvider(LLMProvider):
+    """
+    Local provider for tests and offline development; never touches the network.
+    `responder(model, system, messages)` returns the reply text.
+    """
+    name = "mock"
+    default_model = "mock"
+
+    def __init__(self, responder: Callable[[str, SystemPrompt, List[Dict]], str] = None):
+        self.responder = responder or (lambda model, system, messages: "{}")
+        self.calls: List[Dict[str, Any]] = []
+
+    def complete(self, model: str, system: SystemPrompt, messages: List[Dict], max_tokens: int) -> Tuple[str, Dict[str, int], Optional[str], Any]:
+        self.calls.append({"model": model, "system": system, "messages": messages, "max_tokens": max_tokens})
+        text = self.responder(model, system, messages)
+        usage = {"input_tokens": len(system_text(system) + json.dumps(messages)) // 4, "output_tokens": len(text) // 4}
+        return text, usage, "end_turn", None
+
+
+class LLMClient:
+    """Routes tasks to providers over a shared, keep-alive HTTP connection pool."""
+
+    def __init__(self, providers: List[LLMProvider] = None, routes: Dict[str, str] = None,
+                 max_retries: int = None, base_delay: float = 0.5, max_delay: float = 8.0,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.providers: Dict[str, LLMProvider] = {}
+        for provider in providers or [AnthropicProvider(), OpenRouterProvider(), MockProvider()]:
+            self.register_provider(provider)
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", 3))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Each snapshot re-parses the whole prefix, so `on_partial` gets at most one per interval
+        self.partial_interval = float(os.getenv("LLM_PARTIAL_INTERVAL_MS", 100)) / 1000
+        self.transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.warmup: Dict[str, Any] = {"status": "cold", "providers": {}}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.recent_calls: Deque[LLMCallRecord] = deque(maxlen=200)
+
+    def register_provider(self, provider: LLMProvider) -> None:
+        self.providers[provider.name] = provider
+
+    def route(self, task: str, provider: str = None, model: str = None) -> Tuple[LLMProvider, str]:
+        """Resolves (provider, model) for a task; explicit arguments win over env and defaults."""
+        spec = os.getenv(f"LLM_ROUTE_{task.upper()}") or self.routes.get(task) or "anthropic:"
+        routed_provider, _, routed_model = spec.partition(":")
+        if provider and provider != routed_provider:
+            routed_provider, routed_model = provider, ""
+        llm_provider = self.providers.get(routed_provider)
+        if llm_provider is None:
+            raise LLMError(f"Unknown LLM provider '{routed_provider}' for task {task}")
+        return llm_provider, model or routed_model or llm_provider.default_model
+
+    def http(self) -> httpx.AsyncClient:
+        """Shared AsyncClient, recreated if the event loop changed (e.g. between test runs)."""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=60.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+            )
+            self._http_loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    async def warm_up(self, timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Opens a pooled (TLS) connection to each configured provider so the first real
+        call skips DNS + handshake. Any HTTP response counts; only transport errors fail.
+        """
+        self.warmup["status"] = "warming"
+        client = self.http()
+        for provider in self.providers.values():
+            if not hasattr(provider, "base_url") or not provider.is_configured():
+                continue
+            started = time.monotonic()
+            try:
+                await client.head(provider.base_url(), timeout=timeout)
+                self.warmup["providers"][provider.name] = {"status": "warm", "ms": round((time.monotonic() - started) * 1000)}
+            except httpx.HTTPError as e:
+                logger.warning(f"LLM warm-up for {provider.name} failed: {str(e)}")
+                self.warmup["providers"][provider.name] = {"status": "unreachable", "error": str(e)}
+        self.warmup["status"] = "ready"
+        return self.warmup
+
+    def pool_status(self) -> Dict[str, Any]:
+        return dict(self.warmup, pool_open=self._http is not None and not self._http.is_closed)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def complete(self, task: str, messages: List[Dict], system: SystemPrompt = None,
+                       max_tokens: int = 1024, timeout: float = 30.0,
+                       provider: str = None, model: str = None, tool: Tool = None,
+                       on_partial: Callable[[Any], None] = None) -> LLMResponse:
+        """
+        Sends one completion request for `task`, retrying 429/5xx and transport errors with jitter.
+        With `tool`, the reply is schema-constrained and parsed into `LLMResponse.data`;
+        `on_partial` then receives best-effort snapshots of the data while it streams.
+        """
+        llm_provider, model = self.route(task, provider, model)
+        if not llm_provider.is_configured():
+            raise LLMNotConfiguredError(f"{llm_provider.name} API key not configured")
+
+        start = time.perf_counter()
+        attempts = 0
+        try:
+            while True:
+                attempts += 1
+                try:
+                    if tool and llm_provider.supports_streaming:
+                        text, usage, stop_reason, data = await self._send_stream(
+                            llm_provider, model, system, messages, max_tokens, timeout, tool, on_partial
+                        )
+                    else:
+                        text, usage, stop_reason, data = await self._send(llm_provider, model, system, messages, max_tokens, timeout, tool)
+                    break
+                except LLMError as e:
+                    retryable = e.status_code in RETRYABLE_STATUS_CODES
+                    if not retryable or attempts > self.max_retries:
+                        raise
+                    delay = self._backoff(attempts - 1, e.retry_after)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    if attempts > self.max_retries:
+                        raise LLMError(f"{llm_provider.name} request failed: {e}") from e
+                    delay = self._backoff(attempts - 1)
+                logger.warning(f"LLM [{task}] attempt {attempts} failed, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        except Exception:
+            self._record(LLMCallRecord(task, llm_provider.name, model, False, attempts, (time.perf_counter() - start) * 1000))
+            raise
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._record(LLMCallRecord(task, llm_provider.name, model, True, attempts, latency_ms, **usage))
+        if tool and data is None:
+            data = parse_json_tolerant(text)
+        if tool and stop_reason in ("max_tokens", "length"):
+            logger.warning(f"LLM [{task}] structured output hit the token limit; using repaired JSON")
+        return LLMResponse(text=text, provider=llm_provider.name, model=model, usage=usage,
+                           stop_reason=stop_reason, latency_ms=latency_ms, attempts=attempts, data=data)
+
+    async def _send(self, llm_provider: LLMProvider, model: str, system: SystemPrompt,
+                    messages: List[Dict], max_tokens: int, timeout: float, tool: Tool = None):
+        if isinstance(llm_provider, MockProvider):
+            return llm_provider.complete(model, system, messages, max_tokens)
+
+        url, headers, payload = llm_provider.build_request(model, system, messages, max_tokens, tool=tool)
+        response = await self.http().post(url, headers=headers, json=payload, timeout=timeout)
+        if response.status_code != 200:
+            logger.error(f"{llm_provider.name} API error: {response.status_code} - {response.text[:500]}")
+            raise LLMError(
+                f"{llm_provider.name} returned {response.status_code}",
+                status_code=response.status_code,
+                retry_after=response.headers.get("retry-after")
+            )
+        return llm_provider.parse_response(response.json())
+
+    async def _send_stream(self, llm_provider: LLMProvider, model: str, system: SystemPrompt,
+                           messages: List[Dict], max_tokens: int, timeout: float,
+                           tool: Tool, on_partial: Callable[[Any], None] = None):
+        """
+        Streams an Anthropic tool-use reply, feeding `input_json_delta`s into a tolerant parser.
+        `on_partial` snapshots are throttled to `partial_interval`, plus one for the final state.
+        """
+        url, headers, payload = llm_provider.build_request(model, system, messages, max_tokens, tool=tool, stream=True)
+        parser = StreamingJSONParser()
+        text_parts: List[str] = []
+        usage: Dict[str, int] = {}
+        stop_reason = None
+        last_partial = None
+        unreported = False
+
+        async with self.http().stream("POST", url, headers=headers, json=payload, timeout=timeout) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                logger.error(f"{llm_provider.name} API error: {response.status_code} - {body[:500]}")
+                raise LLMError(
+                    f"{llm_provider.name} returned {response.status_code}",
+                    status_code=response.status_code,
+                    retry_after=response.headers.get("retry-after")
+                )
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:].strip())
+                event_type = event.get("type")
+                if event_type == "message_start":
+                    usage = AnthropicProvider.parse_usage(event.get("message", {}).get("usage", {}) or {})
+                elif event_type == "content_block_delta":
+                    delta = event.get("delta", {})
+                    if delta.get("type") == "input_json_delta":
+                        parser.feed(delta.get("partial_json", ""))
+                        if on_partial is not None:
+                            now = time.monotonic()
+                            if last_partial is not None and now - last_partial < self.partial_interval:
+                                unreported = True
+                                continue
+                            snapshot = parser.snapshot()
+                            if snapshot is not None:
+                                last_partial, unreported = now, False
+                                on_partial(snapshot)
+                    elif delta.get("type") == "text_delta":
+                        text_parts.append(delta.get("text", ""))
+                elif event_type == "message_delta":
+                    stop_reason = event.get("delta", {}).get("stop_reason") or stop_reason
+                    usage["output_tokens"] = (event.get("usage") or {}).get("output_tokens", usage.get("output_tokens", 0))
+                elif event_type == "error":
+                    error = event.get("error", {})
+                    status = 529 if error.get("type") == "overloaded_error" else 500
+                    raise LLMError(f"{llm_provider.name} stream error: {error.get('message')}", status_code=status)
+
+        data = parser.snapshot()
+        if unreported and data is not None:
+            on_partial(data)
+        return "".join(text_parts).strip(), usage, stop_reason, data
+
+    def _record(self, record: LLMCallRecord) -> None:
+        self.recent_calls.append(record)
+        stats = self.stats.setdefault(record.task, {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_hits": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "total_latency_ms": 0.0,
+        })
+        stats["calls"] += 1
+        stats["failures"] += 0 if record.ok else 1
+        stats["retries"] += record.attempts - 1
+        stats["input_tokens"] += record.input_tokens
+        stats["output_tokens"] += record.output_tokens
+        stats["cache_hits"] += 1 if record.cache_read_input_tokens else 0
+        stats["cache_read_input_tokens"] += record.cache_read_input_tokens
+        stats["cache_creation_input_tokens"] += record.cache_creation_input_tokens
+        stats["total_latency_ms"] += record.latency_ms
+        logger.info(
+            f"LLM [{record.task}] {record.provider}/{record.model} ok={record.ok} attempts={record.attempts} "
+            f"latency={record.latency_ms:.0f}ms in={record.input_tokens} out={record.output_tokens} "
+            f"cache_read={record.cache_read_input_tokens}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-task aggregates plus the most recent calls."""
+        tasks = {}
+        for task, stats in self.stats.items():
+            calls = stats["calls"] or 1
+            tasks[task] = dict(stats, avg_latency_ms=round(stats["total_latency_ms"] / calls, 1))
+        return {"tasks": tasks, "recent_calls": [asdict(r) for r in list(self.recent_calls)[-20:]]}
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+        self.recent_calls.clear()
+
+
+# Global instance
+llm_client = LLMClient()
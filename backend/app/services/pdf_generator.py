@@ -1,5 +1,16 @@
 from fpdf import FPDF
 import os
+import json
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from app.services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
 
 class ItineraryPDF(FPDF):
     def header(self):
@@ -25,9 +36,9 @@ def safe_text(text: str) -> str:
     text = text.replace('₹', 'Rs.').replace('—', '-').replace('–', '-').replace('"', '"').replace('"', '"')
     return text.encode('latin-1', 'ignore').decode('latin-1')
 
-def generate_pdf(itinerary_data: dict, filename: str = "itinerary.pdf") -> str:
+def build_pdf(itinerary_data: dict) -> ItineraryPDF:
     """
-    Generates a rich, multi-page PDF guide from the itinerary.
+    Lays out a rich, multi-page PDF guide from the itinerary.
     """
     pdf = ItineraryPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -143,6 +154,20 @@ def generate_pdf(itinerary_data: dict, filename: str = "itinerary.pdf") -> str:
     pdf.set_text_color(60, 60, 60)
     pdf.multi_cell(0, 6, safe_text("• Keep some cash handy for small vendors.\n• Download an offline map of the city.\n• Respect local dress codes at religious sites.\n• Stay hydrated and enjoy the journey!"))
 
+    return pdf
+
+def render_pdf_bytes(itinerary_data: dict) -> bytes:
+    """
+    Renders the itinerary PDF in memory. Top-level so it can run in a worker process.
+    """
+    output = build_pdf(itinerary_data).output(dest='S')
+    # FPDF 1.x returns a latin-1 str, fpdf2 returns a bytearray
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+def generate_pdf(itinerary_data: dict, filename: str = "itinerary.pdf") -> str:
+    """
+    Generates the PDF guide into a temp file and returns its path.
+    """
     # Use system temp directory and unique filename
     import tempfile
     import uuid
@@ -151,5 +176,67 @@ def generate_pdf(itinerary_data: dict, filename: str = "itinerary.pdf") -> str:
     temp_dir = tempfile.gettempdir()
     output_path = os.path.join(temp_dir, unique_filename)
     
-    pdf.output(output_path)
+    with open(output_path, "wb") as f:
+        f.write(render_pdf_bytes(itinerary_data))
     return output_path
+
+def pdf_cache_key(itinerary_data: dict) -> str:
+    """Content hash of the itinerary; identical plans share a key regardless of key order."""
+    canonical = json.dumps(itinerary_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class PDFRenderer:
+    """
+    Renders itinerary PDFs off the event loop in a process pool (FPDF layout is pure
+    Python and holds the GIL) and keeps recent renders in an LRU keyed by content hash.
+    Concurrent requests for the same itinerary share one render.
+    """
+
+    def __init__(self, workers: int = None, cache_size: int = None):
+        # 0 workers renders in a thread instead, for hosts where spawning processes isn't allowed
+        self.workers = workers if workers is not None else int(os.getenv("PDF_WORKERS", 2))
+        self.cache = LRUCache(cache_size if cache_size is not None else int(os.getenv("PDF_CACHE_SIZE", 64)))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.renders = 0
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers > 0 and self._pool is None:
+            # spawn rather than fork: the server process already runs threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def render(self, itinerary_data: dict) -> Tuple[str, bytes]:
+        """Returns (content hash, PDF bytes), rendering only on a cache miss."""
+        key = pdf_cache_key(itinerary_data)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return key, cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return key, await asyncio.shield(inflight)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor(), render_pdf_bytes, itinerary_data)
+        self._inflight[key] = future
+        # Stored when the render finishes, even if every caller waiting on it was cancelled
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return key, await asyncio.shield(future)
+
+    def _finish(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.renders += 1
+            self.cache.set(key, future.result())
+
+    def get_stats(self) -> dict:
+        return dict(self.cache.stats(), renders=self.renders, workers=self.workers, inflight=len(self._inflight))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+pdf_renderer = PDFRenderer()
@@ -1,18 +1,120 @@
-import os
 import logging
 import json
 import re
-import httpx
 from app.models import TripConstraints
+from app.services.claude_api import CONSTRAINTS_TOOL, extract_constraints_with_claude
+from app.services.llm_client import llm_client
 
 logger = logging.getLogger(__name__)
 
-def extract_constraints_simple(transcript: str, existing_constraints: dict = None) -> TripConstraints:
+# Simple city extraction - Expanded list
+# In a real app, this should be a larger database or handled by logic that identifies proper nouns
+KNOWN_CITIES = [
+    "paris", "tokyo", "jaipur", "delhi", "london", "dubai", "singapore", "new york", "mumbai",
+    "agra", "bangalore", "hyderabad", "chennai", "kolkata", "pune", "goa", "kerala", "himachal",
+    "manali", "shimla", "rishikesh", "varanasi", "udaipur", "jodhpur", "kyoto", "osaka", "rome", 
+    "venice", "florence", "milan", "barcelona", "madrid", "berlin", "munich", "amsterdam"
+]
+
+WORD_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "couple of": 2, "few": 3
+}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+
+# Slot patterns, shared with the intent classifier's fast path (app.services.intent_classifier)
+CITY_RE = re.compile(r"\b(" + "|".join(re.escape(c) for c in sorted(KNOWN_CITIES, key=len, reverse=True)) + r")\b")
+DURATION_RE = re.compile(
+    r"\b(\d+|" + "|".join(sorted(WORD_NUMBERS, key=len, reverse=True)) + r")[\s-]*(days?|nights?|weeks?)\b"
+    r"|\bfor (?:a|the) (weekend)\b"
+)
+_MONTH = r"(" + "|".join(m[:3] + r"(?:" + m[3:] + r")?" for m in MONTHS) + r")"
+DATE_RE = re.compile(
+    r"\b(?:(\d{4}-\d{2}-\d{2})"
+    r"|(day after tomorrow|tomorrow|today)"
+    r"|(?:(next|this|on|coming) )(weekend|week|month|" + "|".join(WEEKDAYS) + r")"
+    r"|" + _MONTH + r" (\d{1,2})(?:st|nd|rd|th)?"
+    r"|(\d{1,2})(?:st|nd|rd|th)? (?:of )?" + _MONTH + r")\b"
+)
+
+def find_city(transcript_lower: str):
     """
-    Simple regex-based fallback when AI APIs are unavailable.
+    The last known city mentioned, title-cased, or None.
+    """
+    matches = CITY_RE.findall(transcript_lower)
+    return matches[-1].title() if matches else None
+
+def find_duration(transcript_lower: str):
+    """
+    Trip length in days from phrases like "5 days", "three nights", "a week", "for the weekend".
+    """
+    match = DURATION_RE.search(transcript_lower)
+    if not match:
+        return None
+    if match.group(3):
+        return 2
+    count, unit = match.group(1), match.group(2)
+    count = int(count) if count.isdigit() else WORD_NUMBERS[count]
+    return count * 7 if unit.startswith("week") else count
+
+def _month_number(name: str) -> int:
+    return next(i for i, m in enumerate(MONTHS, 1) if m.startswith(name[:3]))
+
+def find_start_date(transcript_lower: str, today=None):
+    """
+    Start date (YYYY-MM-DD) from "tomorrow", "next friday", "this weekend", "May 5", "2026-05-01", ...
+    """
+    from datetime import datetime, timedelta
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    match = DATE_RE.search(transcript_lower)
+    if not match:
+        return None
+    iso, relative, qualifier, named, month_a, day_a, day_b, month_b = match.groups()
+    if iso:
+        return iso
+    if relative:
+        offset = {"today": 0, "tomorrow": 1, "day after tomorrow": 2}[relative]
+        return (today + timedelta(days=offset)).strftime("%Y-%m-%d")
+    if named:
+        # "this ..." includes the current period; "next / coming / on ..." is the next one
+        if named == "month":
+            if qualifier == "this":
+                return today.strftime("%Y-%m-%d")
+            year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+            return f"{year:04d}-{month:02d}-01"
+        if named == "weekend":
+            # This weekend starts on this week's Saturday (yesterday, on a Sunday); next weekend a week later
+            saturday = today + timedelta(days=5 - today.weekday())
+            if qualifier == "next":
+                return (saturday + timedelta(days=7)).strftime("%Y-%m-%d")
+            return max(saturday, today).strftime("%Y-%m-%d")
+        if named == "week" and qualifier == "this":
+            return today.strftime("%Y-%m-%d")
+        # Weeks start on Monday
+        weekday = 0 if named == "week" else WEEKDAYS.index(named)
+        days_ahead = weekday - today.weekday()
+        if qualifier == "this":
+            days_ahead %= 7
+        elif days_ahead <= 0:
+            days_ahead += 7
+        return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+    month, day = (month_a, day_a) if month_a else (month_b, day_b)
+    try:
+        date = today.replace(month=_month_number(month), day=int(day))
+        if date < today:
+            date = date.replace(year=today.year + 1)
+    except ValueError:
+        return None
+    return date.strftime("%Y-%m-%d")
+
+def extract_constraints_simple(transcript: str, existing_constraints: dict = None, intent: str = None) -> TripConstraints:
+    """
+    Rule-based extraction. Answers trivial turns locally (`intent` from the intent
+    classifier: confirm, greeting, thanks, slot_fill) and is the fallback when AI APIs
+    are unavailable.
     """
-    logger.info("Using simple regex-based extraction (AI APIs unavailable)")
-    
     # Initialize with defaults or existing constraints
     current_data = {
         "destination_city": None,
@@ -30,78 +132,29 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
     if existing_constraints:
         current_data.update(existing_constraints)
     
-    # Simple city extraction - Expanded list
-    # In a real app, this should be a larger database or handled by logic that identifies proper nouns
-    cities = [
-        "paris", "tokyo", "jaipur", "delhi", "london", "dubai", "singapore", "new york", "mumbai",
-        "agra", "bangalore", "hyderabad", "chennai", "kolkata", "pune", "goa", "kerala", "himachal",
-        "manali", "shimla", "rishikesh", "varanasi", "udaipur", "jodhpur", "kyoto", "osaka", "rome", 
-        "venice", "florence", "milan", "barcelona", "madrid", "berlin", "munich", "amsterdam"
-    ]
-    
     transcript_lower = transcript.lower()
     
-    # Only look for a new city if we don't have one, or if the user seems to be changing it
-    # Find all mentioned cities and their positions
-    mentioned_cities = []
-    for city in cities:
-        # Use regex to find consistent word boundaries
-        matches = re.finditer(r'\b' + re.escape(city) + r'\b', transcript_lower)
-        for match in matches:
-            mentioned_cities.append((match.start(), city.title()))
-            
-    # Sort by position and pick the last one mentioned
-    if mentioned_cities:
-        mentioned_cities.sort(key=lambda x: x[0])
-        found_city = mentioned_cities[-1][1]
-    else:
-        found_city = None
-            
+    # Pick the last city mentioned, in case the user changes their mind mid-sentence
+    found_city = find_city(transcript_lower)
     if found_city:
         current_data["destination_city"] = found_city
     
     # Extract numbers for duration (digits or words)
-    duration_match = re.search(r'(\d+)\s*(day|days)', transcript_lower)
-    if duration_match:
-        current_data["duration_days"] = int(duration_match.group(1))
-    else:
-        # Handle word numbers
-        word_map = {
-            "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, 
-            "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
-        }
-        for word, val in word_map.items():
-            if f"{word} day" in transcript_lower:
-                current_data["duration_days"] = val
-                break
-                
-    if "one week" in transcript_lower or "a week" in transcript_lower:
-        current_data["duration_days"] = 7
-    elif "two weeks" in transcript_lower:
-        current_data["duration_days"] = 14
+    duration = find_duration(transcript_lower)
+    if duration:
+        current_data["duration_days"] = duration
     
     # Date parsing logic
-    from datetime import datetime, timedelta
-    today = datetime.now()
-    
-    if "next weekend" in transcript_lower:
-        # Find next Saturday
-        days_ahead = 5 - today.weekday() # Saturday is 5
-        if days_ahead <= 0: # If today is Saturday or Sunday, go to next week
-            days_ahead += 7
-        start_date = today + timedelta(days=days_ahead)
-        current_data["start_date"] = start_date.strftime("%Y-%m-%d")
-        
-    elif "next friday" in transcript_lower:
-        days_ahead = 4 - today.weekday()
-        if days_ahead <= 0:
-            days_ahead += 7
-        start_date = today + timedelta(days=days_ahead)
-        current_data["start_date"] = start_date.strftime("%Y-%m-%d")
-        
-    elif "tomorrow" in transcript_lower:
-        start_date = today + timedelta(days=1)
-        current_data["start_date"] = start_date.strftime("%Y-%m-%d")
+    start_date = find_start_date(transcript_lower)
+    if start_date:
+        current_data["start_date"] = start_date
+    if current_data["start_date"] and current_data["duration_days"]:
+        from datetime import datetime, timedelta
+        try:
+            start = datetime.strptime(current_data["start_date"], "%Y-%m-%d")
+            current_data["end_date"] = (start + timedelta(days=current_data["duration_days"] - 1)).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
 
     # Budget extraction
     budget_digits = re.search(r'budget (of|is|around)?\s*([\d,]+)', transcript_lower)
@@ -127,6 +180,7 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
         "restaurant": "Local Cuisine",
         "history": "History",
         "historic": "History",
+        "historical": "History",
         "culture": "Culture",
         "museum": "Museums",
         "art": "Art",
@@ -134,6 +188,7 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
         "park": "Nature",
         "adventure": "Adventure",
         "hiking": "Adventure",
+        "hike": "Adventure",
         "nightlife": "Nightlife",
         "club": "Nightlife",
         "party": "Nightlife",
@@ -146,7 +201,8 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
     
     found_interests = set(current_data.get("interests", []))
     for word, category in interest_keywords.items():
-        if word in transcript_lower:
+        # Whole words (plus plurals), so "art" doesn't fire on "start" or "eat" on "great"
+        if re.search(r"\b" + re.escape(word) + r"(s|es)?\b", transcript_lower):
             found_interests.add(category)
     current_data["interests"] = list(found_interests)
 
@@ -161,7 +217,7 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
         matches = re.finditer(pattern, transcript) # Use original transcript for capitalization
         for match in matches:
             place = match.group(2)
-            if place.lower() not in cities: # Don't add cities as must-visit places
+            if place.lower() not in KNOWN_CITIES: # Don't add cities as must-visit places
                  found_must_visit.add(place)
     
     # Also handle specific mentions from the user's screenshot
@@ -189,7 +245,9 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
             changes.append(f"destination to {current_data['destination_city']}")
         if current_data["duration_days"] != existing_constraints.get("duration_days"):
             changes.append(f"duration to {current_data['duration_days']} days")
-        if current_data["budget_level"] != existing_constraints.get("budget_level"):
+        if current_data["start_date"] != existing_constraints.get("start_date"):
+            changes.append(f"start date to {current_data['start_date']}")
+        if current_data["budget_level"] != existing_constraints.get("budget_level", "Moderate"):
             changes.append(f"budget to {current_data['budget_level']}")
         
         # Check for new interests
@@ -202,26 +260,43 @@ def extract_constraints_simple(transcript: str, existing_constraints: dict = Non
         if new_places:
             changes.append(f"added {', '.join(new_places)} to your must-visit list")
 
-    if changes:
-        suggested_response = f"I've updated your {', '.join(changes)}. Anything else?"
+    # Ask for the first missing slot
+    next_question = None
+    if not destination:
+        missing.append("destination")
+        clarification = next_question = "Which city would you like to visit?"
+    elif not duration:
+        missing.append("duration")
+        clarification = f"Great, a trip to {destination}. How many days are you planning for?"
+        next_question = "How many days are you planning for?"
+    elif not start_date:
+        missing.append("start_date")
+        clarification = f"When are you planning to visit {destination}? (e.g., 'tomorrow', 'next friday')"
+        next_question = "When are you planning to go? (e.g., 'tomorrow', 'next friday')"
+
+    acknowledgement = None
+    if intent == "greeting":
+        acknowledgement = "Hi again!" if destination else "Hi there!"
+    elif intent == "thanks":
+        acknowledgement = "You're welcome!"
+
+    if is_complete and intent == "confirm":
+        suggested_response = f"Great! Press Generate Itinerary and I'll put together your {duration}-day trip to {destination}."
+    elif changes:
+        follow_up = next_question or ("Ready to generate the itinerary?" if is_complete else "Anything else?")
+        suggested_response = f"I've updated your {', '.join(changes)}. {follow_up}"
     elif is_complete:
         if "?" in transcript:
             suggested_response = "I see your question! I'm currently in a limited mode, so I can't answer details, but I have your trip preferences saved."
+        elif acknowledgement:
+            suggested_response = f"{acknowledgement} Your trip to {destination} is ready to plan whenever you are."
         else:
             suggested_response = "I've noted that down. Your trip plan is looking good! Ready to generate the itinerary?"
-    else:
-        # Not complete and no clear changes detected
-        if not destination:
-            missing.append("destination")
-            clarification = "Which city would you like to visit?"
-        elif not duration:
-            missing.append("duration")
-            clarification = f"Great, a trip to {destination}. How many days are you planning for?"
-        elif not start_date:
-            missing.append("start_date")
-            clarification = f"When are you planning to visit {destination}? (e.g., 'tomorrow', 'next friday')"
-        else:
-            suggested_response = "I've captured that. Is there anything else you'd like to add to your trip?"
+    elif acknowledgement:
+        # The client shows suggested_response in place of the question, so keep both
+        suggested_response = f"{acknowledgement} {clarification}"
+    elif not clarification:
+        suggested_response = "I've captured that. Is there anything else you'd like to add to your trip?"
 
     return TripConstraints(
         destination_city=destination,
@@ -245,10 +320,6 @@ async def extract_constraints_with_openrouter(transcript: str, existing_constrai
     Uses OpenRouter API for intent extraction (primary method) with full conversation history.
     """
     try:
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        if not api_key:
-            raise ValueError("OpenRouter API key not configured")
-        
         system_instruction = f"""You are an AI travel assistant. Extract trip constraints from the user's input, considering the conversation history.
 
 Current Known Constraints: {json.dumps(existing_constraints, default=str) if existing_constraints else "{}"}
@@ -272,8 +343,8 @@ Return ONLY a JSON object (no markdown):
     "clarification_question": string | null
 }}"""
 
-        # Construct messages list
-        messages = [{"role": "system", "content": system_instruction}]
+        # Construct messages list (the provider prepends the system prompt)
+        messages = []
         
         # Add history (limit to last 30 messages to stay within context)
         if history:
@@ -284,53 +355,43 @@ Return ONLY a JSON object (no markdown):
         # Add current input
         messages.append({"role": "user", "content": transcript})
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://localhost:3000",
-                },
-                json={
-                    "model": "google/gemini-2.0-flash-exp:free",  # Free tier model
-                    "messages": messages
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"OpenRouter API error: {response.status_code} - {response.text}")
-                raise Exception(f"OpenRouter returned {response.status_code}")
-            
-            result = response.json()
-            text = result["choices"][0]["message"]["content"].strip()
-            text = text.replace("```json", "").replace("```", "").strip()
-            
-            data = json.loads(text)
-            return TripConstraints(**data)
+        response = await llm_client.complete(
+            "extract_constraints",
+            messages,
+            system=system_instruction,
+            provider="openrouter",
+            tool=CONSTRAINTS_TOOL
+        )
+        
+        return TripConstraints(**response.data)
         
     except Exception as e:
         logger.error(f"OpenRouter error: {str(e)}")
         raise e
 
-from app.services.claude_api import extract_constraints_with_claude
-
-# ... (rest of imports)
-
 # ... (extract_constraints_simple and extract_constraints_with_openrouter can stay as legacy/unused or be removed, keeping them for now is safer)
 
-async def extract_constraints(transcript: str, existing_constraints: dict = None, history: list = []) -> TripConstraints:
+async def extract_constraints(transcript: str, existing_constraints: dict = None, history: list = [],
+                              summary: str = None) -> TripConstraints:
     """
     Uses Claude 3.5 Sonnet to parse the user's transcript and extract trip constraints.
+    Trivial turns (confirmations, greetings, bare city/duration/date answers) are answered
+    locally by the intent classifier's fast path instead.
     Falls back to simple regex extraction if API fails.
     """
+    from app.services.intent_classifier import intent_classifier
+    last = history[-1] if history else None
+    last_assistant_turn = last["content"] if last and last.get("role") == "assistant" else None
+    match = await intent_classifier.classify(transcript, existing_constraints, last_assistant_turn)
+    if match is not None:
+        return extract_constraints_simple(transcript, existing_constraints, intent=match.intent)
+
     try:
         # Try Claude 3.5 Sonnet
-        return await extract_constraints_with_claude(transcript, existing_constraints, history)
+        return await extract_constraints_with_claude(transcript, existing_constraints, history, summary)
         
     except Exception as e:
         logger.error(f"Intent extraction error: {str(e)}")
         # Fallback: simple regex extraction
         logger.warning("Using simple regex fallback")
         return extract_constraints_simple(transcript, existing_constraints)
-
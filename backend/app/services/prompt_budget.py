@@ -0,0 +1,105 @@
+"""
+Prompt compaction for the curation call.
+
+The draft itinerary we send to Claude carries every POI's raw `details` dict. For OSM POIs
+that is mostly empty strings plus city-level context (`city_description`, `weather_summary`,
+`city_guide`) repeated on every POI. This module strips that down before the prompt is built.
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# City-level context that `search_pois_comprehensive` copies onto every POI
+SHARED_DETAIL_FIELDS = ("city_description", "weather_summary", "city_guide")
+
+# Rough heuristic for English/JSON text; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count for a prompt string."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly `max_tokens`, on a word boundary where possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if " " in cut:
+        cut = cut[:cut.rfind(" ")]
+    return cut.rstrip(" ,.;:") + "..."
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _compact_value(value: Any, field_tokens: int) -> Any:
+    if isinstance(value, str):
+        return truncate_to_tokens(value.strip(), field_tokens)
+    if isinstance(value, dict):
+        compact = {k: _compact_value(v, field_tokens) for k, v in value.items() if not _is_empty(v)}
+        return {k: v for k, v in compact.items() if not _is_empty(v)}
+    if isinstance(value, list):
+        return [_compact_value(v, field_tokens) for v in value if not _is_empty(v)]
+    return value
+
+
+def compact_draft(draft_days: list, field_tokens: int) -> Tuple[List[Dict], Dict[str, str]]:
+    """
+    Builds the compact draft sent to the curator.
+    Returns (draft, shared_context) where shared_context holds the city-level fields
+    that were hoisted out of the per-POI details.
+    """
+    shared: Dict[str, str] = {}
+    draft = []
+    for d in draft_days:
+        day_info = {"day": d.day_number, "activities": []}
+        for b in d.blocks:
+            details = dict(b.poi.details or {})
+            for field in SHARED_DETAIL_FIELDS:
+                value = details.pop(field, None)
+                if not _is_empty(value) and field not in shared:
+                    shared[field] = value
+
+            activity = {
+                "slot": b.time_block,
+                "name": b.poi.name,
+                "category": b.poi.category,
+                "rating": b.poi.rating,
+                "source_desc": b.poi.description,
+                "source_details": details
+            }
+            # The POI description often just echoes the shared city description
+            if activity["source_desc"] and activity["source_desc"] == shared.get("city_description"):
+                activity["source_desc"] = None
+            day_info["activities"].append(_compact_value(activity, field_tokens))
+        draft.append(day_info)
+
+    shared = {k: truncate_to_tokens(str(v), field_tokens * 2) for k, v in shared.items()}
+    return draft, shared
+
+
+def build_budgeted_draft(draft_days: list, token_budget: int = None, field_tokens: int = None) -> Tuple[str, Dict[str, str], int]:
+    """
+    Serializes the compact draft, tightening the per-field budget until it fits `token_budget`.
+    Returns (draft_json, shared_context, estimated_tokens).
+    """
+    token_budget = token_budget or int(os.getenv("CURATION_DRAFT_TOKEN_BUDGET", 3000))
+    field_tokens = field_tokens or int(os.getenv("CURATION_FIELD_TOKEN_BUDGET", 60))
+
+    while True:
+        draft, shared = compact_draft(draft_days, field_tokens)
+        draft_json = json.dumps(draft, separators=(",", ":"), ensure_ascii=False)
+        tokens = estimate_tokens(draft_json)
+        if tokens <= token_budget or field_tokens <= 10:
+            return draft_json, shared, tokens
+        field_tokens //= 2
@@ -1,27 +1,99 @@
-import chromadb
-from chromadb.utils import embedding_functions
 import os
+import time
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from collections import Counter, defaultdict
+from app.services.bm25 import BM25Index, reciprocal_rank_fusion
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.lru_cache import LRUCache
+from app.services.vector_store import VectorStore, create_vector_store
 
 logger = logging.getLogger(__name__)
 
+
+class RAGOverloadedError(Exception):
+    """Raised when too many RAG queries are already queued; callers should shed load."""
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def normalize_city(city: str = None) -> str:
+    return normalize_query(city) if city else None
+
+
 class RAGEngine:
-    def __init__(self):
-        # Initialize ChromaDB client (using persistent storage for demo)
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        
-        # Use simple default embedding function (all-MiniLM-L6-v2)
-        self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
-        
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="travel_knowledge",
-            embedding_function=self.embedding_fn
-        )
+    def __init__(self, store: VectorStore = None, embedding_fn=None, seed: bool = True):
+        # Two-level cache: normalized text -> float32 embedding, and
+        # (text, n_results, filters) -> documents. Embeddings depend only on the text, so
+        # writes never touch them; result entries are stamped with the write generation
+        # of what they searched (one city, or the whole collection) and expire with it.
+        self.embedding_cache = LRUCache(int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", 2048)))
+        self.result_cache = LRUCache(int(os.getenv("RAG_RESULT_CACHE_SIZE", 1024)))
+        self._generation = 0
+        self._city_generation: dict[str, int] = defaultdict(int)
+
+        # Lexical side of hybrid retrieval, mirrored from the collection on every write.
+        # Writes (and store reload listeners) mutate these off the query threads, so both
+        # sides hold `_index_lock`; searches copy what they need and release it.
+        self._index_lock = threading.RLock()
+        self.bm25 = BM25Index()
+        self._documents: dict[str, str] = {}
+        self._city_ids: dict[str, set] = defaultdict(set)
+        # doc id -> (normalized city, raw metadata value); raw values are counted per city
+        # so the store's where filter only lists spellings some document still uses
+        self._doc_city: dict[str, tuple] = {}
+        self._city_values: dict[str, Counter] = defaultdict(Counter)
+        self.rrf_k = int(os.getenv("RAG_RRF_K", 60))
+
+        # Squared-L2 distance above which a hit is considered off-topic (<= 0 disables).
+        # For normalized MiniLM vectors, 1.4 is roughly cosine similarity 0.3.
+        self.max_distance = float(os.getenv("RAG_MAX_DISTANCE", 1.4))
+        # On stores with approximate filtered search (Chroma), city scopes up to this size are
+        # scanned exactly; larger ones use the store's where filter. Stores whose filtered
+        # search is already exact (numpy, over its shared mmap) always use the filter.
+        self.exact_search_max = int(os.getenv("RAG_EXACT_SEARCH_MAX", 2000))
+        # city -> (stamp, ids, matrix, row norms) for those exact scans, kept until the city is
+        # written. These are private per-process copies, so the numpy store never fills it.
+        self.scope_cache = LRUCache(int(os.getenv("RAG_SCOPE_CACHE_SIZE", 64)))
+
+        # Chroma (and the ONNX runtime behind the default embedding function) are imported
+        # here rather than at module level so importing this module stays cheap
+        if embedding_fn is None:
+            from chromadb.utils import embedding_functions
+            # Use simple default embedding function (all-MiniLM-L6-v2)
+            embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+        self.embedding_fn = embedding_fn
+
+        # Vector store backend (VECTOR_STORE_BACKEND=chroma|numpy)
+        self.store = store or create_vector_store(embedding_fn=self.embedding_fn)
         
         # Check if empty, if so populate with seed data
-        if self.collection.count() == 0:
-            self.populate_seed_data()
+        if self.store.count() == 0:
+            if seed:
+                self.populate_seed_data()
+        else:
+            for ids, documents, metadatas in self.store.iter_records():
+                self._index_documents(ids, documents, metadatas)
+        # Other workers writing to a shared store: keep the mirrors above in step
+        self.store.add_listener(self._on_store_reload)
+
+        # Embedding + search are CPU-bound, so async callers run them on a dedicated pool
+        # instead of the event loop. `max_pending` bounds queued + running queries.
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_WORKERS", 2)),
+            thread_name_prefix="rag-query"
+        )
+        self.max_pending = int(os.getenv("RAG_MAX_PENDING", 32))
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+        # Concurrent async queries share batched ONNX runs for their query embeddings
+        self.batcher = EmbeddingBatcher(self.embedding_fn, executor=self._executor)
 
     def populate_seed_data(self):
         logger.info("Populating RAG with seed data...")
@@ -40,25 +112,327 @@ class RAGEngine:
         metadatas = [{"city": "paris"}, {"city": "paris"}, {"city": "tokyo"}, {"city": "tokyo"}, 
                      {"city": "delhi"}, {"city": "delhi"}, {"city": "jaipur"}, {"city": "india"}]
         
-        self.collection.add(
-            documents=documents,
-            ids=ids,
-            metadatas=metadatas
-        )
+        self.add_documents(documents=documents, ids=ids, metadatas=metadatas)
 
-    def query(self, query_text: str, n_results: int = 2) -> list[str]:
+    def add_documents(self, documents: list[str], ids: list[str], metadatas: list[dict] = None):
+        """Adds documents to the collection. All writes go through here so caches stay valid."""
+        self._write(self.store.add, documents, ids, metadatas)
+
+    def upsert_documents(self, documents: list[str], ids: list[str], metadatas: list[dict] = None):
+        self._write(self.store.upsert, documents, ids, metadatas)
+
+    def embed_documents(self, documents: list[str], batch_size: int = 256) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(documents), batch_size):
+            vectors.extend(self.embedding_fn(documents[start:start + batch_size]))
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _write(self, method, documents: list[str], ids: list[str], metadatas: list[dict] = None, embeddings=None):
+        if embeddings is None:
+            embeddings = self.embed_documents(documents)
+        method(ids, embeddings, documents, metadatas)
+        self.invalidate_caches(self._index_documents(ids, documents, metadatas))
+
+    def _index_documents(self, ids: list[str], documents: list[str], metadatas: list[dict] = None) -> set:
+        """Mirrors records into the lexical/city indexes; returns the cities they touched."""
+        metadatas = metadatas or [None] * len(ids)
+        touched = set()
+        with self._index_lock:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                previous = self._doc_city.pop(doc_id, None)
+                if previous:
+                    self._unindex_city(doc_id, *previous)
+                    touched.add(previous[0])
+                raw_city = (metadata or {}).get("city")
+                city = normalize_city(raw_city)
+                if city:
+                    self._city_ids[city].add(doc_id)
+                    self._city_values[city][raw_city] += 1
+                    self._doc_city[doc_id] = (city, raw_city)
+                    touched.add(city)
+                self._documents[doc_id] = document
+                self.bm25.add(doc_id, document)
+        return touched
+
+    def _unindex_city(self, doc_id: str, city: str, raw_city: str):
+        self._city_ids[city].discard(doc_id)
+        values = self._city_values[city]
+        values[raw_city] -= 1
+        if values[raw_city] <= 0:
+            del values[raw_city]
+        if not self._city_ids[city]:
+            del self._city_ids[city]
+            del self._city_values[city]
+
+    def _on_store_reload(self, ids: list[str], documents: list[str], metadatas: list[dict], reset: bool):
+        if reset:
+            # A new generation (e.g. a snapshot restore) replaces every record
+            with self._index_lock:
+                self.bm25 = BM25Index()
+                self._documents = {}
+                self._city_ids = defaultdict(set)
+                self._doc_city = {}
+                self._city_values = defaultdict(Counter)
+                self._index_documents(ids, documents, metadatas)
+            self.invalidate_caches()
+        else:
+            self.invalidate_caches(self._index_documents(ids, documents, metadatas))
+
+    def invalidate_caches(self, cities: set = None):
+        """
+        Expires cached results after a write to `cities` (normalized): unscoped results
+        always, city-scoped ones only for those cities. Without `cities`, all results go.
+        """
+        self._generation += 1
+        if cities is None:
+            self.result_cache.clear()
+            self.scope_cache.clear()
+            return
+        for city in cities:
+            self._city_generation[city] += 1
+
+    def _result_stamp(self, city: str = None) -> tuple:
+        """Write generation of what a search for `city` reads: that city's documents, or everything."""
+        if city and self._city_ids.get(city):
+            return (city, self._city_generation[city])
+        return (None, self._generation)
+
+    def _cached_result(self, key: tuple):
+        cached = self.result_cache.get(key)
+        if cached is None or cached[0] != self._result_stamp(key[2]):
+            return None
+        return list(cached[1])
+
+    def cache_stats(self) -> dict:
+        return {"embeddings": self.embedding_cache.stats(), "results": self.result_cache.stats(),
+                "scopes": self.scope_cache.stats()}
+
+    def _result_key(self, query_text: str, n_results: int, city: str = None) -> tuple:
+        return (normalize_query(query_text), n_results, normalize_city(city))
+
+    def _store_embedding(self, text: str, embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        self.embedding_cache.set(text, vector)
+        return vector
+
+    def query(self, query_text: str, n_results: int = 2, city: str = None) -> list[str]:
         """
         Retrieves relevant documents for the query.
+        With `city` set, only that city's documents are searched (unless it has none).
+        """
+        return [document for document, _ in self.query_with_scores(query_text, n_results, city)]
+
+    def query_with_scores(self, query_text: str, n_results: int = 2, city: str = None) -> list[tuple]:
+        """
+        Like `query`, but returns (document, distance) pairs. Hits farther than
+        `max_distance` are dropped, so off-topic questions return an empty list.
         """
+        self.store.refresh()
+        key = self._result_key(query_text, n_results, city)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
         try:
-            results = self.collection.query(
-                query_texts=[query_text],
-                n_results=n_results
+            stamp = self._result_stamp(key[2])
+            text = key[0]
+            embedding = self.embedding_cache.get(text)
+            if embedding is None:
+                embedding = self._store_embedding(text, self.embedding_fn([text])[0])
+            return self._search(key, embedding, stamp)
+        except Exception as e:
+            logger.error(f"RAG query error: {str(e)}")
+            return []
+
+    def _search(self, key: tuple, embedding, stamp: tuple) -> list[tuple]:
+        """Hybrid search: vector and BM25 candidates fused with reciprocal rank fusion."""
+        text, n_results, city = key
+        candidates = max(n_results * 4, 10)
+        with self._index_lock:
+            bm25 = self.bm25
+            allowed_ids = set(self._city_ids.get(city, ())) if city else None
+            city_values = sorted(self._city_values.get(city, ())) if city else []
+        if city and not allowed_ids:
+            # Nothing indexed for this city yet: fall back to the whole collection
+            logger.info(f"No RAG documents for city '{city}', searching all cities")
+            allowed_ids = None
+
+        if allowed_ids and not self.store.exact_filters and len(allowed_ids) <= self.exact_search_max:
+            # Filtered HNSW search is approximate and misses hits under very selective
+            # filters, so small scopes are scanned exactly instead
+            vector_ranking, distances = self._exact_search(embedding, city, allowed_ids, candidates)
+        else:
+            vector_ranking, scores = self.store.query(
+                embedding,
+                n_results=candidates,
+                where={"city": {"$in": city_values}} if allowed_ids else None
             )
-            return results['documents'][0] if results['documents'] else []
+            distances = dict(zip(vector_ranking, scores))
+        if self.max_distance > 0:
+            vector_ranking = [doc_id for doc_id in vector_ranking if distances[doc_id] <= self.max_distance]
+
+        # Lexical-only hits count only when the query is on-topic for the vector side too
+        lexical_ranking = []
+        if vector_ranking:
+            lexical_ranking = [doc_id for doc_id, _ in bm25.search(text, candidates, allowed_ids)]
+            if self.max_distance > 0:
+                lexical_ranking = [
+                    doc_id for doc_id in lexical_ranking
+                    if distances.get(doc_id, 0.0) <= self.max_distance
+                ]
+
+        fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=self.rrf_k)
+        with self._index_lock:
+            documents = [
+                (self._documents[doc_id], distances.get(doc_id))
+                for doc_id, _ in fused[:n_results] if doc_id in self._documents
+            ]
+        # Don't cache a result computed against documents that changed mid-query
+        if stamp == self._result_stamp(city):
+            self.result_cache.set(key, (stamp, tuple(documents)))
+        return documents
+
+    def _exact_search(self, embedding, city: str, ids: set, k: int) -> tuple:
+        stamp = self._result_stamp(city)
+        cached = self.scope_cache.get(city)
+        if cached is not None and cached[0] == stamp:
+            _, found, matrix, norms = cached
+        else:
+            # Fetched once per city write generation, not on every query
+            found, matrix = self.store.get_embeddings(sorted(ids))
+            matrix = np.asarray(matrix, dtype=np.float32)
+            norms = np.einsum("ij,ij->i", matrix, matrix) if len(found) else np.zeros(0, dtype=np.float32)
+            self.scope_cache.set(city, (stamp, found, matrix, norms))
+        if not found:
+            return [], {}
+        # Same metric as the stores (squared euclidean)
+        query = np.asarray(embedding, dtype=np.float32)
+        squared = np.maximum(norms - 2 * (matrix @ query) + float(query @ query), 0.0)
+        order = np.argsort(squared)[:k]
+        ranking = [found[i] for i in order]
+        return ranking, {found[i]: float(squared[i]) for i in order}
+
+    async def aquery(self, query_text: str, n_results: int = 2, city: str = None) -> list[str]:
+        """
+        Async variant of `query` that never blocks the event loop.
+        Raises RAGOverloadedError when `max_pending` queries are already in flight.
+        """
+        results = await self.aquery_with_scores(query_text, n_results, city)
+        return [document for document, _ in results]
+
+    async def aquery_with_scores(self, query_text: str, n_results: int = 2, city: str = None) -> list[tuple]:
+        # One stat of the store manifest when nothing changed; only other workers' writes cost more
+        self.store.refresh()
+        key = self._result_key(query_text, n_results, city)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise RAGOverloadedError(f"RAG queue full ({self._pending} pending)")
+            self._pending += 1
+        try:
+            stamp = self._result_stamp(key[2])
+            text = key[0]
+            embedding = self.embedding_cache.get(text)
+            if embedding is None:
+                embedding = self._store_embedding(text, await self.batcher.embed(text))
+            job = self._executor.submit(self._search, key, embedding, stamp)
+        except BaseException as e:
+            self._release_pending()
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"RAG query error: {str(e)}")
+            return []
+        # A cancelled caller doesn't stop a search already running on the pool, so the slot
+        # is held until the job itself finishes (or is cancelled before it starts)
+        job.add_done_callback(lambda _: self._release_pending())
+        try:
+            return await asyncio.wrap_future(job)
         except Exception as e:
             logger.error(f"RAG query error: {str(e)}")
             return []
 
+    def _release_pending(self) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+_engine: RAGEngine = None
+_engine_lock = threading.Lock()
+_engine_state = {"status": "cold", "error": None, "init_seconds": None, "attempts": 0}
+
+
+def get_rag_engine() -> RAGEngine:
+    """Returns the shared engine, building it on first use (thread-safe)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine_state.update(status="warming", error=None, attempts=_engine_state["attempts"] + 1)
+                started = time.perf_counter()
+                try:
+                    engine = RAGEngine()
+                    # The ONNX session loads on first use; pay for it here, not on a user query
+                    engine.embedding_fn(["warm-up"])
+                except Exception as e:
+                    _engine_state.update(status="failed", error=str(e))
+                    raise
+                _engine_state.update(
+                    status="ready",
+                    backend=engine.store.name,
+                    init_seconds=round(time.perf_counter() - started, 3)
+                )
+                logger.info(f"RAG engine ready in {_engine_state['init_seconds']}s")
+                _engine = engine
+    return _engine
+
+
+async def aget_rag_engine() -> RAGEngine:
+    """Async accessor: a cold start is paid on a worker thread, not the event loop."""
+    if _engine is not None:
+        return _engine
+    return await asyncio.to_thread(get_rag_engine)
+
+
+def rag_engine_status() -> dict:
+    return dict(_engine_state)
+
+
+async def warm_up_rag_engine(retries: int = None, backoff: float = None) -> None:
+    """
+    Background warm-up entry point. A failed build (e.g. the model download timing out)
+    is retried with exponential backoff so readiness recovers without a restart; after
+    the last attempt the engine is still built on first use.
+    """
+    retries = retries if retries is not None else int(os.getenv("RAG_WARMUP_RETRIES", 5))
+    delay = backoff or float(os.getenv("RAG_WARMUP_BACKOFF_SECONDS", 2))
+    for attempt in range(retries + 1):
+        try:
+            await aget_rag_engine()
+            return
+        except Exception as e:
+            if attempt == retries:
+                logger.error(f"RAG warm-up failed after {attempt + 1} attempts: {str(e)}")
+                return
+            logger.error(f"RAG warm-up failed: {str(e)}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+class _LazyRAGEngine:
+    """Module-level handle that forwards to the shared engine, creating it on first use."""
+
+    def __getattr__(self, name):
+        return getattr(get_rag_engine(), name)
+
+    async def aquery(self, *args, **kwargs) -> list[str]:
+        engine = await aget_rag_engine()
+        return await engine.aquery(*args, **kwargs)
+
+    async def aquery_with_scores(self, *args, **kwargs) -> list[tuple]:
+        engine = await aget_rag_engine()
+        return await engine.aquery_with_scores(*args, **kwargs)
+
+
 # Singleton instance
-rag_engine = RAGEngine()
+rag_engine = _LazyRAGEngine()
@@ -0,0 +1,192 @@
+"""
+Server-side conversation sessions for intent extraction.
+
+Clients send a session id and the new utterance instead of the whole history. Turns
+are appended to SQLite; the latest constraints are kept on the session. Once more than
+`recent_turns + summary_batch` turns are unsummarized, the oldest batch is folded into
+a rolling summary in the background, so what goes to the LLM (summary + the last few
+turns) stays roughly constant however long the conversation gets.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class SessionNotFoundError(Exception):
+    pass
+
+
+@dataclass
+class Session:
+    id: str
+    constraints: Optional[Dict[str, Any]] = None
+    summary: str = ""
+    summarized_upto: int = 0
+    turn_count: int = 0
+    recent: List[Dict[str, str]] = field(default_factory=list)
+
+
+class SessionStore:
+    """SQLite-backed sessions: append-only turns plus a rolling summary."""
+
+    def __init__(self, path: str = None, recent_turns: int = None, summary_batch: int = None, ttl: float = None):
+        self.path = path or os.getenv("SESSION_STORE_PATH", "./sessions.db")
+        self.recent_turns = recent_turns or int(os.getenv("SESSION_RECENT_TURNS", 8))
+        self.summary_batch = summary_batch or int(os.getenv("SESSION_SUMMARY_BATCH", 8))
+        self.ttl = ttl if ttl is not None else float(os.getenv("SESSION_TTL_SECONDS", 7 * 24 * 3600))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._summarizing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    constraints TEXT,
+                    summary TEXT NOT NULL DEFAULT '',
+                    summarized_upto INTEGER NOT NULL DEFAULT 0,
+                    turn_count INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS session_turns (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def create(self, constraints: Dict[str, Any] = None, history: List[Dict[str, Any]] = None) -> str:
+        """Starts a session, optionally seeded from a client-held history (legacy clients)."""
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connection()
+            self._prune(conn)
+            conn.execute(
+                "INSERT INTO sessions (id, constraints, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(constraints) if constraints else None, time.time())
+            )
+            conn.commit()
+        for message in history or []:
+            if message.get("role") in ("user", "assistant") and message.get("content"):
+                self.append_turn(session_id, message["role"], str(message["content"]))
+        return session_id
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [row[0] for row in conn.execute("SELECT id FROM sessions WHERE updated_at < ?", (cutoff,))]
+        for session_id in expired:
+            conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """The session with its summary and the turns after it (at most `recent_turns + summary_batch`)."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT constraints, summary, summarized_upto, turn_count FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if not row:
+                return None
+            constraints, summary, summarized_upto, turn_count = row
+            turns = conn.execute(
+                "SELECT role, content FROM session_turns WHERE session_id = ? AND seq > ? ORDER BY seq DESC LIMIT ?",
+                (session_id, summarized_upto, self.recent_turns + self.summary_batch)
+            ).fetchall()
+        return Session(
+            id=session_id,
+            constraints=json.loads(constraints) if constraints else None,
+            summary=summary,
+            summarized_upto=summarized_upto,
+            turn_count=turn_count,
+            recent=[{"role": role, "content": content} for role, content in reversed(turns)]
+        )
+
+    def append_turn(self, session_id: str, role: str, content: str) -> int:
+        with self._lock:
+            conn = self._connection()
+            seq = conn.execute("SELECT turn_count + 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO session_turns (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, role, content, time.time())
+            )
+            conn.execute("UPDATE sessions SET turn_count = ?, updated_at = ? WHERE id = ?", (seq, time.time(), session_id))
+            conn.commit()
+        return seq
+
+    def set_constraints(self, session_id: str, constraints: Dict[str, Any]) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE sessions SET constraints = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(constraints, default=str), time.time(), session_id)
+            )
+            conn.commit()
+
+    def _set_summary(self, session_id: str, summary: str, upto: int) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE sessions SET summary = ?, summarized_upto = ? WHERE id = ? AND summarized_upto < ?",
+                (summary, upto, session_id, upto)
+            )
+            conn.commit()
+
+    def _turns_between(self, session_id: str, after: int, upto: int) -> List[Dict[str, str]]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT role, content FROM session_turns WHERE session_id = ? AND seq > ? AND seq <= ? ORDER BY seq",
+                (session_id, after, upto)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    async def summarize_if_needed(self, session_id: str) -> bool:
+        """Folds the oldest unsummarized batch into the summary when the backlog is long enough."""
+        session = self.get(session_id)
+        if session is None or session_id in self._summarizing:
+            return False
+        if session.turn_count - session.summarized_upto <= self.recent_turns + self.summary_batch:
+            return False
+        self._summarizing.add(session_id)
+        try:
+            upto = session.turn_count - self.recent_turns
+            turns = self._turns_between(session_id, session.summarized_upto, upto)
+            from app.services.claude_api import summarize_conversation_with_claude
+            summary = await summarize_conversation_with_claude(session.summary, turns)
+            if not summary:
+                # Try again after the next turn; `get` still caps what goes to the model
+                return False
+            self._set_summary(session_id, summary, upto)
+            logger.info(f"Session {session_id}: summarized turns {session.summarized_upto + 1}-{upto}")
+            return True
+        finally:
+            self._summarizing.discard(session_id)
+
+    def schedule_summary(self, session_id: str) -> None:
+        """Runs `summarize_if_needed` off the request path."""
+        task = asyncio.create_task(self.summarize_if_needed(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+session_store = SessionStore()
@@ -0,0 +1,171 @@
+"""
+Speculative itinerary pre-generation.
+
+Constraints are often complete a few turns before the user confirms the plan. When
+`/api/analyze-intent` sees complete constraints, it asks the planner to start a
+background `build_itinerary` for them, keyed by a fingerprint of the fields that shape
+the plan. If the conversation changes the constraints, the session's speculative build
+is cancelled. `/api/plan-trip` with matching constraints then takes the finished result,
+or joins the build still in flight, instead of starting from scratch.
+
+Speculation is low priority: it starts after a short delay, a limited number run at
+once, and when that limit is reached new speculation is skipped rather than queued.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def constraints_fingerprint(constraints: Dict[str, Any]) -> str:
+    """Hash of the constraint fields that change the itinerary, normalized."""
+    def norm(value) -> str:
+        return str(value).strip().lower() if value is not None else ""
+
+    key = {
+        "city": norm(constraints.get("destination_city")),
+        "days": int(constraints.get("duration_days") or 3),
+        "pace": norm(constraints.get("pace") or "moderate"),
+        "budget": norm(constraints.get("budget_level") or "moderate"),
+        "start": norm(constraints.get("start_date")),
+        "interests": sorted(norm(i) for i in constraints.get("interests") or []),
+        "must_visit": sorted(norm(m) for m in constraints.get("must_visit") or []),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+class SpeculativePlanner:
+    """Background itinerary builds keyed by constraints fingerprint, one per session."""
+
+    def __init__(self, enabled: bool = None, max_inflight: int = None, delay: float = None, ttl: float = None,
+                 max_sessions: int = None):
+        self.enabled = enabled if enabled is not None else os.getenv("SPECULATIVE_PLANNING", "true").lower() == "true"
+        self.max_inflight = max_inflight or int(os.getenv("SPECULATIVE_MAX_INFLIGHT", 2))
+        self.delay = delay if delay is not None else float(os.getenv("SPECULATIVE_DELAY_SECONDS", 1.0))
+        self.ttl = ttl if ttl is not None else float(os.getenv("SPECULATIVE_TTL_SECONDS", 900))
+        self._results = LRUCache(int(os.getenv("SPECULATIVE_CACHE_SIZE", 64)))
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # session id -> fingerprint it wants, oldest first; abandoned sessions age out
+        self._sessions: "OrderedDict[str, str]" = OrderedDict()
+        self.max_sessions = max_sessions or int(os.getenv("SPECULATIVE_MAX_SESSIONS", 1024))
+        self.stats = {"started": 0, "skipped": 0, "cancelled": 0, "failed": 0, "hits": 0, "joined": 0, "misses": 0}
+
+    def start(self, session_id: str, constraints: Dict[str, Any]) -> Optional[str]:
+        """Starts (or keeps) a speculative build for the session's complete constraints."""
+        if not self.enabled or not constraints.get("destination_city"):
+            return None
+        fingerprint = constraints_fingerprint(constraints)
+        previous = self._sessions.get(session_id)
+        if previous == fingerprint:
+            return fingerprint
+        self._sessions[session_id] = fingerprint
+        self._sessions.move_to_end(session_id)
+        if previous is not None:
+            self._cancel(previous)
+        while len(self._sessions) > self.max_sessions:
+            _, oldest = self._sessions.popitem(last=False)
+            self._cancel(oldest)
+        if fingerprint in self._tasks or self._fresh_result(fingerprint) is not None:
+            return fingerprint
+        if len(self._tasks) >= self.max_inflight:
+            self.stats["skipped"] += 1
+            return None
+        task = asyncio.create_task(self._run(fingerprint, dict(constraints)))
+        self._tasks[fingerprint] = task
+        task.add_done_callback(lambda done: self._forget(fingerprint, done))
+        self.stats["started"] += 1
+        logger.info(f"Speculative planning started for {constraints.get('destination_city')} ({fingerprint[:8]})")
+        return fingerprint
+
+    def _forget(self, fingerprint: str, task: asyncio.Task) -> None:
+        # A cancelled build may finish after a new one took its fingerprint; leave that one tracked
+        if self._tasks.get(fingerprint) is task:
+            del self._tasks[fingerprint]
+
+    def invalidate(self, session_id: str) -> None:
+        """Constraints are no longer complete (or the session ended): drop its speculation."""
+        previous = self._sessions.pop(session_id, None)
+        if previous is not None:
+            self._cancel(previous)
+
+    def _cancel(self, fingerprint: str) -> None:
+        # Another session may want the same plan
+        if fingerprint in self._sessions.values():
+            return
+        task = self._tasks.pop(fingerprint, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.stats["cancelled"] += 1
+            logger.info(f"Speculative planning cancelled ({fingerprint[:8]})")
+
+    async def _run(self, fingerprint: str, constraints: Dict[str, Any]):
+        from app.mcp.itinerary import build_itinerary, request_from_constraints
+        # Let the current turn's reply (and TTS) go out first
+        await asyncio.sleep(self.delay)
+        try:
+            itinerary = await build_itinerary(request_from_constraints(constraints))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Speculative planning failed: {str(e)}")
+            return None
+        self._results.set(fingerprint, (time.time(), itinerary))
+        return itinerary
+
+    def _fresh_result(self, fingerprint: str) -> Optional[Any]:
+        cached: Optional[Tuple[float, Any]] = self._results.get(fingerprint)
+        if cached is None or time.time() - cached[0] > self.ttl:
+            return None
+        return cached[1]
+
+    async def take(self, constraints: Dict[str, Any]) -> Optional[Any]:
+        """A speculative itinerary for these constraints: finished, or awaited if still building."""
+        if not self.enabled:
+            return None
+        fingerprint = constraints_fingerprint(constraints)
+        itinerary = self._fresh_result(fingerprint)
+        if itinerary is not None:
+            self.stats["hits"] += 1
+            self._release_sessions(fingerprint)
+            return itinerary.model_copy(deep=True)
+        task = self._tasks.get(fingerprint)
+        if task is not None:
+            try:
+                itinerary = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if task.cancelled():
+                    itinerary = None
+                else:
+                    raise
+            if itinerary is not None:
+                self.stats["joined"] += 1
+                self._release_sessions(fingerprint)
+                return itinerary.model_copy(deep=True)
+        self.stats["misses"] += 1
+        return None
+
+    def _release_sessions(self, fingerprint: str) -> None:
+        """The plan was taken: sessions waiting on it no longer need tracking."""
+        for session_id in [sid for sid, fp in self._sessions.items() if fp == fingerprint]:
+            del self._sessions[session_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, inflight=len(self._tasks), cached=len(self._results), sessions=len(self._sessions))
+
+    def close(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+
+
+speculative_planner = SpeculativePlanner()
@@ -1,12 +1,14 @@
 import os
+import asyncio
 import logging
+from typing import AsyncIterator, Iterator
 from elevenlabs import ElevenLabs
 
 logger = logging.getLogger(__name__)
 
-def generate_audio(text: str) -> bytes:
+def stream_audio(text: str) -> Iterator[bytes]:
     """
-    Generates audio from text using ElevenLabs API.
+    Yields MP3 audio for the text from ElevenLabs as chunks arrive.
     """
     try:
         api_key = os.getenv("ELEVENLABS_API_KEY")
@@ -26,9 +28,27 @@ def generate_audio(text: str) -> bytes:
         )
         
         # Audio is returned as a generator of bytes
-        audio_bytes = b"".join(audio_generator)
-        return audio_bytes
+        for chunk in audio_generator:
+            if chunk:
+                yield chunk
 
     except Exception as e:
         logger.error(f"TTS error: {str(e)}")
         raise e
+
+def generate_audio(text: str) -> bytes:
+    """
+    Generates audio from text using ElevenLabs API.
+    """
+    return b"".join(stream_audio(text))
+
+async def astream_audio(text: str) -> AsyncIterator[bytes]:
+    """
+    `stream_audio` for async callers: the blocking SDK calls run in a worker thread.
+    """
+    chunks = stream_audio(text)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,671 @@
+"""
+Vector store backends for RAGEngine.
+
+The engine computes embeddings itself and talks to a store through a small interface:
+write (add/upsert) embeddings with their documents + metadata, page through stored
+records, fetch embeddings by id, and run a nearest-neighbour query with an optional
+`{"field": value}` / `{"field": {"$in": [...]}}` metadata filter. Distances are squared L2.
+
+- `ChromaVectorStore`: the persistent Chroma collection (default).
+- `NumpyVectorStore`: a float32 matrix file opened with mmap, so every uvicorn worker
+  on a host shares one copy through the page cache, with an append-only records log.
+  Optional IVF (coarse k-means lists) makes large indexes sublinear to search.
+
+Select with VECTOR_STORE_BACKEND=chroma|numpy.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+COLLECTION_NAME = "travel_knowledge"
+
+# (ids, documents, metadatas) page
+RecordPage = Tuple[List[str], List[str], List[Optional[dict]]]
+# (ids, embeddings, documents, metadatas) page
+EmbeddingPage = Tuple[List[str], np.ndarray, List[str], List[Optional[dict]]]
+# listener(ids, documents, metadatas, reset)
+ReloadListener = Callable[[List[str], List[str], List[Optional[dict]], bool], None]
+
+MANIFEST_FILE = "manifest.json"
+_NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+class VectorStore:
+    """Interface shared by the vector store backends."""
+    name = "base"
+    # Whether `query` with a `where` filter scans every matching row, rather than an
+    # approximate index that can miss hits under very selective filters
+    exact_filters = False
+    _listeners: Tuple[ReloadListener, ...] = ()
+
+    def add_listener(self, listener: ReloadListener) -> None:
+        """
+        Registers `listener(ids, documents, metadatas, reset)`, called with the records this
+        instance picks up from writes made through other instances (e.g. other workers).
+        With `reset` the records replace everything reported before.
+        """
+        self._listeners = (*self._listeners, listener)
+
+    def refresh(self) -> None:
+        """Picks up writes made through other instances, notifying listeners."""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[dict] = None) -> None:
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[dict] = None) -> None:
+        raise NotImplementedError
+
+    def iter_records(self, page_size: int = 1000) -> Iterator[RecordPage]:
+        """Pages through stored (ids, documents, metadatas) without loading everything at once."""
+        raise NotImplementedError
+
+    def iter_embedding_pages(self, page_size: int = 1000) -> Iterator[EmbeddingPage]:
+        """Like `iter_records`, with each page's embeddings (rows aligned with the ids)."""
+        for ids, documents, metadatas in self.iter_records(page_size):
+            found, matrix = self.get_embeddings(ids)
+            row = {doc_id: i for i, doc_id in enumerate(found)}
+            keep = [i for i, doc_id in enumerate(ids) if doc_id in row]
+            yield ([ids[i] for i in keep], matrix[[row[ids[i]] for i in keep]],
+                   [documents[i] for i in keep], [metadatas[i] for i in keep])
+
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        raise NotImplementedError
+
+    def query(self, embedding: np.ndarray, n_results: int, where: dict = None) -> Tuple[List[str], List[float]]:
+        """Nearest neighbours as (ids, squared L2 distances), closest first."""
+        raise NotImplementedError
+
+    def status(self) -> Dict[str, Any]:
+        return {"backend": self.name, "count": self.count()}
+
+
+class ChromaVectorStore(VectorStore):
+    name = "chroma"
+
+    def __init__(self, path: str = None, collection_name: str = COLLECTION_NAME, client=None, embedding_fn=None):
+        import chromadb
+
+        self.path = path or os.getenv("CHROMA_PATH", os.path.join(BACKEND_DIR, "chroma_db"))
+        self.client = client or chromadb.PersistentClient(path=self.path)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=embedding_fn
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def _write(self, method, ids, embeddings, documents, metadatas) -> None:
+        # Chroma rejects writes above its max batch size
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            method(
+                ids=ids[start:end],
+                embeddings=np.asarray(embeddings[start:end], dtype=np.float32),
+                documents=documents[start:end],
+                metadatas=metadatas[start:end] if metadatas else None
+            )
+
+    def add(self, ids, embeddings, documents, metadatas=None) -> None:
+        self._write(self.collection.add, ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas=None) -> None:
+        self._write(self.collection.upsert, ids, embeddings, documents, metadatas)
+
+    def iter_records(self, page_size: int = 1000) -> Iterator[RecordPage]:
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                return
+            yield page["ids"], page["documents"], page["metadatas"]
+            offset += len(page["ids"])
+
+    def iter_embedding_pages(self, page_size: int = 1000) -> Iterator[EmbeddingPage]:
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+            if not page["ids"]:
+                return
+            yield page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["documents"], page["metadatas"]
+            offset += len(page["ids"])
+
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        stored = self.collection.get(ids=list(ids), include=["embeddings"])
+        if not len(stored["ids"]):
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return stored["ids"], np.asarray(stored["embeddings"], dtype=np.float32)
+
+    def query(self, embedding, n_results, where=None):
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32)],
+            n_results=n_results,
+            where=where,
+            include=["distances"]
+        )
+        ids = results["ids"][0] if results["ids"] else []
+        distances = results["distances"][0] if results["distances"] else []
+        return ids, [float(d) for d in distances]
+
+
+class _Snapshot:
+    """One published version of a NumpyVectorStore, swapped in atomically on reload."""
+
+    def __init__(self, version=None, generation=None, matrix=None, norms=None, ids=None, documents=None,
+                 metadatas=None, row=None, records_bytes=0, ivf=None, centroids=None, assignments=None,
+                 field_index=None):
+        self.version = version
+        self.generation = generation
+        self.matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        if norms is None:
+            norms = np.einsum("ij,ij->i", self.matrix, self.matrix) if len(self.matrix) else np.zeros(0, dtype=np.float32)
+        self.norms = norms
+        self.ids: List[str] = ids or []
+        self.documents: List[str] = documents or []
+        self.metadatas: List[Optional[dict]] = metadatas or []
+        self.row: Dict[str, int] = row if row is not None else {doc_id: i for i, doc_id in enumerate(self.ids)}
+        # Bytes of the generation's records log applied so far
+        self.records_bytes = records_bytes
+        # The manifest's IVF entry the centroids / assignments were loaded from
+        self.ivf = ivf
+        self.centroids = centroids
+        self.assignments = assignments
+        self._lists = None
+        self.field_index: Dict[str, Dict[Any, np.ndarray]] = field_index if field_index is not None else {}
+
+    @property
+    def lists(self) -> List[np.ndarray]:
+        """Rows per IVF list, built on first use."""
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+        return self._lists
+
+    def advance(self, manifest: dict, entries: List[list], matrix: np.ndarray, centroids, assignments) -> "_Snapshot":
+        """
+        The next snapshot: this one plus records-log `entries` ([row, id, document, metadata]).
+        Only the touched rows' norms and field-index entries are recomputed; the per-record
+        lists are copied (pointers only) so readers of this snapshot never see them change.
+        """
+        ids, documents, metadatas, row = list(self.ids), list(self.documents), list(self.metadatas), dict(self.row)
+        for i, doc_id, document, metadata in entries:
+            if i == len(ids):
+                ids.append(doc_id)
+                documents.append(document)
+                metadatas.append(metadata)
+                row[doc_id] = i
+            elif i < len(ids):
+                documents[i] = document
+                metadatas[i] = metadata
+            else:
+                raise ValueError(f"Records log skips from row {len(ids)} to {i}")
+        if len(ids) != len(matrix):
+            raise ValueError(f"Records log has {len(ids)} rows, matrix has {len(matrix)}")
+
+        changed = np.unique(np.asarray([entry[0] for entry in entries], dtype=np.int64))
+        norms = np.empty(len(matrix), dtype=np.float32)
+        norms[:len(self.norms)] = self.norms
+        if len(changed):
+            block = np.asarray(matrix[changed], dtype=np.float32)
+            norms[changed] = np.einsum("ij,ij->i", block, block)
+
+        field_index = {}
+        for field, by_value in list(self.field_index.items()):
+            removed: Dict[Any, List[int]] = {}
+            added: Dict[Any, List[int]] = {}
+            for i in changed:
+                if i < len(self.metadatas):
+                    removed.setdefault((self.metadatas[i] or {}).get(field), []).append(i)
+                added.setdefault((metadatas[i] or {}).get(field), []).append(i)
+            by_value = dict(by_value)
+            for value, value_rows in removed.items():
+                by_value[value] = np.setdiff1d(by_value.get(value, _NO_ROWS), value_rows)
+            for value, value_rows in added.items():
+                by_value[value] = np.union1d(by_value.get(value, _NO_ROWS), value_rows)
+            field_index[field] = by_value
+
+        return _Snapshot(
+            manifest["version"], manifest["generation"], matrix, norms, ids, documents, metadatas, row,
+            manifest["records_bytes"], manifest.get("ivf"), centroids, assignments, field_index
+        )
+
+    def rows_for(self, where: dict) -> np.ndarray:
+        """Rows matching a metadata filter, via per-field value -> rows indexes built on demand."""
+        rows = None
+        for field, condition in where.items():
+            if field not in self.field_index:
+                index: Dict[Any, List[int]] = {}
+                for i, metadata in enumerate(self.metadatas):
+                    index.setdefault((metadata or {}).get(field), []).append(i)
+                self.field_index[field] = {value: np.asarray(value_rows, dtype=np.int64) for value, value_rows in index.items()}
+            if isinstance(condition, dict):
+                values = condition.get("$in", [condition.get("$eq")])
+            else:
+                values = [condition]
+            matched = [self.field_index[field].get(value, _NO_ROWS) for value in values]
+            matched = np.unique(np.concatenate(matched)) if matched else _NO_ROWS
+            rows = matched if rows is None else np.intersect1d(rows, matched)
+        return rows if rows is not None else _NO_ROWS
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Compact in-process index. Each generation of the store is a raw float32 embedding
+    file (`embeddings-<gen>.f32`, one row per record) opened with mmap, plus an
+    append-only `records-<gen>.jsonl` log of [row, id, document, metadata] lines; a small
+    `manifest.json` names the generation, its row count, how much of the log is valid,
+    the IVF files and a version counter.
+
+    Writers take a file lock, append new rows (an upserted id's row is overwritten in
+    place), append its log lines, assign the rows to IVF lists, then swap the manifest in
+    atomically with the version bumped. Readers in any process see the new version and
+    apply just the log lines past the ones they have, so writes and reloads cost
+    O(batch), not O(index). `bulk_load` starts a new generation.
+
+    Only the embedding file (and the IVF assignments) is shared between processes, through
+    the page cache. Each process parses ids, documents and metadatas from the log into its
+    own lists; they are small next to the vectors, and the RAG engine keeps the documents
+    in memory for BM25 anyway. Filtered queries scan the matching rows exactly, using
+    per-snapshot value -> row-index arrays into the shared matrix.
+    """
+    name = "numpy"
+    exact_filters = True
+
+    def __init__(self, path: str = None, ivf_lists: int = None, nprobe: int = None, ivf_retrain_growth: float = None):
+        self.path = path or os.getenv("VECTOR_STORE_PATH", os.path.join(BACKEND_DIR, "vector_store"))
+        os.makedirs(self.path, exist_ok=True)
+        # IVF is used once the index has at least `ivf_lists * 39` rows (enough to train on)
+        self.ivf_lists = ivf_lists if ivf_lists is not None else int(os.getenv("VECTOR_STORE_IVF_LISTS", 0))
+        self.nprobe = nprobe or int(os.getenv("VECTOR_STORE_IVF_NPROBE", 8))
+        # New rows join their nearest existing list; centroids are retrained only once the
+        # index has grown by this factor since they were trained
+        self.ivf_retrain_growth = ivf_retrain_growth or float(os.getenv("VECTOR_STORE_IVF_RETRAIN_GROWTH", 2.0))
+        self._lock = threading.RLock()
+        self._snapshot = _Snapshot()
+        # (inode, mtime_ns, size) of the last manifest read; unchanged means nothing to reload
+        self._manifest_signature = None
+        self._migrate_legacy()
+        self._reload()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _write_lock(self):
+        """Cross-process writer lock: flock on POSIX, msvcrt byte-range lock on Windows."""
+        with open(self._file(".lock"), "a+") as lock_file:
+            if os.name == "nt":
+                import msvcrt
+                lock_file.seek(0)
+                # LK_LOCK only retries for ~10s, so keep retrying while another writer holds it
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+                try:
+                    yield
+                finally:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self._file(MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest: dict) -> None:
+        tmp = self._file(f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(dict(manifest, updated_at=time.time()), f)
+        os.replace(tmp, self._file(MANIFEST_FILE))
+
+    def _current(self) -> _Snapshot:
+        self._reload()
+        return self._snapshot
+
+    def refresh(self) -> None:
+        self._reload()
+
+    def _stat_manifest(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._file(MANIFEST_FILE))
+        except FileNotFoundError:
+            return None
+        # os.replace gives every write a new inode, so same-tick writes still differ
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _reload(self, manifest: dict = None, notify: bool = True) -> None:
+        signature = None
+        if manifest is None:
+            # Runs on every store call (and on the event loop for async RAG queries), so an
+            # unchanged manifest costs one stat instead of a read and parse
+            signature = self._stat_manifest()
+            if signature is None or signature == self._manifest_signature:
+                return
+            manifest = self._read_manifest()
+        if manifest is None or manifest["version"] == self._snapshot.version:
+            self._manifest_signature = signature or self._manifest_signature
+            return
+        with self._lock:
+            for _ in range(3):
+                if manifest is None or manifest["version"] == self._snapshot.version:
+                    self._manifest_signature = signature or self._manifest_signature
+                    return
+                try:
+                    snapshot, entries, reset = self._load(manifest, self._snapshot)
+                except FileNotFoundError:
+                    # bulk_load replaced the generation between our reads; pick up the newer manifest
+                    manifest = self._read_manifest()
+                    continue
+                self._snapshot = snapshot
+                self._manifest_signature = signature or self._manifest_signature
+                if notify and self._listeners:
+                    # Still under the lock, so listeners see reloads in order
+                    latest = {doc_id: (document, metadata) for _, doc_id, document, metadata in entries}
+                    for listener in self._listeners:
+                        listener(list(latest), [d for d, _ in latest.values()], [m for _, m in latest.values()], reset)
+                return
+
+    def _load(self, manifest: dict, base: _Snapshot) -> Tuple[_Snapshot, List[list], bool]:
+        """
+        `base` advanced to `manifest`: just the new log lines, or everything for a new
+        generation. Returns (snapshot, applied log entries, whether it was a new generation).
+        """
+        generation = manifest["generation"]
+        reset = generation != base.generation and base.generation is not None
+        if generation != base.generation:
+            base = _Snapshot()
+        entries = self._read_log(generation, base.records_bytes, manifest["records_bytes"])
+        matrix = self._map(manifest)
+        ivf = manifest.get("ivf")
+        centroids = assignments = None
+        if ivf:
+            centroids = base.centroids if ivf == base.ivf else np.load(self._file(ivf["centroids_file"]))
+            assignments = np.memmap(self._file(ivf["assignments_file"]), dtype=np.int32, mode="r", shape=(manifest["rows"],))
+        return base.advance(manifest, entries, matrix, centroids, assignments), entries, reset
+
+    def _read_log(self, generation, start: int, end: int) -> List[list]:
+        if end <= start:
+            return []
+        with open(self._file(f"records-{generation}.jsonl"), "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def _map(self, manifest: dict) -> np.ndarray:
+        if not manifest["rows"]:
+            return np.zeros((0, manifest["dim"] or 0), dtype=np.float32)
+        return np.memmap(self._file(f"embeddings-{manifest['generation']}.f32"), dtype=np.float32, mode="r",
+                         shape=(manifest["rows"], manifest["dim"]))
+
+    def count(self) -> int:
+        return len(self._current().ids)
+
+    def upsert(self, ids, embeddings, documents, metadatas=None) -> None:
+        if not len(ids):
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        metadatas = metadatas or [None] * len(ids)
+        with self._write_lock(), self._lock:
+            # Catch up with whatever another process published since we last read
+            manifest = self._read_manifest() or {
+                "format": 2, "version": 0, "generation": time.time_ns(), "dim": None, "rows": 0, "records_bytes": 0, "ivf": None
+            }
+            self._reload(manifest)
+            current = self._snapshot
+            if not manifest["rows"]:
+                manifest["dim"] = embeddings.shape[1]
+            if embeddings.shape[1] != manifest["dim"]:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match the store's {manifest['dim']}")
+
+            rows = manifest["rows"]
+            new_rows: Dict[str, int] = {}
+            positions, entries = [], []
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                i = current.row.get(doc_id)
+                if i is None:
+                    i = new_rows.setdefault(doc_id, rows + len(new_rows))
+                positions.append(i)
+                entries.append([i, doc_id, document, metadata])
+            total = rows + len(new_rows)
+
+            # Rows for existing ids are overwritten in place (readers may see the new vector a
+            # moment before its norm); new rows go on the end
+            generation = manifest["generation"]
+            row_bytes = manifest["dim"] * 4
+            with open(self._file(f"embeddings-{generation}.f32"), "r+b" if rows else "wb") as f:
+                for i, vector in zip(positions, embeddings):
+                    if f.tell() != i * row_bytes:
+                        f.seek(i * row_bytes)
+                    f.write(vector.tobytes())
+                f.truncate(total * row_bytes)
+
+            log = b"".join((json.dumps(entry) + "\n").encode("utf-8") for entry in entries)
+            with open(self._file(f"records-{generation}.jsonl"), "r+b" if manifest["records_bytes"] else "wb") as f:
+                f.seek(manifest["records_bytes"])
+                f.write(log)
+                f.truncate()
+
+            ivf = self._update_ivf(manifest, total, positions, embeddings)
+            manifest = dict(manifest, version=manifest["version"] + 1, rows=total,
+                            records_bytes=manifest["records_bytes"] + len(log), ivf=ivf)
+            self._write_manifest(manifest)
+            # Our own write: the caller already knows about these records
+            self._reload(manifest, notify=False)
+            if ivf != current.ivf:
+                self._remove_stale(manifest)
+
+    def _update_ivf(self, manifest: dict, rows: int, positions: List[int], embeddings: np.ndarray) -> Optional[dict]:
+        """Assigns written rows to their nearest IVF list; retrains only once the index has drifted."""
+        ivf = manifest.get("ivf")
+        if self.ivf_lists > 0 and rows >= self.ivf_lists * 39 and (ivf is None or rows >= ivf["trained_rows"] * self.ivf_retrain_growth):
+            matrix = np.memmap(self._file(f"embeddings-{manifest['generation']}.f32"), dtype=np.float32, mode="r",
+                               shape=(rows, manifest["dim"]))
+            return self._train_ivf(matrix)
+        if ivf is None:
+            return None
+        labels = _nearest_centroid(embeddings, np.load(self._file(ivf["centroids_file"]))).astype(np.int32)
+        with open(self._file(ivf["assignments_file"]), "r+b") as f:
+            for i, label in zip(positions, labels):
+                f.seek(i * 4)
+                f.write(label.tobytes())
+        return ivf
+
+    def _train_ivf(self, matrix: np.ndarray) -> dict:
+        centroids, assignments = train_ivf(matrix, self.ivf_lists)
+        token = time.time_ns()
+        ivf = {"centroids_file": f"ivf-{token}.npy", "assignments_file": f"ivf-{token}.i32", "trained_rows": len(matrix)}
+        np.save(self._file(ivf["centroids_file"]), centroids)
+        assignments.astype(np.int32).tofile(self._file(ivf["assignments_file"]))
+        return ivf
+
+    def _remove_stale(self, manifest: dict) -> None:
+        """Deletes files of other generations / IVF trainings; processes still mapping them keep the inode alive."""
+        keep = {f"embeddings-{manifest['generation']}.f32", f"records-{manifest['generation']}.jsonl"}
+        if manifest.get("ivf"):
+            keep.update((manifest["ivf"]["centroids_file"], manifest["ivf"]["assignments_file"]))
+        for name in os.listdir(self.path):
+            if name.startswith(("embeddings-", "records-", "ivf-")) and name not in keep:
+                try:
+                    os.remove(self._file(name))
+                except OSError:
+                    # Windows refuses to delete a file another process has mapped; the next write retries
+                    pass
+
+    def bulk_load(self, pages: Iterator[EmbeddingPage], count: int, dim: int) -> int:
+        """
+        Replaces the store's contents with `count` records streamed from `pages`. Rows go
+        straight into a memory-mapped file of a new generation, so the matrix is never held
+        in memory. Ids must be unique across pages. Returns the number of rows written.
+        """
+        with self._write_lock(), self._lock:
+            self._replace(pages, count, dim)
+        return count
+
+    def _replace(self, pages: Iterator[EmbeddingPage], count: int, dim: int) -> None:
+        previous = self._read_manifest()
+        generation = time.time_ns()
+        embeddings_file = self._file(f"embeddings-{generation}.f32")
+        records_file = self._file(f"records-{generation}.jsonl")
+        matrix = None
+        written = 0
+        try:
+            if count:
+                matrix = np.memmap(embeddings_file, dtype=np.float32, mode="w+", shape=(count, dim))
+            with open(records_file, "wb") as log:
+                for page_ids, embeddings, page_documents, page_metadatas in pages:
+                    if written + len(page_ids) > count:
+                        raise ValueError(f"bulk_load received more than the declared {count} records")
+                    matrix[written:written + len(page_ids)] = embeddings
+                    for i, record in enumerate(zip(page_ids, page_documents, page_metadatas or [None] * len(page_ids))):
+                        log.write((json.dumps([written + i, *record]) + "\n").encode("utf-8"))
+                    written += len(page_ids)
+                if written != count:
+                    raise ValueError(f"bulk_load expected {count} records, got {written}")
+                records_bytes = log.tell()
+            if matrix is not None:
+                matrix.flush()
+        except Exception:
+            del matrix
+            for name in (embeddings_file, records_file):
+                if os.path.exists(name):
+                    os.remove(name)
+            raise
+        ivf = self._train_ivf(matrix) if self.ivf_lists > 0 and count >= self.ivf_lists * 39 else None
+        del matrix
+        manifest = {
+            "format": 2, "version": (previous["version"] if previous else 0) + 1, "generation": generation,
+            "dim": dim, "rows": count, "records_bytes": records_bytes, "ivf": ivf
+        }
+        self._write_manifest(manifest)
+        self._remove_stale(manifest)
+        self._reload(manifest)
+
+    def _migrate_legacy(self) -> None:
+        """Converts a store written in the old layout (full `records.json` + .npy matrix) to the current one."""
+        legacy = self._file("records.json")
+        if not os.path.exists(legacy) or os.path.exists(self._file(MANIFEST_FILE)):
+            return
+        with self._write_lock(), self._lock:
+            if not os.path.exists(legacy) or os.path.exists(self._file(MANIFEST_FILE)):
+                return
+            with open(legacy) as f:
+                records = json.load(f)
+            matrix = np.load(self._file(records["embeddings_file"]), mmap_mode="r")
+            ids = records["ids"]
+            page = (ids, matrix, records["documents"], records["metadatas"])
+            self._replace(iter([page] if ids else []), len(ids), matrix.shape[1] if matrix.ndim == 2 else 0)
+            del matrix
+            os.remove(legacy)
+            self._remove_stale(self._read_manifest())
+            logger.info(f"Migrated {len(ids)} records in {self.path} to the append-only layout")
+
+    def iter_records(self, page_size: int = 1000) -> Iterator[RecordPage]:
+        current = self._current()
+        for start in range(0, len(current.ids), page_size):
+            end = start + page_size
+            yield current.ids[start:end], current.documents[start:end], current.metadatas[start:end]
+
+    def iter_embedding_pages(self, page_size: int = 1000) -> Iterator[EmbeddingPage]:
+        current = self._current()
+        for start in range(0, len(current.ids), page_size):
+            end = start + page_size
+            yield (current.ids[start:end], np.asarray(current.matrix[start:end], dtype=np.float32),
+                   current.documents[start:end], current.metadatas[start:end])
+
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        current = self._current()
+        found = [doc_id for doc_id in ids if doc_id in current.row]
+        if not found:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return found, np.asarray(current.matrix[[current.row[doc_id] for doc_id in found]])
+
+    def query(self, embedding, n_results, where=None):
+        current = self._current()
+        if not current.ids:
+            return [], []
+        query = np.asarray(embedding, dtype=np.float32)
+
+        if where:
+            rows = current.rows_for(where)
+        elif current.centroids is not None:
+            # Probe the `nprobe` nearest IVF lists instead of scanning every row
+            centroid_distances = ((current.centroids - query) ** 2).sum(axis=1)
+            probe = np.argsort(centroid_distances)[:self.nprobe]
+            rows = np.concatenate([current.lists[c] for c in probe])
+        else:
+            rows = None
+
+        matrix = current.matrix if rows is None else current.matrix[rows]
+        norms = current.norms if rows is None else current.norms[rows]
+        if not len(matrix):
+            return [], []
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, with row norms kept up to date on reload
+        distances = norms - 2 * (matrix @ query) + float(query @ query)
+        k = min(n_results, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        ids = [current.ids[int(rows[i]) if rows is not None else int(i)] for i in top]
+        return ids, [max(float(distances[i]), 0.0) for i in top]
+
+    def status(self) -> Dict[str, Any]:
+        current = self._current()
+        return dict(super().status(), path=self.path, version=current.version, ivf=current.centroids is not None)
+
+
+def train_ivf(matrix: np.ndarray, n_lists: int, iterations: int = 10, sample_size: int = 20000, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Plain k-means on a sample of rows; returns (centroids, list assignment per row)."""
+    rng = np.random.default_rng(seed)
+    sample = matrix[rng.choice(len(matrix), size=min(sample_size, len(matrix)), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest_centroid(sample, centroids)
+        for c in range(n_lists):
+            members = sample[labels == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids.astype(np.float32), _nearest_centroid(matrix, centroids).astype(np.int32)
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    labels = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), chunk):
+        block = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+        labels[start:start + chunk] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return labels
+
+
+def create_vector_store(backend: str = None, embedding_fn=None) -> VectorStore:
+    backend = (backend or os.getenv("VECTOR_STORE_BACKEND", "chroma")).lower()
+    if backend == "numpy":
+        return NumpyVectorStore()
+    if backend == "chroma":
+        return ChromaVectorStore(embedding_fn=embedding_fn)
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}'")
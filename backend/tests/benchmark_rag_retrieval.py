@@ -0,0 +1,189 @@
+"""
+Offline retrieval benchmark for RAGEngine (no HTTP server, no API keys).
+
+Builds synthetic corpora of city travel tips at several sizes, then reports
+recall@k, MRR@k, out-of-scope rejection rate and p50/p99 query latency, both
+city-scoped and unscoped.
+
+    python tests/benchmark_rag_retrieval.py --sizes 1000 10000 100000
+    python tests/benchmark_rag_retrieval.py --embedding minilm   # real ONNX model
+    python tests/benchmark_rag_retrieval.py --backend numpy --ivf-lists 256
+
+Hashed bag-of-words embeddings are the default so the benchmark runs anywhere;
+absolute quality numbers are only meaningful with --embedding minilm. Hashed
+distances are not calibrated like MiniLM's, so the relevance threshold is off in
+hash mode unless --max-distance is given.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chromadb.utils import embedding_functions
+from app.services.lru_cache import LRUCache
+from app.services.rag_engine import RAGEngine
+from app.services.vector_store import ChromaVectorStore, NumpyVectorStore
+
+TOPICS = {
+    "tipping": ("In {city}, tipping at restaurants is customary at around ten percent of the bill.",
+                "is tipping expected at restaurants in {city}"),
+    "transport": ("Getting around {city} is easiest by metro; buy a rechargeable transit card at any station.",
+                  "best way to get around {city} by public transport"),
+    "best_time": ("The best time to visit {city} is spring, when the weather is mild and festivals fill the streets.",
+                  "when is the best time of year to visit {city}"),
+    "food": ("{city} street food markets serve cheap local dishes late into the night.",
+             "where can I find cheap street food in {city}"),
+    "dress": ("Dress modestly at religious sites in {city}; cover shoulders and knees.",
+              "what should I wear to religious sites in {city}"),
+    "safety": ("{city} is generally safe, but watch for pickpockets in crowded tourist areas.",
+               "is {city} safe for tourists, any pickpockets"),
+    "museums": ("Most museums in {city} close on Mondays and offer free entry on the first Sunday.",
+                "which day are museums closed in {city}"),
+    "nightlife": ("Nightlife in {city} centres on the old town bars, which stay open until 2am.",
+                  "where is the best nightlife in {city}"),
+    "payments": ("Cards are widely accepted in {city}, but carry some cash for small vendors.",
+                 "do I need cash or can I pay by card in {city}"),
+    "airport": ("The airport train reaches central {city} in about thirty minutes.",
+                "how do I get from the airport to central {city}"),
+}
+
+OUT_OF_SCOPE = [
+    "How do I fix a flat tire?",
+    "What is the capital of Mars?",
+    "Python programming tutorial",
+    "Explain quantum entanglement",
+    "Recipe for sourdough starter",
+]
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "to", "sa", "dor", "el", "qu", "ni", "bar",
+             "zu", "fen", "ta", "mor", "is", "gal", "pe", "rin"]
+
+
+class HashedEmbeddingFunction(embedding_functions.EmbeddingFunction):
+    """Feature-hashed bag of words, L2-normalized. Deterministic and dependency-free."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in re.findall(r"[a-z0-9]+", text.lower()):
+                digest = int(hashlib.md5(token.encode()).hexdigest(), 16)
+                vector[digest % self.dim] += 1.0 if (digest >> 64) & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "hashed-bow"
+
+    def get_config(self) -> dict:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "HashedEmbeddingFunction":
+        return HashedEmbeddingFunction(config.get("dim", 256))
+
+
+def city_names(count: int, rng: random.Random) -> list[str]:
+    names = set()
+    while len(names) < count:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(4)).capitalize())
+    return sorted(names)
+
+
+def build_engine(size: int, embedding: str, rng: random.Random, max_distance: float = None,
+                 backend: str = "chroma", ivf_lists: int = 0) -> tuple:
+    cities = city_names(max(1, size // len(TOPICS)), rng)
+    documents, ids, metadatas = [], [], []
+    for city in cities:
+        for topic, (template, _) in TOPICS.items():
+            documents.append(template.format(city=city))
+            ids.append(f"{city}:{topic}")
+            metadatas.append({"city": city.lower()})
+
+    embedding_fn = HashedEmbeddingFunction() if embedding == "hash" else embedding_functions.DefaultEmbeddingFunction()
+    path = tempfile.mkdtemp(prefix="rag-bench-")
+    if backend == "numpy":
+        store = NumpyVectorStore(path=path, ivf_lists=ivf_lists)
+    else:
+        store = ChromaVectorStore(path=path, embedding_fn=embedding_fn)
+    engine = RAGEngine(store=store, embedding_fn=embedding_fn, seed=False)
+    if max_distance is not None:
+        engine.max_distance = max_distance
+    elif embedding == "hash":
+        engine.max_distance = 0
+    # Measure retrieval, not cache hits
+    engine.embedding_cache = LRUCache(0)
+    engine.result_cache = LRUCache(0)
+
+    started = time.perf_counter()
+    engine.add_documents(documents[:size], ids[:size], metadatas[:size])
+    index_seconds = time.perf_counter() - started
+    return engine, ids[:size], index_seconds
+
+
+def run_queries(engine: RAGEngine, doc_ids: list[str], n_queries: int, k: int, scoped: bool, rng: random.Random) -> dict:
+    latencies, reciprocal_ranks, hits = [], [], 0
+    for doc_id in rng.sample(doc_ids, min(n_queries, len(doc_ids))):
+        city, topic = doc_id.split(":")
+        expected = TOPICS[topic][0].format(city=city)
+        started = time.perf_counter()
+        results = engine.query(TOPICS[topic][1].format(city=city), n_results=k, city=city if scoped else None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        rank = results.index(expected) + 1 if expected in results else None
+        hits += 1 if rank else 0
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    rejected = sum(1 for q in OUT_OF_SCOPE if not engine.query(q, n_results=k))
+    return {
+        f"recall@{k}": hits / len(latencies),
+        f"mrr@{k}": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "oos_rejected": rejected / len(OUT_OF_SCOPE),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedding", choices=["hash", "minilm"], default="hash")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="IVF lists for the numpy backend (0 = exact scan)")
+    parser.add_argument("--max-distance", type=float, default=None,
+                        help="relevance threshold (default: RAG_MAX_DISTANCE for minilm, off for hash)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'docs':>7} {'mode':>8} {'recall@' + str(args.k):>9} {'mrr@' + str(args.k):>7} "
+          f"{'oos_rej':>8} {'p50_ms':>8} {'p99_ms':>8}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        engine, doc_ids, index_seconds = build_engine(
+            size, args.embedding, rng, args.max_distance, args.backend, args.ivf_lists
+        )
+        for scoped in (False, True):
+            m = run_queries(engine, doc_ids, args.queries, args.k, scoped, rng)
+            print(f"{size:>7} {'city' if scoped else 'global':>8} {m[f'recall@{args.k}']:>9.3f} "
+                  f"{m[f'mrr@{args.k}']:>7.3f} {m['oos_rejected']:>8.2f} {m['p50_ms']:>8.2f} {m['p99_ms']:>8.2f}")
+        print(f"{size:>7} indexed in {index_seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
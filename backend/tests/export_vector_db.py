@@ -1,7 +1,6 @@
 import sys
 import os
 import csv
-import datetime
 
 # Add the backend directory to sys.path
 start_path = os.path.dirname(os.path.abspath(__file__)) 
@@ -9,37 +8,34 @@ backend_path = os.path.dirname(start_path)
 sys.path.append(backend_path)
 
 try:
-    from app.services.rag_engine import rag_engine
-    
-    print(f"Connected to RAG Engine.")
-    collection = rag_engine.collection
-    count = collection.count()
-    print(f"Found {count} documents.")
-    
-    # Get all data
-    data = collection.get()
-    
+    # Read the store directly: no embedding model needed, and records are streamed page by page
+    from app.services.vector_store import create_vector_store
+
+    store = create_vector_store()
+    print(f"Connected to {store.name} vector store.")
+    print(f"Found {store.count()} documents.")
+
     filename = "vector_db_export.csv"
     output_path = os.path.join(start_path, filename)
-    
+
+    exported = 0
     with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
         fieldnames = ['id', 'city', 'content']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         
         writer.writeheader()
         
-        if data['ids']:
-            for i, doc_id in enumerate(data['ids']):
-                meta = data['metadatas'][i]
-                content = data['documents'][i]
-                
+        for ids, documents, metadatas in store.iter_records(page_size=1000):
+            for doc_id, content, meta in zip(ids, documents, metadatas):
                 writer.writerow({
                     'id': doc_id,
-                    'city': meta.get('city', 'N/A'),
+                    'city': (meta or {}).get('city', 'N/A'),
                     'content': content
                 })
+            exported += len(ids)
         
-    print(f"Successfully exported {count} documents to: {output_path}")
+    print(f"Successfully exported {exported} documents to: {output_path}")
+    print("For a full backup including embeddings use: python -m app.services.kb_snapshot snapshot <dir>")
 
 except Exception as e:
     print(f"Error exporting database: {e}")
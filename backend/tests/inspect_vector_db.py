@@ -6,28 +6,31 @@ start_path = os.path.dirname(os.path.abspath(__file__)) # .../backend/tests
 backend_path = os.path.dirname(start_path)            # .../backend
 sys.path.append(backend_path)
 
+# Optional: only print the first N documents
+limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
 try:
-    from app.services.rag_engine import rag_engine
-    
-    print(f"Connected to RAG Engine.")
-    collection = rag_engine.collection
-    print(f"Collection: {collection.name}")
-    print(f"Count: {collection.count()} documents")
-    
-    # Get all data
-    data = collection.get()
-    
+    from app.services.vector_store import create_vector_store
+
+    store = create_vector_store()
+    print(f"Connected to {store.name} vector store.")
+    print(f"Count: {store.count()} documents")
+
     print("\n--- Documents ---")
-    if data['ids']:
-        for i, doc in enumerate(data['documents']):
-            meta = data['metadatas'][i]
-            doc_id = data['ids'][i]
-            print(f"[{i+1}] ID: {doc_id}")
-            print(f"    City: {meta.get('city', 'N/A')}")
+    shown = 0
+    for ids, documents, metadatas in store.iter_records(page_size=500):
+        for doc_id, doc, meta in zip(ids, documents, metadatas):
+            if limit is not None and shown >= limit:
+                break
+            shown += 1
+            print(f"[{shown}] ID: {doc_id}")
+            print(f"    City: {(meta or {}).get('city', 'N/A')}")
             print(f"    Content: {doc}")
             print("-" * 40)
-    else:
+        if limit is not None and shown >= limit:
+            break
+    if not shown:
         print("No documents found in the collection.")
 
 except Exception as e:
-    print(f"Error accessing RAG engine: {e}")
+    print(f"Error accessing vector store: {e}")
@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import json
+import asyncio
+import zipfile
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.batch_export import BatchExporter, batch_exporter
+from app.services.markdown_generator import generate_markdown
+
+
+def _itinerary(n: int) -> dict:
+    return {"trip_title": f"Trip {n}", "days": [{"day_number": 1, "blocks": [{"poi": {"name": f"Place {n}"}}]}]}
+
+
+def _jsonl(count: int) -> bytes:
+    lines = [json.dumps(_itinerary(n)) for n in range(count)]
+    lines.insert(2, "not json")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def _chunks(data: bytes, size: int = 7):
+    # Small chunks so lines straddle chunk boundaries
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_stream_zip_renders_every_line_and_records_failures():
+    exporter = BatchExporter(workers=0)
+
+    async def collect():
+        return [part async for part in exporter.stream_zip(_chunks(_jsonl(5)), ["md", "pdf"])]
+
+    parts = asyncio.run(collect())
+    # Streamed incrementally, not as one blob at the end
+    assert len(parts) > 2
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(parts)))
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["count"] == 6 and manifest["failed"] == 1
+    assert manifest["entries"][2]["line"] == 3 and "error" in manifest["entries"][2]
+    assert archive.read("00001-trip-0.md").decode() == generate_markdown(_itinerary(0))
+    assert archive.read("00006-trip-4.pdf").startswith(b"%PDF")
+
+
+def test_batch_export_endpoint_streams_zip():
+    client = TestClient(app)
+    try:
+        response = client.post("/api/batch-export?formats=md", content=_jsonl(3))
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+        assert sorted(names) == ["00001-trip-0.md", "00002-trip-1.md", "00004-trip-2.md", "manifest.json"]
+
+        assert client.post("/api/batch-export?formats=docx", content=b"{}").status_code == 400
+    finally:
+        batch_exporter.close()
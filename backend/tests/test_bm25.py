@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.bm25 import BM25Index, reciprocal_rank_fusion
+
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.add_many([
+        ("paris_tip", "In Paris, standard tipping is not required as service is included."),
+        ("tokyo_tip", "In Tokyo, do not tip. It can be considered rude."),
+        ("tokyo_sakura", "The best time to visit Tokyo is during cherry blossom season."),
+    ])
+    return index
+
+
+def test_bm25_ranks_term_matches_and_respects_allowed_ids():
+    index = _index()
+    assert index.search("tipping in Paris")[0][0] == "paris_tip"
+    assert [doc_id for doc_id, _ in index.search("tip Tokyo")][:1] == ["tokyo_tip"]
+    scoped = index.search("tipping", allowed_ids={"tokyo_tip", "tokyo_sakura"})
+    assert scoped == []
+
+
+def test_bm25_replaces_and_removes_documents():
+    index = _index()
+    index.add("paris_tip", "Paris has excellent bakeries.")
+    assert index.search("tipping") == []
+    index.remove("tokyo_sakura")
+    assert len(index) == 2
+    assert index.search("cherry blossom") == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=60)
+    assert [doc_id for doc_id, _ in fused][:2] == ["b", "c"]
+    assert round(fused[0][1], 5) == round(1 / 62 + 1 / 61, 5)
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.content_cache import ContentCache, FetchResult
+
+
+def _cache(**kwargs) -> ContentCache:
+    path = os.path.join(tempfile.mkdtemp(), "content_cache.db")
+    return ContentCache(path=path, **kwargs)
+
+
+def test_fresh_entry_skips_origin():
+    cache = _cache(fresh_ttl=60, stale_ttl=120)
+    calls = []
+
+    async def fetcher(entry):
+        calls.append(entry)
+        return FetchResult(value="Paris summary", etag='"v1"')
+
+    async def run():
+        first = await cache.get_or_fetch("wikipedia:summary:paris", fetcher)
+        second = await cache.get_or_fetch("wikipedia:summary:paris", fetcher)
+        return first, second
+
+    assert asyncio.run(run()) == ("Paris summary", "Paris summary")
+    assert len(calls) == 1
+
+
+def test_stale_entry_is_served_and_revalidated_with_etag():
+    cache = _cache(fresh_ttl=0, stale_ttl=3600)
+    cache.set("wikipedia:summary:tokyo", "old", etag='"v1"')
+    seen_headers = []
+
+    async def fetcher(entry):
+        seen_headers.append(entry.conditional_headers())
+        return FetchResult(not_modified=True)
+
+    async def run():
+        value = await cache.get_or_fetch("wikipedia:summary:tokyo", fetcher)
+        await asyncio.sleep(0)  # let the background revalidation run
+        await asyncio.sleep(0)
+        return value
+
+    assert asyncio.run(run()) == "old"
+    assert seen_headers == [{"If-None-Match": '"v1"'}]
+
+
+def test_expired_entry_falls_back_when_origin_fails():
+    cache = _cache(fresh_ttl=0, stale_ttl=0)
+    cache.set("wikivoyage:title:jaipur", "Jaipur")
+
+    async def fetcher(entry):
+        return None
+
+    assert asyncio.run(cache.get_or_fetch("wikivoyage:title:jaipur", fetcher)) == "Jaipur"
+
+
+if __name__ == "__main__":
+    test_fresh_entry_skips_origin()
+    test_stale_entry_is_served_and_revalidated_with_etag()
+    test_expired_entry_falls_back_when_origin_fails()
+    print("Content cache tests passed")
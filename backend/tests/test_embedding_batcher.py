@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+def _fake_embed(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+    return embed
+
+
+def test_concurrent_queries_share_one_batch():
+    calls = []
+    batcher = EmbeddingBatcher(_fake_embed(calls), max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        texts = ["tipping in Tokyo", "best time for Paris", "tipping in Tokyo", "Delhi metro"]
+        return await asyncio.gather(*(batcher.embed(text) for text in texts))
+
+    vectors = asyncio.run(run())
+    assert vectors == [[16.0], [19.0], [16.0], [11.0]]
+    assert len(calls) == 1
+    # Duplicates within a window are embedded once
+    assert calls[0] == ["tipping in Tokyo", "best time for Paris", "Delhi metro"]
+    assert batcher.stats == {"batches": 1, "items": 4, "max_batch": 3}
+
+
+def test_full_batch_flushes_without_waiting():
+    calls = []
+    batcher = EmbeddingBatcher(_fake_embed(calls), max_batch_size=2, max_wait_ms=10_000)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(f"query {i}") for i in range(4))),
+            timeout=2
+        )
+
+    assert len(asyncio.run(run())) == 4
+    assert [len(batch) for batch in calls] == [2, 2]
+
+
+def test_embedding_errors_reach_every_caller():
+    def broken(texts):
+        raise RuntimeError("onnx failed")
+
+    batcher = EmbeddingBatcher(broken, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batcher_survives_its_loop_closing():
+    calls = []
+    batcher = EmbeddingBatcher(_fake_embed(calls), max_batch_size=32, max_wait_ms=10_000)
+
+    async def abandon():
+        # Leaves a queued text and a timer on a loop that then closes
+        asyncio.ensure_future(batcher.embed("orphan"))
+        await asyncio.sleep(0)
+
+    asyncio.run(abandon())
+    batcher.max_wait = 0.01
+    assert asyncio.run(asyncio.wait_for(batcher.embed("fresh"), timeout=2)) == [5.0]
+    assert calls == [["fresh"]]
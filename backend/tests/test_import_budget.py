@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a slow CI box; a cold Chroma + ONNX load blows well past it
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", 3.0))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+import app.services.explanation
+import app.services.rag_engine
+elapsed = time.perf_counter() - started
+heavy = [name for name in ("chromadb", "onnxruntime") if name in sys.modules]
+print(json.dumps({"seconds": elapsed, "heavy": heavy, "status": app.services.rag_engine.rag_engine_status()["status"]}))
+"""
+
+
+def test_app_import_does_not_load_rag_stack():
+    # Fresh interpreter so modules imported by other tests don't count
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["heavy"] == []
+    assert report["status"] == "cold"
+    assert report["seconds"] < IMPORT_BUDGET_SECONDS, report
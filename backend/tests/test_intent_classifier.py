@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent_classifier import IntentClassifier
+from app.services.planner import extract_constraints, find_duration, find_start_date
+
+ROME = {"destination_city": "Rome", "duration_days": 3, "start_date": "2026-11-06", "budget_level": "Moderate"}
+READY = [{"role": "user", "content": "Rome"},
+         {"role": "assistant", "content": "Your trip plan is looking good! Ready to generate the itinerary?"}]
+
+
+def test_rules_recognize_trivial_turns_and_escalate_the_rest():
+    classifier = IntentClassifier(enabled=True)
+    local = {
+        "yes": "confirm", "ok generate it": "confirm", "Sounds good, plan my trip": "confirm",
+        "Thank you so much!": "thanks", "hello there": "greeting", "hi, good evening": "greeting",
+        "Rome": "slot_fill", "make it 4 days": "slot_fill", "I want to go to Paris for 3 days next friday": "slot_fill",
+    }
+    for text, intent in local.items():
+        assert classifier.match_rules(text).intent == intent, text
+
+    for text in ("no", "yes but change it to Paris", "what's the weather like?", "Rome with my kids", "add more museums",
+                 "good morning"):
+        assert classifier.match_rules(text) is None, text
+
+
+def test_slot_parsers():
+    friday = datetime(2026, 10, 16)
+    assert find_duration("a week in rome") == 7 and find_duration("for the weekend") == 2
+    assert find_duration("next weekend") is None
+    assert find_start_date("this weekend", friday) == "2026-10-17"
+    assert find_start_date("next weekend", friday) == "2026-10-24"
+    assert find_start_date("this friday", friday) == "2026-10-16"
+    assert find_start_date("next friday", friday) == "2026-10-23"
+    assert find_start_date("this month", friday) == "2026-10-16"
+    assert find_start_date("next month", friday) == "2026-11-01"
+    assert find_start_date("next month", datetime(2026, 12, 3)) == "2027-01-01"
+    saturday, sunday = datetime(2026, 10, 17), datetime(2026, 10, 18)
+    assert find_start_date("this weekend", saturday) == "2026-10-17"
+    assert find_start_date("next weekend", saturday) == "2026-10-24"
+    assert find_start_date("this weekend", sunday) == "2026-10-18"
+    assert find_start_date("next weekend", sunday) == "2026-10-24"
+    assert find_start_date("this week", sunday) == "2026-10-18"
+    assert find_start_date("next week", sunday) == "2026-10-19"
+    assert find_start_date("on the 5th of june", friday) == "2027-06-05"
+
+
+def test_trivial_turns_skip_the_llm():
+    llm = mock.AsyncMock(side_effect=AssertionError("LLM should not be called"))
+    with mock.patch("app.services.planner.extract_constraints_with_claude", llm), \
+            mock.patch("app.services.intent_classifier.intent_classifier", IntentClassifier(enabled=True)):
+        confirmed = asyncio.run(extract_constraints("yes, go ahead", dict(ROME), READY))
+        longer = asyncio.run(extract_constraints("make it 5 days", dict(ROME)))
+
+    assert confirmed.is_complete and confirmed.destination_city == "Rome"
+    assert "Generate Itinerary" in confirmed.suggested_response
+    assert longer.duration_days == 5 and longer.end_date == "2026-11-10"
+    assert longer.suggested_response.startswith("I've updated your duration to 5 days.")
+
+
+def test_other_turns_go_to_the_llm():
+    llm = mock.AsyncMock(return_value="from llm")
+    with mock.patch("app.services.planner.extract_constraints_with_claude", llm), \
+            mock.patch("app.services.intent_classifier.intent_classifier", IntentClassifier(enabled=True)):
+        # Nothing to confirm yet
+        assert asyncio.run(extract_constraints("yes", {}, READY)) == "from llm"
+        # "yes" answering something other than the offer to generate
+        asked = [{"role": "assistant", "content": "Rome has great food tours. Want me to add one?"}]
+        assert asyncio.run(extract_constraints("yes", dict(ROME), asked)) == "from llm"
+        assert asyncio.run(extract_constraints("ok", dict(ROME))) == "from llm"
+        assert asyncio.run(extract_constraints("Rome but somewhere quieter", dict(ROME))) == "from llm"
+    assert llm.await_count == 4
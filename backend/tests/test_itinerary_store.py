@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("ITINERARY_STORE_PATH", os.path.join(tempfile.mkdtemp(), "itineraries.db"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.itinerary_store import ItineraryStore, ItineraryVersionConflictError
+
+
+def _itinerary(tip: str = "Go early.", places=("Amber Fort", "Hawa Mahal")) -> dict:
+    return {
+        "trip_title": "Jaipur",
+        "days": [{"day_number": 1, "blocks": [
+            {"time_block": "Morning", "local_tip": tip, "poi": {"name": places[0], "category": "fort"}},
+            {"time_block": "Afternoon", "poi": {"name": places[1], "category": "palace"}},
+        ]}]
+    }
+
+
+def test_store_versions_and_diff():
+    store = ItineraryStore(path=os.path.join(tempfile.mkdtemp(), "it.db"), max_versions=2)
+    first = store.create(_itinerary(), {"destination_city": "Jaipur"})
+    second = store.update(first.id, _itinerary(tip="Go at sunrise.", places=("Amber Fort", "City Palace")), if_match=first.etag)
+    assert (first.version, second.version) == (1, 2) and first.etag != second.etag
+    assert second.constraints == {"destination_city": "Jaipur"}
+
+    with pytest.raises(ItineraryVersionConflictError):
+        store.update(first.id, _itinerary(), if_match=first.etag)
+
+    diff = store.diff(first.id)
+    assert diff["changed"] and (diff["from_version"], diff["to_version"]) == (1, 2)
+    blocks = diff["days"][0]["blocks"]
+    assert blocks[0]["changes"] == {"local_tip": {"from": "Go early.", "to": "Go at sunrise."}}
+    assert blocks[1]["changes"]["poi"] == {"from": "Hawa Mahal", "to": "City Palace"}
+
+    # Only the newest `max_versions` are kept
+    store.update(first.id, _itinerary())
+    assert [v["version"] for v in store.versions(first.id)] == [2, 3]
+    assert store.get(first.id, 1) is None
+
+
+def test_idle_and_excess_itineraries_are_pruned():
+    store = ItineraryStore(path=os.path.join(tempfile.mkdtemp(), "i.db"), ttl=100, max_itineraries=2)
+    with mock.patch("app.services.itinerary_store.time.time", return_value=1000.0):
+        idle = store.create(_itinerary())
+        active = store.create(_itinerary())
+    with mock.patch("app.services.itinerary_store.time.time", return_value=1080.0):
+        store.update(active.id, _itinerary(tip="Still planning"))
+    with mock.patch("app.services.itinerary_store.time.time", return_value=1150.0):
+        fresh = store.create(_itinerary())
+    # `idle` passed its TTL; `active` was saved again within it
+    assert store.get(idle.id) is None
+    assert [v["version"] for v in store.versions(active.id)] == [1, 2]
+
+    with mock.patch("app.services.itinerary_store.time.time", return_value=1160.0):
+        newest = store.create(_itinerary())
+    # Over max_itineraries: the least recently saved one goes
+    assert store.get(active.id) is None
+    assert store.get(fresh.id) is not None and store.get(newest.id) is not None
+
+
+def test_itinerary_endpoints_use_etags():
+    client = TestClient(app)
+    created = client.post("/api/itineraries", json=_itinerary())
+    assert created.status_code == 201
+    itinerary_id, etag = created.json()["id"], created.headers["etag"]
+    assert created.headers["x-itinerary-id"] == itinerary_id
+
+    assert client.get(f"/api/itineraries/{itinerary_id}", headers={"If-None-Match": etag}).status_code == 304
+    markdown = client.get(f"/api/itineraries/{itinerary_id}/markdown")
+    assert markdown.status_code == 200 and markdown.text.startswith("# 🌍 Jaipur")
+    assert client.get(f"/api/itineraries/{itinerary_id}/markdown",
+                      headers={"If-None-Match": markdown.headers["etag"]}).status_code == 304
+
+    updated = client.put(f"/api/itineraries/{itinerary_id}", json=_itinerary(tip="New tip"), headers={"If-Match": etag})
+    assert updated.status_code == 200 and updated.json()["version"] == 2
+    stale = client.put(f"/api/itineraries/{itinerary_id}", json=_itinerary(), headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert client.get(f"/api/itineraries/{itinerary_id}/diff").json()["changed"]
+
+    assert client.post("/api/itineraries", json={"days": []}).status_code == 422
+    assert client.delete(f"/api/itineraries/{itinerary_id}").status_code == 204
+    assert client.get(f"/api/itineraries/{itinerary_id}").status_code == 404
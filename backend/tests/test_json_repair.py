@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.json_repair import StreamingJSONParser, parse_json_tolerant
+
+
+def test_parses_fenced_and_prose_wrapped_replies():
+    assert parse_json_tolerant('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_json_tolerant('Here you go: [{"n": 1}] Enjoy!', expect="array") == [{"n": 1}]
+
+
+def test_repairs_truncated_output():
+    assert parse_json_tolerant('{"a": 1, "b": [1, 2') == {"a": 1, "b": [1, 2]}
+    assert parse_json_tolerant('{"title": "Three days in Pa') == {"title": "Three days in Pa"}
+    assert parse_json_tolerant('{"a": "x", "dangling_ke') == {"a": "x"}
+    assert parse_json_tolerant('{"a": "x", "b": tru') == {"a": "x"}
+    assert parse_json_tolerant('{"days": [{"day_number": 1}, {"day_number": 2, "blo') == {
+        "days": [{"day_number": 1}, {"day_number": 2}]
+    }
+
+
+def test_streaming_snapshots_converge_on_the_full_value():
+    value = {"trip_title": 'Tokyo "Neon" Nights', "days": [{"day_number": i, "blocks": []} for i in range(1, 4)]}
+    raw = json.dumps(value)
+    parser = StreamingJSONParser()
+    seen_days = []
+    for i in range(0, len(raw), 7):
+        parser.feed(raw[i:i + 7])
+        snapshot = parser.snapshot()
+        if snapshot is not None:
+            seen_days.append(len(snapshot.get("days", [])))
+    assert parser.complete
+    assert parser.snapshot() == value
+    assert seen_days == sorted(seen_days)
+
+
+if __name__ == "__main__":
+    test_parses_fenced_and_prose_wrapped_replies()
+    test_repairs_truncated_output()
+    test_streaming_snapshots_converge_on_the_full_value()
+    print("JSON repair tests passed")
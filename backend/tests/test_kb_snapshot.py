@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.kb_snapshot import read_manifest, restore, snapshot
+from app.services.vector_store import NumpyVectorStore
+
+
+def _filled_store(count: int = 25) -> NumpyVectorStore:
+    store = NumpyVectorStore(path=tempfile.mkdtemp())
+    rng = np.random.default_rng(0)
+    store.add(
+        [f"doc_{i}" for i in range(count)],
+        rng.normal(size=(count, 8)).astype(np.float32),
+        [f"Tip number {i} — café ünïcode" for i in range(count)],
+        [{"city": "paris" if i % 2 else "tokyo"} if i % 5 else None for i in range(count)]
+    )
+    return store
+
+
+def test_snapshot_round_trip_streams_shards():
+    source = _filled_store()
+    directory = tempfile.mkdtemp()
+    manifest = snapshot(source, directory, page_size=10)
+    assert manifest["count"] == 25 and manifest["dim"] == 8
+    assert [shard["count"] for shard in manifest["shards"]] == [10, 10, 5]
+    assert read_manifest(directory)["shards"] == manifest["shards"]
+
+    target = NumpyVectorStore(path=tempfile.mkdtemp())
+    result = restore(target, directory, workers=3)
+    assert result["records"] == 25 and target.count() == 25
+
+    source_pages = list(source.iter_embedding_pages(page_size=100))[0]
+    target_pages = list(target.iter_embedding_pages(page_size=100))[0]
+    assert target_pages[0] == source_pages[0]
+    assert np.array_equal(target_pages[1], source_pages[1])
+    assert target_pages[2] == source_pages[2] and target_pages[3] == source_pages[3]
+    assert target.query(source_pages[1][3], n_results=1)[0] == ["doc_3"]
+
+
+def test_restore_refuses_non_empty_store_unless_merging():
+    directory = tempfile.mkdtemp()
+    snapshot(_filled_store(5), directory)
+    target = _filled_store(2)
+    with pytest.raises(ValueError):
+        restore(target, directory)
+    restore(target, directory, merge=True)
+    assert target.count() == 5
+
+
+def test_restore_detects_corrupt_shard():
+    directory = tempfile.mkdtemp()
+    manifest = snapshot(_filled_store(5), directory)
+    with open(os.path.join(directory, manifest["shards"][0]["file"]), "ab") as f:
+        f.write(b"junk")
+    target = NumpyVectorStore(path=tempfile.mkdtemp())
+    with pytest.raises(ValueError):
+        restore(target, directory)
+    # The half-written matrix is cleaned up and nothing is published
+    assert target.count() == 0
+    assert not [name for name in os.listdir(target.path) if name.startswith("embeddings-")]
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mcp.models import DayItinerary, Itinerary, ItineraryBlock, POI
+from app.services.knowledge_ingest import KnowledgeIngestor, chunk_text, content_id
+from app.services.rag_engine import RAGEngine
+from app.services.vector_store import NumpyVectorStore
+
+
+def _embed(texts):
+    # Tiny deterministic embedding: letter frequencies
+    vectors = []
+    for text in texts:
+        vector = np.zeros(26, dtype=np.float32)
+        for ch in text.lower():
+            if "a" <= ch <= "z":
+                vector[ord(ch) - 97] += 1
+        vectors.append(vector / (np.linalg.norm(vector) or 1))
+    return vectors
+
+
+def _engine() -> RAGEngine:
+    return RAGEngine(store=NumpyVectorStore(path=tempfile.mkdtemp()), embedding_fn=_embed, seed=False)
+
+
+def test_chunking_respects_size_and_drops_fragments():
+    text = "Short. " + " ".join(f"Sentence number {i} about the old town walls." for i in range(30))
+    chunks = chunk_text(text, max_chars=200)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert len(chunks) > 5
+    assert chunk_text("Too short.") == []
+    assert content_id("Hello  World") == content_id("hello world")
+
+
+def test_write_behind_batches_and_dedups():
+    engine = _engine()
+    ingestor = KnowledgeIngestor(engine_getter=lambda: engine, batch_size=10, flush_interval=0.05)
+    summary = "Kyoto was the imperial capital of Japan for over a thousand years and is famous for its temples."
+
+    assert ingestor.submit(summary, "Kyoto", "wikipedia") == 1
+    assert ingestor.submit(summary, "Kyoto", "wikipedia") == 0
+    itinerary = Itinerary(trip_title="Kyoto", days=[DayItinerary(day_number=1, blocks=[
+        ItineraryBlock(time_block="Morning", poi=POI(name="Fushimi Inari", category="attractions"),
+                       local_tip="Start before 7am to have the upper torii gates almost to yourself.")
+    ])])
+    assert ingestor.submit_itinerary_tips("Kyoto", itinerary) == 1
+    assert ingestor.flush(timeout=5)
+
+    assert engine.store.count() == 2
+    assert ingestor.get_stats()["written"] == 2
+    assert ingestor.get_stats()["duplicates"] == 1
+
+    # A fresh process (empty seen-set) doesn't re-embed what's already stored
+    restarted = KnowledgeIngestor(engine_getter=lambda: engine, flush_interval=0.05)
+    restarted.submit(summary, "Kyoto", "wikipedia")
+    assert restarted.flush(timeout=5)
+    assert restarted.get_stats()["written"] == 0
+    assert engine.store.count() == 2
+
+    docs = engine.query("torii gates early morning", n_results=1, city="kyoto")
+    assert docs and "Fushimi Inari" in docs[0]
+    ingestor.close()
+    restarted.close()
+
+
+def test_flush_right_after_submit_waits_for_the_write():
+    engine = _engine()
+    # A zero flush interval keeps the worker polling an empty queue, where it used to mark
+    # itself idle right after a submit had cleared the flag
+    ingestor = KnowledgeIngestor(engine_getter=lambda: engine, flush_interval=0)
+    try:
+        for i in range(100):
+            assert ingestor.submit(f"Tip number {i} for the old town walls and its quiet lanes.", "Dubrovnik", "test") == 1
+            assert ingestor.flush(timeout=5)
+            assert ingestor.get_stats()["written"] == i + 1
+    finally:
+        ingestor.close()
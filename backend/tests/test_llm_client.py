@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import sys
+from unittest import mock
+
+import httpx
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.llm_client import LLMClient, LLMError, MockProvider
+
+
+def _anthropic_reply(text: str) -> dict:
+    return {
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": 12, "output_tokens": 5, "cache_read_input_tokens": 100}
+    }
+
+
+def test_retries_transient_errors_then_accounts_tokens():
+    statuses = [429, 503, 200]
+    seen_models = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_models.append(json.loads(request.content)["model"])
+        status = statuses.pop(0)
+        if status != 200:
+            return httpx.Response(status, json={"error": "busy"})
+        return httpx.Response(200, json=_anthropic_reply('{"ok": true}'))
+
+    client = LLMClient(transport=httpx.MockTransport(handler), base_delay=0.001, max_delay=0.01)
+    with mock.patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"}):
+        response = asyncio.run(client.complete("extract_constraints", [{"role": "user", "content": "hi"}]))
+
+    assert response.text == '{"ok": true}'
+    assert response.attempts == 3
+    assert seen_models == ["claude-3-5-haiku-20241022"] * 3
+    stats = client.get_stats()["tasks"]["extract_constraints"]
+    assert stats["calls"] == 1 and stats["retries"] == 2
+    assert stats["input_tokens"] == 12 and stats["cache_hits"] == 1
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(400, json={"error": "bad request"})
+
+    client = LLMClient(transport=httpx.MockTransport(handler), base_delay=0.001)
+    with mock.patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"}):
+        try:
+            asyncio.run(client.complete("curate_itinerary", [{"role": "user", "content": "hi"}]))
+            assert False, "expected LLMError"
+        except LLMError as e:
+            assert e.status_code == 400
+    assert len(calls) == 1
+    assert client.get_stats()["tasks"]["curate_itinerary"]["failures"] == 1
+
+
+def test_routes_can_be_overridden_to_the_mock_provider():
+    provider = MockProvider(lambda model, system, messages: "[]")
+    client = LLMClient(providers=[provider])
+    with mock.patch.dict(os.environ, {"LLM_ROUTE_GENERATE_POIS": "mock:fixture"}):
+        response = asyncio.run(client.complete("generate_pois", [{"role": "user", "content": "Paris"}], system="sys"))
+    assert response.text == "[]"
+    assert response.provider == "mock" and response.model == "fixture"
+    assert provider.calls[0]["system"] == "sys"
+
+
+def test_truncated_tool_stream_is_repaired_instead_of_retried():
+    tool = {"name": "record_itinerary", "description": "", "input_schema": {"type": "object"}}
+    raw = '{"trip_title": "Paris", "days": [{"day_number": 1}, {"day_number": 2, "blo'
+    events = [
+        {"type": "message_start", "message": {"usage": {"input_tokens": 50}}},
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "tool_use", "input": {}}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "input_json_delta", "partial_json": raw[:30]}},
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "input_json_delta", "partial_json": raw[30:]}},
+        {"type": "message_delta", "delta": {"stop_reason": "max_tokens"}, "usage": {"output_tokens": 4096}},
+    ]
+    body = "".join(f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    partials = []
+    client = LLMClient(transport=httpx.MockTransport(handler))
+    with mock.patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"}):
+        response = asyncio.run(client.complete(
+            "curate_itinerary", [{"role": "user", "content": "plan"}], tool=tool, on_partial=partials.append
+        ))
+
+    assert len(calls) == 1
+    assert calls[0]["tool_choice"] == {"type": "tool", "name": "record_itinerary"}
+    assert response.stop_reason == "max_tokens"
+    assert response.data == {"trip_title": "Paris", "days": [{"day_number": 1}, {"day_number": 2}]}
+    assert partials == [{"trip_title": "Paris"}, response.data]
+    assert response.usage["output_tokens"] == 4096
+
+
+def test_warm_up_opens_pool_for_configured_providers_only():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, str(request.url)))
+        return httpx.Response(405)
+
+    client = LLMClient(transport=httpx.MockTransport(handler))
+    env = {"ANTHROPIC_API_KEY": "test-key", "ANTHROPIC_BASE_URL": "https://anthropic.test", "OPENROUTER_API_KEY": ""}
+
+    async def run():
+        with mock.patch.dict(os.environ, env):
+            state = await client.warm_up()
+        status = client.pool_status()
+        await client.aclose()
+        return state, status
+
+    state, status = asyncio.run(run())
+    assert seen == [("HEAD", "https://anthropic.test")]
+    assert state["status"] == "ready"
+    assert state["providers"] == {"anthropic": {"status": "warm", "ms": state["providers"]["anthropic"]["ms"]}}
+    assert status["pool_open"] is True
+
+
+if __name__ == "__main__":
+    test_retries_transient_errors_then_accounts_tokens()
+    test_client_errors_are_not_retried()
+    test_routes_can_be_overridden_to_the_mock_provider()
+    test_truncated_tool_stream_is_repaired_instead_of_retried()
+    test_warm_up_opens_pool_for_configured_providers_only()
+    print("LLM client tests passed")
+
+
+def test_stream_snapshots_are_throttled():
+    tool = {"name": "record_itinerary", "description": "", "input_schema": {"type": "object"}}
+    raw = json.dumps({"trip_title": "Rome", "days": [{"day_number": i} for i in range(1, 40)]})
+    events = [{"type": "message_start", "message": {"usage": {"input_tokens": 50}}}]
+    events += [
+        {"type": "content_block_delta", "index": 0, "delta": {"type": "input_json_delta", "partial_json": raw[i:i + 8]}}
+        for i in range(0, len(raw), 8)
+    ]
+    events.append({"type": "message_delta", "delta": {"stop_reason": "tool_use"}, "usage": {"output_tokens": 300}})
+    body = "".join(f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events)
+
+    partials = []
+    client = LLMClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+    client.partial_interval = 60
+    with mock.patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"}):
+        response = asyncio.run(client.complete(
+            "curate_itinerary", [{"role": "user", "content": "plan"}], tool=tool, on_partial=partials.append
+        ))
+
+    # One early snapshot, then only the final state, however many deltas arrive in between
+    assert len(events) > 40
+    assert len(partials) == 2 and partials[-1] == response.data == json.loads(raw)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.lru_cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+    # Overwriting refreshes recency without growing the cache
+    cache.set("a", 10)
+    cache.set("d", 4)
+    assert cache.get("c") is None and cache.get("a") == 10
+
+
+def test_hit_and_miss_stats():
+    cache = LRUCache(maxsize=4)
+    cache.set("tokyo", [0.1])
+    cache.get("tokyo")
+    cache.get("tokyo")
+    cache.get("paris")
+    assert cache.get("paris", "fallback") == "fallback"
+
+    assert cache.stats() == {"size": 1, "maxsize": 4, "hits": 2, "misses": 2, "hit_rate": 0.5}
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["hits"] == 2
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = LRUCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None and len(cache) == 0
@@ -0,0 +1,52 @@
+import os
+import sys
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.markdown_generator import generate_markdown, stream_markdown
+
+ITINERARY = {
+    "trip_title": "Lisbon Long Weekend",
+    "summary_rationale": "Trams, tiles and pastries.",
+    "total_cost_estimate": "Moderate",
+    "transportation_tips": "Buy a Viva Viagem card.",
+    "days": [
+        {
+            "day_number": day,
+            "blocks": [
+                {
+                    "time_block": time_block,
+                    "start_time": "09:00",
+                    "end_time": "11:00",
+                    "local_tip": "Go early.",
+                    "travel_time_from_previous": "10 min walk",
+                    "poi": {"name": f"Spot {day}-{time_block}", "category": "sight", "rating": 4.5,
+                            "description": "A lovely place.", "source_url": "https://example.com"}
+                }
+                for time_block in ("Morning", "Afternoon", "Evening")
+            ]
+        }
+        for day in (1, 2)
+    ]
+}
+
+
+def test_stream_is_chunked_per_block():
+    chunks = list(stream_markdown(ITINERARY))
+    # overview + per day (heading + 3 blocks + rule) + footer
+    assert len(chunks) == 1 + 2 * 5 + 1
+    assert "".join(chunks) == generate_markdown(ITINERARY)
+    assert generate_markdown(ITINERARY).startswith("# 🌍 Lisbon Long Weekend\n")
+    assert "### 🌙 Evening: Spot 2-Evening" in chunks[-3]
+
+
+def test_markdown_endpoint_streams_download():
+    response = TestClient(app).post("/api/generate-markdown", json=ITINERARY)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/markdown")
+    assert "attachment" in response.headers["content-disposition"]
+    assert response.text == generate_markdown(ITINERARY)
@@ -0,0 +1,85 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("ITINERARY_STORE_PATH", os.path.join(tempfile.mkdtemp(), "itineraries.db"))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.pdf_generator import PDFRenderer, pdf_cache_key, pdf_renderer, render_pdf_bytes
+
+ITINERARY = {
+    "trip_title": "Jaipur — Pink City",
+    "total_cost_estimate": "₹20,000",
+    "days": [{"day_number": 1, "blocks": [{
+        "time_block": "Morning", "start_time": "09:00", "end_time": "11:00",
+        "local_tip": "Arrive at opening time.",
+        "poi": {"name": "Amber Fort", "category": "fort", "description": "Hilltop fort.", "source_url": "https://example.com"}
+    }]}]
+}
+
+
+def test_render_pdf_bytes_in_memory():
+    pdf_bytes = render_pdf_bytes(ITINERARY)
+    assert pdf_bytes.startswith(b"%PDF")
+    assert pdf_cache_key(ITINERARY) == pdf_cache_key(dict(reversed(list(ITINERARY.items()))))
+
+
+def test_renderer_caches_and_shares_inflight_renders():
+    renderer = PDFRenderer(workers=0, cache_size=4)
+
+    async def scenario():
+        first, second = await asyncio.gather(renderer.render(ITINERARY), renderer.render(ITINERARY))
+        third = await renderer.render(ITINERARY)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first == second == third
+    assert renderer.renders == 1
+    assert renderer.get_stats()["hits"] == 1
+
+
+def test_pdf_endpoint_renders_in_process_pool_and_never_short_circuits_posts():
+    client = TestClient(app)
+    try:
+        response = client.post("/api/generate-pdf", json=ITINERARY)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.content.startswith(b"%PDF")
+        assert "etag" not in response.headers
+
+        # A POST is not a conditional request: it always gets the document back
+        again = client.post("/api/generate-pdf", json=ITINERARY, headers={"If-None-Match": "*"})
+        assert again.status_code == 200 and again.content == response.content
+
+        # Saved itineraries revalidate through the GET download instead
+        itinerary_id = client.post("/api/itineraries", json=ITINERARY).json()["id"]
+        download = client.get(f"/api/itineraries/{itinerary_id}/pdf")
+        assert download.status_code == 200 and download.content.startswith(b"%PDF")
+        revalidated = client.get(f"/api/itineraries/{itinerary_id}/pdf", headers={"If-None-Match": download.headers["etag"]})
+        assert revalidated.status_code == 304
+    finally:
+        pdf_renderer.close()
+
+
+def test_render_is_cached_when_its_first_caller_is_cancelled():
+    renderer = PDFRenderer(workers=0, cache_size=4)
+
+    async def scenario():
+        first = asyncio.create_task(renderer.render(ITINERARY))
+        await asyncio.sleep(0)
+        first.cancel()
+        # A second caller joins the render still in flight instead of starting another
+        second = await renderer.render(ITINERARY)
+        third = await renderer.render(ITINERARY)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first.cancelled()
+    assert second == third and second[1].startswith(b"%PDF")
+    assert renderer.renders == 1 and renderer.get_stats()["hits"] == 1
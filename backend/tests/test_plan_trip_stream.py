@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("ITINERARY_STORE_PATH", os.path.join(tempfile.mkdtemp(), "itineraries.db"))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.mcp import itinerary as itinerary_module
+from app.mcp.models import POI, Itinerary
+from app.services.free_travel_api import free_travel_service
+
+ATTRACTIONS = [POI(name=f"Sight {i}", category="attractions") for i in range(4)]
+RESTAURANTS = [POI(name="Time Out Market", category="restaurants")]
+
+
+def _events(text: str) -> list:
+    events = []
+    for chunk in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in chunk.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def fake_search(city, interests=None, category="attractions"):
+    return list(ATTRACTIONS if category == "attractions" else RESTAURANTS)
+
+
+def test_stream_reports_progress_then_saved_itinerary():
+    async def curate(request, days, weather_info="", city_summary=""):
+        return Itinerary(trip_title="Curated Lisbon", days=days)
+
+    with mock.patch.object(itinerary_module, "search_pois", fake_search), \
+            mock.patch.object(free_travel_service, "geocode_city", mock.AsyncMock(return_value=(38.7, -9.1))), \
+            mock.patch.object(free_travel_service, "get_weather_forecast", mock.AsyncMock(return_value={})), \
+            mock.patch.object(free_travel_service, "get_wikipedia_summary", mock.AsyncMock(return_value="")), \
+            mock.patch("app.services.claude_api.curate_itinerary_with_claude", curate), \
+            mock.patch("app.services.knowledge_ingest.knowledge_ingestor.submit_itinerary_tips"):
+        itinerary_module._candidate_cache.clear()
+        response = TestClient(app).post("/api/plan-trip/stream", json={"destination_city": "Lisbon", "duration_days": 2})
+
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [name for name, _ in events] == ["geocoded", "weather", "pois", "draft", "curating", "itinerary"]
+    assert events[0][1]["lat"] == 38.7
+    assert events[2][1] == {"attractions": 4, "restaurants": 1}
+    assert len(events[3][1]["itinerary"]["days"]) == 2
+    final = events[-1][1]
+    assert final["itinerary"]["trip_title"] == "Curated Lisbon" and final["version"] == 1 and final["id"]
+
+
+def test_stream_reports_failure():
+    failing = mock.AsyncMock(side_effect=RuntimeError("planner down"))
+    with mock.patch("app.mcp.itinerary.build_itinerary", failing):
+        response = TestClient(app).post("/api/plan-trip/stream", json={"destination_city": "Lisbon"})
+
+    assert _events(response.text) == [("error", {"detail": "planner down"})]
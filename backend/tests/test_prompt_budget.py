@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mcp.models import POI, DayItinerary, ItineraryBlock
+from app.services.prompt_budget import build_budgeted_draft, compact_draft, estimate_tokens, truncate_to_tokens
+
+CITY = "Lisbon is the hilly, coastal capital of Portugal, known for its trams, tiles and fado. " * 6
+
+
+def _draft_days(days: int = 3, blocks: int = 3) -> list:
+    return [
+        DayItinerary(day_number=d + 1, blocks=[
+            ItineraryBlock(time_block="Morning", poi=POI(
+                name=f"Sight {d}-{b}",
+                category="attractions",
+                description=CITY if b == 0 else f"A {'long ' * 60}walk through the old town",
+                rating=4.5,
+                details={"city_description": CITY, "weather_summary": "Sunny, 24C", "city_guide": "",
+                         "cost": "", "timings": "09:00-17:00", "tips": []}
+            ))
+            for b in range(blocks)
+        ])
+        for d in range(days)
+    ]
+
+
+def test_truncate_to_tokens_cuts_on_a_word_boundary():
+    assert truncate_to_tokens("short text", 10) == "short text"
+    text = "The castle walls overlook the river and the old town below"
+    cut = truncate_to_tokens(text, 5)
+    assert cut == "The castle walls..."
+    assert len(cut) - 3 <= 5 * 4 and text.startswith(cut[:-3])
+    # No space to cut on: hard cut
+    assert truncate_to_tokens("x" * 50, 2) == "x" * 8 + "..."
+    assert estimate_tokens("") == 0 and estimate_tokens("abcde") == 2
+
+
+def test_compact_draft_hoists_city_context_and_drops_empty_fields():
+    draft, shared = compact_draft(_draft_days(days=2), field_tokens=60)
+
+    # City-level fields appear once in the shared context, not on every POI
+    assert set(shared) == {"city_description", "weather_summary"}
+    assert shared["weather_summary"] == "Sunny, 24C"
+    assert len(shared["city_description"]) <= 120 * 4 + 3
+    first = draft[0]["activities"][0]
+    assert first["source_details"] == {"timings": "09:00-17:00"}
+    # A description that only echoes the city description is dropped
+    assert "source_desc" not in first
+    assert draft[0]["activities"][1]["source_desc"].endswith("...")
+    assert [day["day"] for day in draft] == [1, 2]
+
+
+def test_build_budgeted_draft_tightens_fields_until_it_fits():
+    days = _draft_days(days=5, blocks=4)
+    roomy, _, roomy_tokens = build_budgeted_draft(days, token_budget=100_000, field_tokens=60)
+    tight, _, tight_tokens = build_budgeted_draft(days, token_budget=800, field_tokens=60)
+
+    assert roomy_tokens > 800
+    assert tight_tokens <= 800 < roomy_tokens
+    assert tight_tokens == estimate_tokens(tight)
+    # Still every activity, just shorter
+    assert sum(len(day["activities"]) for day in json.loads(tight)) == 20
+
+    # An impossible budget stops at the minimum field size instead of looping forever
+    _, _, floor_tokens = build_budgeted_draft(days, token_budget=1, field_tokens=60)
+    assert 1 < floor_tokens <= tight_tokens
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mcp.models import BuildItineraryRequest, DayItinerary, ItineraryBlock, POI
+from app.services import claude_api
+from app.services.llm_client import llm_client
+from app.services.prompt_budget import estimate_tokens
+
+CONSTRAINTS_REPLY = {"destination_city": "Tokyo", "duration_days": 3, "is_complete": False}
+POIS_REPLY = [{"name": "Senso-ji", "category": "attractions", "location": {"lat": 35.7, "lon": 139.8}}]
+ITINERARY_REPLY = {"trip_title": "Tokyo", "days": []}
+
+
+def _marked_prefix_tokens(body: dict) -> int:
+    """Size of the prefix covered by the system cache marker (0 when unmarked)."""
+    static = body["system"][0]
+    if static.get("cache_control") != {"type": "ephemeral"}:
+        return 0
+    return estimate_tokens(json.dumps(body["tools"][0]) + static["text"])
+
+
+class MockAnthropicHandler(BaseHTTPRequestHandler):
+    """Local stand-in for /v1/messages that validates the prompt-cache structure."""
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        MockAnthropicHandler.requests_seen.append(body)
+
+        system = body.get("system")
+        valid = (
+            isinstance(system, list)
+            and len(system) == 2
+            and "cache_control" not in system[1]
+            and "Tokyo" not in system[0]["text"]
+        )
+        if not valid:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(b'{"error": "system prompt is not split into a static prefix"}')
+            return
+
+        prefix = system[0]["text"]
+        if prefix.startswith("You are an AI travel assistant"):
+            reply = CONSTRAINTS_REPLY
+        elif prefix.startswith("You generate lists"):
+            reply = {"pois": POIS_REPLY}
+        else:
+            reply = ITINERARY_REPLY
+
+        # Structured calls must force the tool and stream its input
+        tool_name = body["tools"][0]["name"]
+        assert body["tool_choice"] == {"type": "tool", "name": tool_name}
+        assert body["stream"] is True
+
+        # Like the API, only a marked prefix of at least the model's minimum is cached;
+        # every call after the first one for such a prefix is a cache hit
+        tokens = _marked_prefix_tokens(body)
+        cached = tokens >= claude_api.cache_min_tokens(body["model"])
+        hit = sum(1 for r in MockAnthropicHandler.requests_seen if r["system"][0]["text"] == prefix) > 1
+        usage = {
+            "input_tokens": 40,
+            "output_tokens": 1,
+            "cache_creation_input_tokens": tokens if cached and not hit else 0,
+            "cache_read_input_tokens": tokens if cached and hit else 0
+        }
+        raw = json.dumps(reply)
+        events = [
+            {"type": "message_start", "message": {"usage": usage}},
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "tool_use", "name": tool_name, "input": {}}},
+        ]
+        events += [
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "input_json_delta", "partial_json": raw[i:i + 16]}}
+            for i in range(0, len(raw), 16)
+        ]
+        events += [
+            {"type": "content_block_stop", "index": 0},
+            {"type": "message_delta", "delta": {"stop_reason": "tool_use"}, "usage": {"output_tokens": 20}},
+            {"type": "message_stop"},
+        ]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for event in events:
+            self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+
+
+def _start_mock_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAnthropicHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_static_prefix_is_cached_across_turns():
+    server = _start_mock_server()
+    llm_client.reset_stats()
+    MockAnthropicHandler.requests_seen.clear()
+    env = {"ANTHROPIC_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}", "ANTHROPIC_API_KEY": "test-key"}
+    try:
+        async def run():
+            request = BuildItineraryRequest(city="Tokyo", days=1, pace="moderate", interests=["food"])
+            draft = [DayItinerary(day_number=1, blocks=[ItineraryBlock(time_block="Morning", poi=POI(name="Senso-ji", category="attractions"))])]
+            for turn in ["I want to visit Tokyo", "for 3 days"]:
+                constraints = await claude_api.extract_constraints_with_claude(turn, {"destination_city": "Tokyo"})
+                assert constraints.destination_city == "Tokyo"
+            assert await claude_api.generate_pois_with_claude("Tokyo", ["temples"])
+            for weather in ["Sunny", "Rainy"]:
+                assert await claude_api.curate_itinerary_with_claude(request, draft, weather, "Tokyo is the capital of Japan.")
+            await claude_api.curate_day_with_claude(request, draft[0], ["Morning"], "more food", [POI(name="Tsukiji", category="food")])
+
+        with mock.patch.dict(os.environ, env):
+            asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    stats = claude_api.get_prompt_cache_stats()
+    assert stats["extract_constraints"]["calls"] == 2
+    assert stats["extract_constraints"]["cache_hits"] == 0
+    assert stats["generate_pois"]["cache_creation_input_tokens"] == 0
+    assert stats["curate_itinerary"]["calls"] == 2
+    assert stats["curate_itinerary"]["cache_hits"] == 1
+    assert stats["curate_itinerary"]["hit_rate"] == 0.5
+    assert stats["curate_day"]["calls"] == 1 and stats["curate_day"]["cache_creation_input_tokens"] == 0
+
+    # A marker on a prefix too short for the routed model is a silent no-op
+    for body in MockAnthropicHandler.requests_seen:
+        tokens = _marked_prefix_tokens(body)
+        assert not tokens or tokens >= claude_api.cache_min_tokens(body["model"]), body["system"][0]["text"][:40]
+
+
+if __name__ == "__main__":
+    test_static_prefix_is_cached_across_turns()
+    print("Prompt caching tests passed")
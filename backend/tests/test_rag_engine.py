@@ -0,0 +1,229 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+import pytest
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.rag_engine import RAGEngine, RAGOverloadedError
+from app.services.vector_store import NumpyVectorStore
+
+
+def _embed(texts):
+    # Tiny deterministic embedding: letter frequencies
+    vectors = []
+    for text in texts:
+        vector = np.zeros(26, dtype=np.float32)
+        for ch in text.lower():
+            if "a" <= ch <= "z":
+                vector[ord(ch) - 97] += 1
+        vectors.append(vector / (np.linalg.norm(vector) or 1))
+    return vectors
+
+
+def _engine(path: str = None) -> RAGEngine:
+    return RAGEngine(store=NumpyVectorStore(path=path or tempfile.mkdtemp()), embedding_fn=_embed, seed=False)
+
+
+def test_engine_mirrors_follow_writes_from_other_workers():
+    path = tempfile.mkdtemp()
+    worker_a, worker_b = _engine(path), _engine(path)
+    worker_a.add_documents(["Lisbon trams climb to Alfama"], ["lisbon_1"], [{"city": "Lisbon"}])
+
+    # Worker B never wrote anything, yet its city scope and BM25 mirror see A's document
+    assert worker_b.query("Alfama trams", n_results=1, city="lisbon") == ["Lisbon trams climb to Alfama"]
+    assert "lisbon_1" in worker_b._city_ids["lisbon"]
+    assert worker_b.bm25.search("alfama", 1)[0][0] == "lisbon_1"
+
+    worker_a.upsert_documents(["Porto is famous for port wine cellars"], ["lisbon_1"], [{"city": "Porto"}])
+    assert worker_b.query("port wine cellars", n_results=1, city="porto") == ["Porto is famous for port wine cellars"]
+    assert "lisbon_1" not in worker_b._city_ids["lisbon"]
+
+
+def test_writes_expire_only_the_written_city_results():
+    engine = _engine()
+    engine.add_documents(["Tokyo sushi counters", "Paris bakeries open early"], ["tokyo_1", "paris_1"],
+                         [{"city": "Tokyo"}, {"city": "Paris"}])
+    engine.query("sushi", n_results=1, city="tokyo")
+    engine.query("bakeries", n_results=1, city="paris")
+    engine.query("bakeries", n_results=1)
+    embedded = len(engine.embedding_cache)
+
+    engine.add_documents(["Paris bistros serve late"], ["paris_2"], [{"city": "Paris"}])
+    assert len(engine.embedding_cache) == embedded
+    assert engine._cached_result(engine._result_key("sushi", 1, "tokyo"))[0][0] == "Tokyo sushi counters"
+    assert engine._cached_result(engine._result_key("bakeries", 1, "paris")) is None
+    assert engine._cached_result(engine._result_key("bakeries", 1, None)) is None
+
+
+def test_warm_up_retries_a_failed_build():
+    from app.services import rag_engine as rag_module
+
+    attempts = []
+
+    def flaky_engine():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("model download timed out")
+        return _engine()
+
+    saved = dict(rag_module._engine_state)
+    try:
+        with mock.patch.object(rag_module, "RAGEngine", flaky_engine), mock.patch.object(rag_module, "_engine", None):
+            asyncio.run(rag_module.warm_up_rag_engine(retries=2, backoff=0.01))
+            assert rag_module.rag_engine_status()["status"] == "ready"
+            assert rag_module.rag_engine_status()["attempts"] == saved["attempts"] + 2
+    finally:
+        rag_module._engine_state.clear()
+        rag_module._engine_state.update(saved)
+
+
+def test_queue_sheds_load_and_holds_slots_until_searches_finish():
+    engine = _engine()
+    engine.add_documents(["Lisbon trams climb to Alfama"], ["lisbon_1"], [{"city": "Lisbon"}])
+    engine.max_pending = 1
+    release = threading.Event()
+    search = engine._search
+
+    def slow_search(*args):
+        release.wait(5)
+        return search(*args)
+
+    async def run():
+        with mock.patch.object(engine, "_search", slow_search):
+            first = asyncio.ensure_future(engine.aquery_with_scores("trams"))
+            while engine._pending == 0 or not engine._executor._work_queue.empty():
+                await asyncio.sleep(0.01)
+            with pytest.raises(RAGOverloadedError):
+                await engine.aquery_with_scores("alfama")
+
+            # The caller gives up, but its search is still running on the pool
+            first.cancel()
+            await asyncio.sleep(0.05)
+            assert engine._pending == 1
+            with pytest.raises(RAGOverloadedError):
+                await engine.aquery_with_scores("alfama")
+
+            release.set()
+            while engine._pending:
+                await asyncio.sleep(0.01)
+        return await engine.aquery_with_scores("alfama")
+
+    assert asyncio.run(run())[0][0] == "Lisbon trams climb to Alfama"
+
+
+def test_overloaded_queries_get_503_with_retry_after():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import rag_engine as rag_module
+
+    overloaded = mock.AsyncMock(side_effect=RAGOverloadedError("RAG queue full (32 pending)"))
+    with mock.patch.object(rag_module.rag_engine, "aquery_with_scores", overloaded):
+        response = TestClient(app).post("/api/query-rag", json={"text": "tipping in Tokyo"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_result_cache_hits_and_mid_query_writes():
+    engine = _engine()
+    engine.add_documents(["Tokyo sushi counters"], ["tokyo_1"], [{"city": "Tokyo"}])
+
+    first = engine.query("sushi", n_results=1, city="tokyo")
+    assert engine.query("Sushi ", n_results=1, city="Tokyo") == first
+    stats = engine.cache_stats()
+    assert stats["results"]["hits"] == 1 and stats["embeddings"]["misses"] == 1
+
+    # A write landing while a search runs: its result is returned but not cached
+    search = engine._search
+
+    def search_during_write(key, embedding, stamp):
+        engine.add_documents(["Tokyo ramen alleys"], ["tokyo_2"], [{"city": "Tokyo"}])
+        return search(key, embedding, stamp)
+
+    engine._search = search_during_write
+    engine.query("ramen", n_results=1, city="tokyo")
+    engine._search = search
+    assert engine._cached_result(engine._result_key("ramen", 1, "tokyo")) is None
+    assert engine.query("ramen", n_results=1, city="tokyo") == ["Tokyo ramen alleys"]
+    assert engine._cached_result(engine._result_key("ramen", 1, "tokyo")) == [("Tokyo ramen alleys", mock.ANY)]
+
+
+def test_exact_scope_embeddings_are_fetched_once_per_city_write():
+    engine = _engine()
+    # Stand in for a store whose filtered search is approximate (Chroma)
+    engine.store.exact_filters = False
+    engine.add_documents(["Kyoto temples at dawn", "Kyoto tea houses"], ["kyoto_1", "kyoto_2"],
+                         [{"city": "Kyoto"}, {"city": "Kyoto"}])
+    fetches = []
+    get_embeddings = engine.store.get_embeddings
+
+    def counting(ids):
+        fetches.append(list(ids))
+        return get_embeddings(ids)
+
+    engine.store.get_embeddings = counting
+    engine.query("temples", n_results=1, city="kyoto")
+    engine.query("tea", n_results=1, city="kyoto")
+    assert len(fetches) == 1
+
+    engine.add_documents(["Osaka street food"], ["osaka_1"], [{"city": "Osaka"}])
+    engine.query("dawn", n_results=1, city="kyoto")
+    assert len(fetches) == 1
+
+    engine.add_documents(["Kyoto bamboo grove"], ["kyoto_3"], [{"city": "Kyoto"}])
+    assert engine.query("bamboo grove", n_results=1, city="kyoto") == ["Kyoto bamboo grove"]
+    assert len(fetches) == 2 and len(fetches[1]) == 3
+
+
+def test_numpy_store_scopes_search_without_private_copies():
+    engine = _engine()
+    engine.add_documents(["Kyoto temples at dawn", "Osaka temples at night"], ["kyoto_1", "osaka_1"],
+                         [{"city": "Kyoto"}, {"city": "Osaka"}])
+    with mock.patch.object(engine.store, "get_embeddings", side_effect=AssertionError("copied a scope")):
+        assert engine.query("temples", n_results=2, city="kyoto") == ["Kyoto temples at dawn"]
+    assert len(engine.scope_cache) == 0
+
+
+def test_city_spellings_are_pruned_when_documents_move():
+    engine = _engine()
+    engine.add_documents(["Lisbon trams", "Lisbon tiles"], ["a", "b"], [{"city": "Lisbon"}, {"city": "LISBON"}])
+    assert dict(engine._city_values["lisbon"]) == {"Lisbon": 1, "LISBON": 1}
+
+    engine.upsert_documents(["Lisbon tiles"], ["b"], [{"city": "Lisbon"}])
+    assert dict(engine._city_values["lisbon"]) == {"Lisbon": 2}
+
+    engine.upsert_documents(["Porto trams", "Porto tiles"], ["a", "b"], [{"city": "Porto"}, {"city": "Porto"}])
+    assert "lisbon" not in engine._city_ids and "lisbon" not in engine._city_values
+    assert engine._doc_city["a"] == ("porto", "Porto")
+
+
+def test_search_reads_a_consistent_index_while_another_thread_writes():
+    engine = _engine()
+    engine.add_documents([f"Rome fountain {i}" for i in range(50)], [f"rome_{i}" for i in range(50)],
+                         [{"city": "Rome"}] * 50)
+    errors = []
+
+    def write():
+        for i in range(200):
+            city = "Rome" if i % 2 else "Milan"
+            engine.upsert_documents([f"{city} fountain {i % 50}"], [f"rome_{i % 50}"], [{"city": city}])
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        while writer.is_alive():
+            try:
+                engine.query_with_scores("fountain", n_results=3, city="rome")
+                engine._search(engine._result_key("fountain", 3, "milan"), _embed(["fountain"])[0], (None, -1))
+            except Exception as e:
+                errors.append(e)
+    finally:
+        writer.join()
+    assert errors == []
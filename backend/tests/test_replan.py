@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mcp import itinerary as itinerary_module
+from app.mcp.itinerary import replan_itinerary
+from app.mcp.models import POI, DayItinerary, Itinerary, ItineraryBlock, ReplanRequest
+
+ATTRACTIONS = [
+    POI(name="Lisbon Cathedral", category="attractions", description="Romanesque cathedral"),
+    POI(name="Belem Tower", category="attractions", description="Riverside fortress"),
+    POI(name="Gulbenkian Museum", category="attractions", description="Art collection", details={"tips": "Free on Sundays"}),
+]
+RESTAURANTS = [POI(name="Time Out Market", category="restaurants")]
+
+
+def _trip() -> Itinerary:
+    def day(n, morning, afternoon):
+        return DayItinerary(day_number=n, blocks=[
+            ItineraryBlock(time_block="Morning", poi=POI(name=morning, category="attractions"), start_time="09:00 AM"),
+            ItineraryBlock(time_block="Afternoon", poi=POI(name=afternoon, category="attractions"), start_time="01:00 PM"),
+            ItineraryBlock(time_block="Evening", poi=POI(name="Tasca", category="restaurants"), start_time="07:00 PM"),
+        ])
+    return Itinerary(trip_title="Lisbon", days=[day(1, "Alfama Walk", "Lisbon Cathedral"), day(2, "LX Factory", "Belem Tower")])
+
+
+def test_replan_swaps_one_block_and_reuses_cached_candidates():
+    searches = []
+
+    async def fake_search(city, interests=None, category="attractions"):
+        searches.append(category)
+        return list(ATTRACTIONS if category == "attractions" else RESTAURANTS)
+
+    curate = mock.AsyncMock(return_value=None)
+    with mock.patch.object(itinerary_module, "search_pois", fake_search), \
+            mock.patch("app.services.claude_api.curate_day_with_claude", curate):
+        itinerary_module._candidate_cache.clear()
+        request = ReplanRequest(city="Lisbon", itinerary=_trip(), day_number=2, time_block="afternoon",
+                                instruction="swap the Day 2 afternoon for a museum")
+        result = asyncio.run(replan_itinerary(request))
+        asyncio.run(replan_itinerary(request))
+
+    afternoon = result.days[1].blocks[1]
+    assert afternoon.poi.name == "Gulbenkian Museum"
+    assert afternoon.local_tip == "Free on Sundays" and afternoon.start_time == "01:00 PM"
+    # Untouched blocks and days are preserved
+    assert [b.poi.name for b in result.days[1].blocks] == ["LX Factory", "Gulbenkian Museum", "Tasca"]
+    assert result.days[0] == _trip().days[0]
+    # Only the edited day is sent for curation, and the second edit hits the candidate cache
+    assert curate.await_args.args[1].day_number == 2 and curate.await_args.args[2] == ["Afternoon"]
+    assert searches == ["attractions"]
+
+
+def test_replan_rejects_unknown_day():
+    request = ReplanRequest(city="Lisbon", itinerary=_trip(), day_number=5, instruction="more museums")
+    try:
+        asyncio.run(replan_itinerary(request))
+    except ValueError as e:
+        assert "Day 5" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SESSION_STORE_PATH", os.path.join(tempfile.mkdtemp(), "sessions.db"))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import TripConstraints
+from app.services.session_store import SessionStore
+
+
+def test_rolling_summary_keeps_context_bounded():
+    store = SessionStore(path=os.path.join(tempfile.mkdtemp(), "s.db"), recent_turns=2, summary_batch=2)
+    session_id = store.create({"destination_city": "Rome"})
+    for i in range(5):
+        store.append_turn(session_id, "user" if i % 2 == 0 else "assistant", f"turn {i + 1}")
+
+    summarize = mock.AsyncMock(return_value="Going to Rome, likes food.")
+    with mock.patch("app.services.claude_api.summarize_conversation_with_claude", summarize):
+        assert asyncio.run(store.summarize_if_needed(session_id))
+        # Backlog is now within the window: nothing more to do
+        assert not asyncio.run(store.summarize_if_needed(session_id))
+
+    assert [t["content"] for t in summarize.await_args.args[1]] == ["turn 1", "turn 2", "turn 3"]
+    session = store.get(session_id)
+    assert session.summary == "Going to Rome, likes food." and session.summarized_upto == 3
+    assert [t["content"] for t in session.recent] == ["turn 4", "turn 5"]
+    assert session.constraints == {"destination_city": "Rome"}
+
+
+def test_analyze_intent_keeps_history_server_side():
+    calls = []
+
+    async def fake_extract(text, existing, history, summary):
+        calls.append((text, existing, [t["content"] for t in history]))
+        return TripConstraints(destination_city="Rome", duration_days=len(calls), suggested_response=f"ok {len(calls)}")
+
+    client = TestClient(app)
+    with mock.patch("app.services.planner.extract_constraints", fake_extract):
+        first = client.post("/api/analyze-intent", json={"text": "Rome please"})
+        session_id = first.headers["x-session-id"]
+        second = client.post("/api/analyze-intent", json={"text": "make it 2 days", "session_id": session_id})
+
+    assert second.status_code == 200 and second.headers["x-session-id"] == session_id
+    assert second.json()["duration_days"] == 2
+    # The second turn saw the stored constraints and the first exchange without the client resending them
+    assert calls[1][1]["destination_city"] == "Rome"
+    assert calls[1][2] == ["Rome please", "ok 1"]
+
+
+def test_analyze_intent_rebuilds_or_rejects_an_unknown_session():
+    seen = []
+
+    async def fake_extract(text, existing, history, summary):
+        seen.append(existing)
+        return TripConstraints(destination_city="Rome", duration_days=3, suggested_response="ok")
+
+    client = TestClient(app)
+    with mock.patch("app.services.planner.extract_constraints", fake_extract):
+        lost = client.post("/api/analyze-intent", json={"text": "make it 3 days", "session_id": "gone"})
+        rebuilt = client.post("/api/analyze-intent", json={
+            "text": "make it 3 days", "session_id": "gone", "existing_constraints": {"destination_city": "Rome"}
+        })
+
+    assert lost.status_code == 410
+    assert rebuilt.status_code == 200 and rebuilt.headers["x-session-id"] != "gone"
+    assert seen == [{"destination_city": "Rome"}]
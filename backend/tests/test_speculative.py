@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mcp.models import Itinerary
+from app.services.speculative import SpeculativePlanner, constraints_fingerprint
+
+ROME = {"destination_city": "Rome", "duration_days": 2, "start_date": "2026-05-01", "interests": ["food", "history"]}
+
+
+def _fake_build(calls, delay=0.05):
+    async def build(request):
+        calls.append(request.city)
+        await asyncio.sleep(delay)
+        return Itinerary(trip_title=f"{request.city} trip", days=[])
+    return build
+
+
+def test_fingerprint_ignores_order_and_case():
+    shuffled = dict(ROME, destination_city=" rome ", interests=["History", "food"])
+    assert constraints_fingerprint(ROME) == constraints_fingerprint(shuffled)
+    assert constraints_fingerprint(ROME) != constraints_fingerprint(dict(ROME, duration_days=3))
+
+
+def test_plan_trip_joins_speculative_build():
+    calls = []
+
+    async def scenario():
+        planner = SpeculativePlanner(enabled=True, delay=0)
+        planner.start("s1", ROME)
+        # Confirmation arrives while the build is still running: join it, don't rebuild
+        joined = await planner.take(dict(ROME))
+        again = await planner.take(dict(ROME))
+        return planner, joined, again
+
+    with mock.patch("app.mcp.itinerary.build_itinerary", _fake_build(calls)):
+        planner, joined, again = asyncio.run(scenario())
+
+    assert calls == ["Rome"]
+    assert joined.trip_title == again.trip_title == "Rome trip"
+    assert planner.stats["joined"] == 1 and planner.stats["hits"] == 1
+
+
+def test_changed_constraints_cancel_previous_build():
+    calls = []
+
+    async def scenario():
+        planner = SpeculativePlanner(enabled=True, delay=0)
+        planner.start("s1", ROME)
+        await asyncio.sleep(0.01)
+        planner.start("s1", dict(ROME, destination_city="Paris"))
+        stale = await planner.take(ROME)
+        fresh = await planner.take(dict(ROME, destination_city="Paris"))
+        return planner, stale, fresh
+
+    with mock.patch("app.mcp.itinerary.build_itinerary", _fake_build(calls)):
+        planner, stale, fresh = asyncio.run(scenario())
+
+    assert stale is None and fresh.trip_title == "Paris trip"
+    assert planner.stats["cancelled"] == 1 and planner.stats["misses"] == 1
+
+
+def test_session_entries_are_released_and_bounded():
+    calls = []
+
+    async def scenario():
+        planner = SpeculativePlanner(enabled=True, delay=0, max_inflight=8, max_sessions=2)
+        planner.start("s1", ROME)
+        await planner.take(dict(ROME))
+        taken = planner.get_stats()["sessions"]
+
+        # Sessions that never plan age out, cancelling their builds
+        for i, city in enumerate(("Paris", "Tokyo", "Delhi")):
+            planner.start(f"idle{i}", dict(ROME, destination_city=city))
+        await asyncio.sleep(0)
+        return planner, taken
+
+    with mock.patch("app.mcp.itinerary.build_itinerary", _fake_build(calls, delay=1)):
+        planner, taken = asyncio.run(scenario())
+
+    assert taken == 0
+    assert list(planner._sessions) == ["idle1", "idle2"]
+    assert planner.stats["cancelled"] == 1
+
+
+def test_cancelled_build_does_not_untrack_its_replacement():
+    calls = []
+
+    async def scenario():
+        planner = SpeculativePlanner(enabled=True, delay=0)
+        fingerprint = planner.start("s1", ROME)
+        await asyncio.sleep(0.01)
+        planner.start("s1", dict(ROME, destination_city="Paris"))
+        # Back to Rome before the cancelled build's done-callback has run
+        planner.start("s1", ROME)
+        replacement = planner._tasks[fingerprint]
+        await asyncio.sleep(0.01)
+        tracked = planner._tasks.get(fingerprint)
+        return planner, replacement, tracked, await planner.take(ROME)
+
+    with mock.patch("app.mcp.itinerary.build_itinerary", _fake_build(calls)):
+        planner, replacement, tracked, joined = asyncio.run(scenario())
+
+    assert tracked is replacement
+    assert joined.trip_title == "Rome trip" and planner.stats["joined"] == 1
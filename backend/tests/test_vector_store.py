@@ -0,0 +1,129 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_store import NumpyVectorStore
+
+
+def _vectors(*rows):
+    return np.asarray(rows, dtype=np.float32)
+
+
+def test_numpy_store_upserts_and_filters():
+    store = NumpyVectorStore(path=tempfile.mkdtemp())
+    store.add(
+        ["paris_tip", "tokyo_tip", "tokyo_time"],
+        _vectors([1, 0], [0, 1], [0.6, 0.8]),
+        ["Paris tipping", "Tokyo tipping", "Tokyo seasons"],
+        [{"city": "paris"}, {"city": "tokyo"}, {"city": "tokyo"}]
+    )
+    ids, distances = store.query(_vectors([1, 0])[0], n_results=2)
+    assert ids == ["paris_tip", "tokyo_time"]
+    assert np.allclose(distances, [0.0, 0.8])
+
+    ids, _ = store.query(_vectors([1, 0])[0], n_results=5, where={"city": {"$in": ["tokyo"]}})
+    assert ids == ["tokyo_time", "tokyo_tip"]
+
+    # Upsert replaces in place instead of duplicating
+    store.upsert(["paris_tip"], _vectors([0, -1]), ["Paris tipping (updated)"], [{"city": "paris"}])
+    assert store.count() == 3
+    found, matrix = store.get_embeddings(["paris_tip", "missing"])
+    assert found == ["paris_tip"] and matrix.tolist() == [[0.0, -1.0]]
+    pages = list(store.iter_records(page_size=2))
+    assert [len(page[0]) for page in pages] == [2, 1]
+    assert pages[0][1][0] == "Paris tipping (updated)"
+
+
+def test_numpy_store_is_shared_between_instances_on_the_same_path():
+    path = tempfile.mkdtemp()
+    writer = NumpyVectorStore(path=path)
+    reader = NumpyVectorStore(path=path)
+    writer.add(["a"], _vectors([1, 0]), ["first"])
+    assert reader.count() == 1
+    assert isinstance(reader._current().matrix, np.memmap)
+
+    reader.add(["b"], _vectors([0, 1]), ["second"])
+    assert writer.count() == 2
+    assert writer.query(_vectors([0, 1])[0], n_results=1)[0] == ["b"]
+    # Superseded matrix files are cleaned up
+    assert len([name for name in os.listdir(path) if name.startswith("embeddings-")]) == 1
+
+
+def test_ivf_probe_finds_nearest_neighbours():
+    rng = np.random.default_rng(3)
+    centers = rng.normal(size=(8, 16)).astype(np.float32) * 10
+    points = np.concatenate([center + rng.normal(size=(50, 16)) for center in centers]).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(len(points))]
+
+    store = NumpyVectorStore(path=tempfile.mkdtemp(), ivf_lists=8, nprobe=2)
+    store.add(ids, points, ids)
+    assert store.status()["ivf"] is True
+
+    exact = np.argsort(((points - points[123]) ** 2).sum(axis=1))[:5]
+    found, _ = store.query(points[123], n_results=5)
+    assert found[0] == "doc_123"
+    assert len(set(found) & {ids[i] for i in exact}) >= 4
+
+
+def test_numpy_store_appends_instead_of_rewriting():
+    path = tempfile.mkdtemp()
+    writer = NumpyVectorStore(path=path)
+    reader = NumpyVectorStore(path=path)
+    writer.add(["a", "b"], _vectors([1, 0], [0, 1]), ["first", "second"], [{"city": "paris"}, {"city": "rome"}])
+    assert reader.query(_vectors([1, 0])[0], n_results=5, where={"city": "paris"})[0] == ["a"]
+    files = sorted(os.listdir(path))
+
+    # Back-to-back writes land in the same mtime tick; the manifest version still tells them apart
+    writer.upsert(["c"], _vectors([0.8, 0.6]), ["third"], [{"city": "paris"}])
+    writer.upsert(["a"], _vectors([0, -1]), ["first (moved)"], [{"city": "rome"}])
+    assert sorted(os.listdir(path)) == files
+    assert os.path.getsize(os.path.join(path, next(n for n in files if n.startswith("embeddings-")))) == 3 * 2 * 4
+
+    assert reader.count() == 3 and reader.status()["version"] == 3
+    assert reader.query(_vectors([1, 0])[0], n_results=5, where={"city": "paris"})[0] == ["c"]
+    assert reader.query(_vectors([0, -1])[0], n_results=1)[0] == ["a"]
+    assert list(reader.iter_records())[0][1] == ["first (moved)", "second", "third"]
+
+
+def test_ivf_assigns_new_rows_and_retrains_only_after_growth():
+    rng = np.random.default_rng(5)
+    points = rng.normal(size=(700, 8)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(len(points))]
+    store = NumpyVectorStore(path=tempfile.mkdtemp(), ivf_lists=4, nprobe=4, ivf_retrain_growth=2.0)
+
+    store.add(ids[:200], points[:200], ids[:200])
+    trained = store._current().ivf
+    assert trained["trained_rows"] == 200
+
+    store.add(ids[200:300], points[200:300], ids[200:300])
+    assert store._current().ivf == trained
+    # Probing every list covers every row, including the ones assigned without retraining
+    assert store.query(points[250], n_results=1)[0] == ["doc_250"]
+
+    store.add(ids[300:], points[300:], ids[300:])
+    assert store._current().ivf["trained_rows"] == 700
+    assert len([name for name in os.listdir(store.path) if name.startswith("ivf-")]) == 2
+
+
+def test_unchanged_manifest_is_not_reread():
+    path = tempfile.mkdtemp()
+    writer = NumpyVectorStore(path=path)
+    reader = NumpyVectorStore(path=path)
+    writer.add(["a"], _vectors([1, 0]), ["first"])
+    assert reader.count() == 1
+
+    reads = []
+    read_manifest = reader._read_manifest
+    reader._read_manifest = lambda: reads.append(1) or read_manifest()
+    for _ in range(3):
+        reader.refresh()
+        reader.query(_vectors([1, 0])[0], n_results=1)
+    assert reads == []
+
+    writer.add(["b"], _vectors([0, 1]), ["second"])
+    assert reader.count() == 2 and len(reads) == 1
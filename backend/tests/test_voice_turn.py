@@ -0,0 +1,81 @@
+import base64
+import json
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add the backend directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SESSION_STORE_PATH", os.path.join(tempfile.mkdtemp(), "sessions.db"))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import TripConstraints
+
+
+async def fake_transcribe(audio, mimetype="audio/webm"):
+    return audio.decode("utf-8")
+
+
+async def fake_extract(text, existing, history, summary):
+    return TripConstraints(destination_city="Lisbon", suggested_response=f"Heard: {text}")
+
+
+async def fake_audio(text):
+    yield b"ID3"
+    yield text.encode("utf-8")
+
+
+def _patched():
+    return (
+        mock.patch("app.main.transcribe_audio", fake_transcribe),
+        mock.patch("app.services.planner.extract_constraints", fake_extract),
+        mock.patch("app.services.tts.astream_audio", fake_audio),
+    )
+
+
+def test_voice_turn_streams_each_stage():
+    client = TestClient(app)
+    transcribe, extract, tts = _patched()
+    with transcribe, extract, tts:
+        response = client.post("/api/voice-turn", files={"file": ("a.webm", b"Lisbon in May", "audio/webm")})
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["type"] for e in events] == ["transcript", "constraints", "audio", "audio", "done"]
+    assert events[0]["text"] == "Lisbon in May"
+    assert events[1]["constraints"]["destination_city"] == "Lisbon"
+    audio = b"".join(base64.b64decode(e["data"]) for e in events if e["type"] == "audio")
+    assert audio == b"ID3Heard: Lisbon in May"
+    assert events[-1]["session_id"] == events[1]["session_id"]
+
+
+def test_voice_turn_reports_transcription_failure():
+    async def no_speech(audio, mimetype="audio/webm"):
+        return "Error: No speech detected in audio"
+
+    client = TestClient(app)
+    with mock.patch("app.main.transcribe_audio", no_speech):
+        response = client.post("/api/voice-turn", files={"file": ("a.webm", b"", "audio/webm")})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events == [{"type": "error", "stage": "transcribe", "detail": "Error: No speech detected in audio"}]
+
+
+def test_voice_turn_socket_keeps_session_across_turns():
+    client = TestClient(app)
+    transcribe, extract, tts = _patched()
+    with transcribe, extract, tts, client.websocket_connect("/ws/voice-turn") as ws:
+        sessions = []
+        for utterance in (b"first", b"second"):
+            ws.send_bytes(utterance)
+            assert ws.receive_json()["text"] == utterance.decode()
+            sessions.append(ws.receive_json()["session_id"])
+            assert ws.receive_bytes() == b"ID3"
+            assert ws.receive_bytes() == b"Heard: " + utterance
+            assert ws.receive_json()["type"] == "done"
+
+    assert sessions[0] == sessions[1]
@@ -10,6 +10,11 @@ export default function Home() {
   const [transcript, setTranscript] = useState("");
   const [constraints, setConstraints] = useState<any>(null);
   const [itinerary, setItinerary] = useState<any>(null);
+  const [tripCity, setTripCity] = useState<string | null>(null);
+  // Server-side copy of the itinerary, so exports can fetch by id instead of re-posting it
+  const [itineraryId, setItineraryId] = useState<string | null>(null);
+  // Conversation history and constraints are kept server-side under this id
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [isPlanning, setIsPlanning] = useState(false);
   const [isExplaining, setIsExplaining] = useState(false);
@@ -42,18 +47,25 @@ export default function Home() {
     setMessages(prev => [...prev, { role: 'user', content: text }]);
 
     try {
-      const response = await fetch(`${API_BASE}/api/analyze-intent`, {
+      // Constraints go along too, so the server can rebuild a session it lost (e.g. after a redeploy)
+      const send = (session: string | null) => fetch(`${API_BASE}/api/analyze-intent`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           text,
-          existing_constraints: constraints,
-          history: messages
+          session_id: session,
+          existing_constraints: constraints
         }),
       });
+      let response = await send(sessionId);
+      if (response.status === 410) {
+        // Session gone and nothing to rebuild it from yet: start a new one
+        response = await send(null);
+      }
 
       if (response.ok) {
         const data = await response.json();
+        setSessionId(response.headers.get("X-Session-Id"));
         console.log("Constraints received:", data);
         setConstraints(data);
         const responseText = data.suggested_response || data.clarification_question || (data.is_complete ? "I've captured your trip details! Ready to plan your itinerary?" : "I've noted that. Could you tell me more about your trip, like when you're planning to go or how long you'll stay?");
@@ -91,7 +103,10 @@ export default function Home() {
       const response = await fetch(`${API_BASE}/api/explain`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text }),
+        body: JSON.stringify({
+          text,
+          context: { destination_city: constraints?.destination_city || tripCity },
+        }),
       });
 
       if (response.ok) {
@@ -167,25 +182,58 @@ export default function Home() {
 
     try {
       console.log("Sending constraints to plan-trip:", constraints);
-      const response = await fetch(`${API_BASE}/api/plan-trip`, {
+      // Server-Sent Events: progress, then the draft itinerary, then the curated one
+      const response = await fetch(`${API_BASE}/api/plan-trip/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(constraints),
       });
 
-      if (response.ok) {
-        const data = await response.json();
-        console.log("Itinerary received:", data);
-        setItinerary(data);
-        const endMsg = "Your itinerary is ready! Check it out on the right.";
-        setMessages(prev => [...prev, { role: 'assistant', content: endMsg }]);
-        playTTS(endMsg);
-        setConstraints(null);
-        setTranscript("");
-      } else {
+      if (!response.ok || !response.body) {
         const errorText = await response.text();
         console.error("Plan-trip error:", errorText);
         setMessages(prev => [...prev, { role: 'assistant', content: "Sorry, I had trouble creating your itinerary. Please try again." }]);
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let finished = false;
+      while (!finished) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const chunks = buffer.split("\n\n");
+        buffer = chunks.pop() || "";
+        for (const chunk of chunks) {
+          const event = chunk.match(/^event: (.*)$/m)?.[1];
+          const data = chunk.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+
+          if (event === "draft") {
+            // Show the skeleton right away; the curated version replaces it
+            setItinerary(payload.itinerary);
+            setItineraryId(null);
+            setTripCity(constraints?.destination_city || null);
+          } else if (event === "itinerary") {
+            console.log("Itinerary received:", payload);
+            setItinerary(payload.itinerary);
+            setItineraryId(payload.id || null);
+            setTripCity(constraints?.destination_city || null);
+            const endMsg = "Your itinerary is ready! Check it out on the right.";
+            setMessages(prev => [...prev, { role: 'assistant', content: endMsg }]);
+            playTTS(endMsg);
+            setConstraints(null);
+            setTranscript("");
+            finished = true;
+          } else if (event === "error") {
+            console.error("Plan-trip error:", payload.detail);
+            setMessages(prev => [...prev, { role: 'assistant', content: "Sorry, I had trouble creating your itinerary. Please try again." }]);
+            finished = true;
+          }
+        }
       }
     } catch (error) {
       console.error("Planning error:", error);
@@ -212,11 +260,13 @@ export default function Home() {
   const downloadMarkdown = async () => {
     try {
       console.log("Starting Markdown download...");
-      const response = await fetch(`${API_BASE}/api/generate-markdown`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(itinerary),
-      });
+      const response = itineraryId
+        ? await fetch(`${API_BASE}/api/itineraries/${itineraryId}/markdown`)
+        : await fetch(`${API_BASE}/api/generate-markdown`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify(itinerary),
+        });
 
       console.log("Markdown response status:", response.status);
 
@@ -446,6 +496,7 @@ export default function Home() {
               <button
                 onClick={() => {
                   setItinerary(null);
+                  setItineraryId(null);
                   const msg = "I've unlocked the planner. You can now update any details (e.g., 'Change to 6 days' or 'Add a museum').";
                   setMessages(prev => [...prev, { role: 'assistant', content: msg }]);
                   if (typeof playTTS !== 'undefined') playTTS(msg);